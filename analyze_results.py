@@ -1,47 +1,106 @@
-import pandas as pd
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
-
-def analyze_results():
-    # Load the results
-    df = pd.read_csv('results.csv')
-    
-    # Calculate accuracy
-    accuracy = accuracy_score(df['true_sentiment'], df['predicted_label'])
-    
-    # Generate classification report
-    report = classification_report(df['true_sentiment'], df['predicted_label'])
-    
-    # Generate confusion matrix
-    cm = confusion_matrix(df['true_sentiment'], df['predicted_label'])
-    
+import argparse
+from typing import Dict, Optional
+
+from evaluation import (DEFAULT_CALIBRATION_BINS, DEFAULT_CONFIDENCE_LEVEL, DEFAULT_EVAL_CHUNKSIZE,
+                        evaluate_file, write_report)
+
+
+def print_report(report: Dict):
+    classes = report["classes"]
+
     print("=== PERFORMANCE METRICS ===")
-    print(f"Accuracy: {accuracy:.2%}")
-    print(f"Number of reviews: {len(df)}")
-    print(f"Positive reviews: {sum(df['true_sentiment'] == 'Positive')}")
-    print(f"Negative reviews: {sum(df['true_sentiment'] == 'Negative')}")
-    print(f"Neutral reviews: {sum(df['true_sentiment'] == 'Neutral')}")
-    
+    print(f"Accuracy: {report['accuracy']:.2%}")
+    print(f"Number of reviews: {report['rows']}")
+    for label, scores in classes.items():
+        print(f"{label} reviews: {scores['support']}")
+    if report["skipped"]:
+        print(f"Skipped (no usable true label): {report['skipped']}")
+
     print("\n=== CLASSIFICATION REPORT ===")
-    print(report)
-    
-    print("=== CONFUSION MATRIX ===")
+    print(f"{'':>14} {'precision':>9} {'recall':>9} {'f1-score':>9} {'support':>9}")
+    for label, scores in classes.items():
+        print(f"{label:>14} {scores['precision']:>9.2f} {scores['recall']:>9.2f} {scores['f1']:>9.2f} "
+              f"{scores['support']:>9}")
+    print()
+    for name, key in (("macro avg", "macro_avg"), ("weighted avg", "weighted_avg")):
+        averages = report[key]
+        print(f"{name:>14} {averages['precision']:>9.2f} {averages['recall']:>9.2f} {averages['f1']:>9.2f} "
+              f"{report['evaluated']:>9}")
+
+    matrix = report["confusion_matrix"]
+    print("\n=== CONFUSION MATRIX ===")
     print("Rows: Actual, Columns: Predicted")
-    print(cm)
-    
-    # Calculate per-class accuracy
-    correct = df['true_sentiment'] == df['predicted_label']
+    width = max(len(label) for label in matrix["actual"] + matrix["predicted"]) + 1
+    print(" " * width + "".join(f"{label:>{width}}" for label in matrix["predicted"]))
+    for label, counts in zip(matrix["actual"], matrix["counts"]):
+        print(f"{label:>{width}}" + "".join(f"{count:>{width}}" for count in counts))
+
     print("\n=== PER-CLASS ACCURACY ===")
-    for sentiment in ['Positive', 'Negative', 'Neutral']:
-        class_data = df[df['true_sentiment'] == sentiment]
-        class_accuracy = accuracy_score(class_data['true_sentiment'], class_data['predicted_label'])
-        print(f"{sentiment}: {class_accuracy:.2%} ({sum(class_data['true_sentiment'] == class_data['predicted_label'])}/{len(class_data)})")
-    
-    # Calculate average confidence
-    print(f"\n=== AVERAGE CONFIDENCE ===")
-    print(f"Overall: {df['confidence_score'].mean():.2f}")
-    for sentiment in ['Positive', 'Negative', 'Neutral']:
-        avg_conf = df[df['predicted_label'] == sentiment]['confidence_score'].mean()
-        print(f"{sentiment}: {avg_conf:.2f}")
+    for i, (label, scores) in enumerate(classes.items()):
+        correct = matrix["counts"][i][i]
+        print(f"{label}: {scores['recall']:.2%} ({correct}/{scores['support']})")
+
+    confidence = report["confidence"]
+    print("\n=== AVERAGE CONFIDENCE ===")
+    print(f"Overall: {confidence['mean']:.2f}" if confidence["mean"] is not None else "Overall: n/a")
+    for label in classes:
+        mean = confidence["by_predicted_label"][label]
+        print(f"{label}: {mean:.2f}" if mean is not None else f"{label}: n/a")
+
+    calibration = report["calibration"]
+    print("\n=== CALIBRATION ===")
+    print(f"ECE: {calibration['ece']:.4f}  MCE: {calibration['mce']:.4f}")
+    print(f"{'confidence':>12} {'count':>10} {'mean conf':>10} {'accuracy':>10}")
+    for row in calibration["bins"]:
+        if row["count"]:
+            print(f"{row['lower']:>5.1f}-{row['upper']:<6.1f} {row['count']:>10} "
+                  f"{row['mean_confidence']:>10.2f} {row['accuracy']:>10.2%}")
+
+    if "bootstrap" in report:
+        bootstrap = report["bootstrap"]
+        print(f"\n=== {bootstrap['confidence_level']:.0%} BOOTSTRAP INTERVALS "
+              f"({bootstrap['replicates']} replicates) ===")
+        for name in ("accuracy", "macro_f1", "weighted_f1"):
+            low, high = bootstrap[name]
+            print(f"{name}: [{low:.4f}, {high:.4f}]")
+        for label, intervals in bootstrap["classes"].items():
+            low, high = intervals["f1"]
+            print(f"{label} f1: [{low:.4f}, {high:.4f}]")
+
+
+def analyze_results(path: str = 'results.csv', report_path: Optional[str] = None,
+                    chunksize: int = DEFAULT_EVAL_CHUNKSIZE, bins: int = DEFAULT_CALIBRATION_BINS,
+                    bootstrap: int = 0, confidence_level: float = DEFAULT_CONFIDENCE_LEVEL,
+                    seed: Optional[int] = None) -> Dict:
+    report = evaluate_file(path, chunksize=chunksize, n_bins=bins, bootstrap=bootstrap,
+                           confidence_level=confidence_level, seed=seed)
+    print_report(report)
+    if report_path:
+        write_report(report, report_path)
+        print(f"\nReport saved to {report_path}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate a batch results file')
+    parser.add_argument('results', nargs='?', default='results.csv',
+                        help='Results file (CSV, JSONL or Parquet; default: results.csv)')
+    parser.add_argument('--report', default=None,
+                        help='Also write the full evaluation to this JSON file')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_EVAL_CHUNKSIZE,
+                        help='Rows read per chunk')
+    parser.add_argument('--bins', type=int, default=DEFAULT_CALIBRATION_BINS,
+                        help='Number of equal-width confidence bins for calibration')
+    parser.add_argument('--bootstrap', type=int, default=0,
+                        help='Bootstrap replicates for confidence intervals (0 disables them)')
+    parser.add_argument('--confidence-level', type=float, default=DEFAULT_CONFIDENCE_LEVEL,
+                        help='Coverage of the bootstrap intervals')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Random seed for the bootstrap')
+    args = parser.parse_args()
+
+    analyze_results(args.results, args.report, args.chunksize, args.bins, args.bootstrap,
+                    args.confidence_level, args.seed)
 
 if __name__ == "__main__":
-    analyze_results()
\ No newline at end of file
+    main()
@@ -0,0 +1,474 @@
+import argparse
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, NamedTuple, Optional
+
+# urllib.request, http.server and the Gemini SDK are imported on first use:
+# most processes only ever need one backend
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+DEFAULT_MODEL_NAME = "gemini-2.0-flash"
+DEFAULT_SIMULATOR_PORT = 8765
+
+# Characters per fragment when the simulator streams an answer
+STREAM_FRAGMENT_CHARS = 16
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token for English text)
+    """
+    return len(text) // 4 + 1
+
+
+class BackendResponse(NamedTuple):
+    text: str
+    input_tokens: int
+    output_tokens: int
+
+
+class BackendError(Exception):
+    """
+    A failed model call, carrying the HTTP-style status code when known
+    """
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ModelBackend:
+    """
+    Interface between SentimentAnalyzer and whatever produces completions.
+
+    `model_id` identifies the backend and model in cache keys so results from
+    different backends are never mixed up. `timeout` (seconds, None for the
+    backend's default) bounds a single call; exceeding it raises.
+    """
+    model_id = "base"
+
+    def generate(self, prompt: str, temperature: float, max_output_tokens: int,
+                 timeout: Optional[float] = None) -> BackendResponse:
+        raise NotImplementedError
+
+    def generate_stream(self, prompt: str, temperature: float, max_output_tokens: int,
+                        timeout: Optional[float] = None) -> Iterator[BackendResponse]:
+        """
+        Yield the completion as it is produced. Each fragment's `text` is the
+        newly generated text; its token counts are the totals reported so
+        far, so the last fragment carries the final usage. Backends without
+        streaming yield the whole completion as one fragment.
+        """
+        yield self.generate(prompt, temperature, max_output_tokens, timeout)
+
+
+_dotenv_loaded = False
+_gemini_models: Dict[str, object] = {}
+_gemini_api_key: Optional[str] = None
+_gemini_lock = threading.Lock()
+
+
+def _load_dotenv_once():
+    """
+    Read .env into the environment the first time any backend asks for it
+    """
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _dotenv_loaded = True
+
+
+def gemini_model(model_name: str, api_key: str):
+    """
+    The process-wide GenerativeModel for `model_name`.
+
+    google.generativeai is imported and configured on the first call and
+    models are created once per name, so every GeminiBackend (one per
+    analyzer, Streamlit session or worker thread) shares them. The SDK holds
+    a single global API key; a backend asking for a different key
+    reconfigures it.
+    """
+    global _gemini_api_key
+    with _gemini_lock:
+        import google.generativeai as genai
+        if api_key != _gemini_api_key:
+            genai.configure(api_key=api_key)
+            _gemini_api_key = api_key
+            _gemini_models.clear()
+        if model_name not in _gemini_models:
+            _gemini_models[model_name] = genai.GenerativeModel(model_name)
+        return _gemini_models[model_name]
+
+
+class GeminiBackend(ModelBackend):
+    """
+    Google Gemini via google.generativeai.
+
+    Construction only checks that an API key is available; the SDK is
+    imported and the model created on the first call (see `gemini_model`).
+    """
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, api_key: Optional[str] = None):
+        _load_dotenv_once()
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment variables")
+
+        self.api_key = api_key
+        self.model_id = model_name
+
+    @property
+    def model(self):
+        return gemini_model(self.model_id, self.api_key)
+
+    def _generate_content(self, prompt: str, temperature: float, max_output_tokens: int,
+                          timeout: Optional[float], stream: bool = False):
+        from google.generativeai.types import GenerationConfig
+
+        return self.model.generate_content(
+            prompt,
+            generation_config=GenerationConfig(
+                temperature=temperature,
+                max_output_tokens=max_output_tokens
+            ),
+            stream=stream,
+            request_options={"timeout": timeout} if timeout is not None else None
+        )
+
+    @staticmethod
+    def _response(text: str, response) -> BackendResponse:
+        usage = getattr(response, "usage_metadata", None)
+        return BackendResponse(
+            text=text,
+            input_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+            output_tokens=getattr(usage, "candidates_token_count", 0) or 0
+        )
+
+    def generate(self, prompt: str, temperature: float, max_output_tokens: int,
+                 timeout: Optional[float] = None) -> BackendResponse:
+        response = self._generate_content(prompt, temperature, max_output_tokens, timeout)
+        return self._response(response.text, response)
+
+    def generate_stream(self, prompt: str, temperature: float, max_output_tokens: int,
+                        timeout: Optional[float] = None) -> Iterator[BackendResponse]:
+        for chunk in self._generate_content(prompt, temperature, max_output_tokens, timeout, stream=True):
+            # The final chunk may carry only usage metadata and no text part
+            text = chunk.text if chunk.parts else ""
+            yield self._response(text, chunk)
+
+
+POSITIVE_WORDS = ["fantastic", "brilliant", "superb", "great", "amazing", "loved", "excellent",
+                  "beautiful", "outstanding", "moving", "masterpiece", "enjoyed", "good"]
+NEGATIVE_WORDS = ["terrible", "boring", "awful", "dull", "waste", "poor", "bad", "worst",
+                  "disappointing", "weak", "horrible", "forced", "confusing"]
+
+PACKED_ITEM = re.compile(r"^\s*\[(\d+)\] (\".*\")\s*$", re.MULTILINE)
+SINGLE_REVIEW = re.compile(r'^\s*Review: "(.*)"\s*$', re.MULTILINE)
+
+
+def lexicon_label(review: str) -> Dict:
+    """
+    Deterministic keyword classifier the simulator answers with
+    """
+    words = review.lower()
+    positive = [w for w in POSITIVE_WORDS if w in words]
+    negative = [w for w in NEGATIVE_WORDS if w in words]
+    score = len(positive) - len(negative)
+    label = "Positive" if score > 0 else "Negative" if score < 0 else "Neutral"
+    return {
+        "label": label,
+        "confidence": round(min(0.99, 0.6 + 0.1 * abs(score)), 2),
+        "explanation": f"Simulated answer from {len(positive)} positive and {len(negative)} negative cues.",
+        "evidence_phrases": (positive + negative)[:3]
+    }
+
+
+class SimulatedBackend(ModelBackend):
+    """
+    Offline stand-in for Gemini with configurable latency and failure modes.
+
+    Answers are deterministic (`label_fn`, a keyword lexicon by default) and
+    understand both single-review and packed prompts. Latency is drawn from
+    `latency` ("constant", "uniform", "exponential" or "lognormal") around
+    `latency_ms`, plus optional per-token costs; with probability
+    `tail_probability` it is multiplied by `tail_multiplier` to model a long
+    tail. Calls fail with a 429 or 5xx BackendError, or return malformed
+    JSON, at the configured rates, and with a 429 whenever more than
+    `capacity` calls are already in flight. A call slower than its `timeout`
+    fails with a 504 once the timeout has passed. Streamed answers arrive
+    `first_token_fraction` of the way through the latency and then in evenly
+    spaced fragments. `seed` makes the random draws repeatable.
+    """
+    model_id = "simulated"
+
+    def __init__(self, latency: str = "lognormal", latency_ms: float = 300.0, jitter: float = 0.3,
+                 ms_per_input_token: float = 0.0, ms_per_output_token: float = 0.0,
+                 tail_probability: float = 0.0, tail_multiplier: float = 10.0,
+                 rate_429: float = 0.0, rate_5xx: float = 0.0, malformed_rate: float = 0.0,
+                 capacity: Optional[int] = None, first_token_fraction: float = 0.3,
+                 seed: Optional[int] = 0, label_fn: Callable[[str], Dict] = lexicon_label):
+        if latency not in ("constant", "uniform", "exponential", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {latency}")
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.ms_per_input_token = ms_per_input_token
+        self.ms_per_output_token = ms_per_output_token
+        self.tail_probability = tail_probability
+        self.tail_multiplier = tail_multiplier
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.malformed_rate = malformed_rate
+        self.capacity = capacity
+        self.first_token_fraction = first_token_fraction
+        self.label_fn = label_fn
+        self.calls = 0
+        self.in_flight = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        # One locked draw per call keeps concurrent runs reproducible for a seed
+        with self._lock:
+            self.calls += 1
+            return self._rng.random(), self._rng.random(), self._rng.random(), self._rng.random()
+
+    def _base_latency(self, u: float) -> float:
+        if self.latency == "constant":
+            return self.latency_ms
+        if self.latency == "uniform":
+            return self.latency_ms * (1 - self.jitter + 2 * self.jitter * u)
+        if self.latency == "exponential":
+            return -self.latency_ms * math.log(1 - u)
+        # lognormal with median latency_ms and shape `jitter`
+        return self.latency_ms * math.exp(self.jitter * _normal_ppf(u))
+
+    def answer(self, prompt: str) -> str:
+        """
+        The well-formed JSON answer for a prompt
+        """
+        packed = [json.loads(item) for _, item in PACKED_ITEM.findall(prompt)]
+        if packed:
+            return json.dumps([dict(index=i, **self.label_fn(review)) for i, review in enumerate(packed)])
+        # The last "Review:" line is the target; earlier ones are few-shot examples
+        reviews = SINGLE_REVIEW.findall(prompt)
+        return json.dumps(self.label_fn(reviews[-1] if reviews else ""))
+
+    def _plan(self, prompt: str):
+        """
+        Draw one call's answer text, token counts, latency (ms) and error draw
+        """
+        u_latency, u_tail, u_error, u_malformed = self._draw()
+        text = self.answer(prompt)
+        input_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(text)
+
+        latency = self._base_latency(u_latency) + input_tokens * self.ms_per_input_token \
+            + output_tokens * self.ms_per_output_token
+        if u_tail < self.tail_probability:
+            latency *= self.tail_multiplier
+        if u_malformed < self.malformed_rate:
+            text = "Sure! Here is the analysis: " + text[:len(text) // 2]
+        return text, input_tokens, output_tokens, latency, u_error
+
+    @contextmanager
+    def _call(self, latency: float, u_error: float, timeout: Optional[float]):
+        """
+        Hold an in-flight slot for one call, first failing it (after part of
+        its latency) if it is throttled, errors or would time out
+        """
+        with self._lock:
+            self.in_flight += 1
+            overloaded = self.capacity is not None and self.in_flight > self.capacity
+        try:
+            if overloaded or u_error < self.rate_429:
+                time.sleep(latency / 4000)
+                raise BackendError("429 Resource has been exhausted (simulated)", status_code=429)
+            if u_error < self.rate_429 + self.rate_5xx:
+                time.sleep(latency / 2000)
+                raise BackendError("503 Service unavailable (simulated)", status_code=503)
+            if timeout is not None and latency / 1000 > timeout:
+                time.sleep(timeout)
+                raise BackendError("504 Deadline exceeded (simulated)", status_code=504)
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _record_usage(self, input_tokens: int, output_tokens: int):
+        with self._lock:
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+
+    def generate(self, prompt: str, temperature: float, max_output_tokens: int,
+                 timeout: Optional[float] = None) -> BackendResponse:
+        text, input_tokens, output_tokens, latency, u_error = self._plan(prompt)
+        with self._call(latency, u_error, timeout):
+            time.sleep(latency / 1000)
+        self._record_usage(input_tokens, output_tokens)
+        return BackendResponse(text, input_tokens, output_tokens)
+
+    def generate_stream(self, prompt: str, temperature: float, max_output_tokens: int,
+                        timeout: Optional[float] = None) -> Iterator[BackendResponse]:
+        text, input_tokens, output_tokens, latency, u_error = self._plan(prompt)
+        fragments = [text[i:i + STREAM_FRAGMENT_CHARS] for i in range(0, len(text), STREAM_FRAGMENT_CHARS)]
+        first_token = latency * self.first_token_fraction
+        gap = (latency - first_token) / max(1, len(fragments) - 1)
+        with self._call(latency, u_error, timeout):
+            time.sleep(first_token / 1000)
+            for i, fragment in enumerate(fragments):
+                if i:
+                    time.sleep(gap / 1000)
+                # Usage is only reported with the last fragment
+                last = i == len(fragments) - 1
+                yield BackendResponse(fragment, input_tokens if last else 0, output_tokens if last else 0)
+        self._record_usage(input_tokens, output_tokens)
+
+
+def _normal_ppf(u: float) -> float:
+    """
+    Inverse standard normal CDF (Acklam's rational approximation)
+    """
+    u = min(max(u, 1e-12), 1 - 1e-12)
+    a = [-39.69683028665376, 220.9460984245205, -275.9285104469687, 138.3577518672690, -30.66479806614716, 2.506628277459239]
+    b = [-54.47609879822406, 161.5858368580409, -155.6989798598866, 66.80131188771972, -13.28068155288572]
+    c = [-0.007784894002430293, -0.3223964580411365, -2.400758277161838, -2.549732539343734, 4.374664141464968, 2.938163982698783]
+    d = [0.007784695709041462, 0.3224671290700398, 2.445134137142996, 3.754408661907416]
+    if u < 0.02425:
+        q = math.sqrt(-2 * math.log(u))
+        return (((((c[0] * q + c[1]) * q + c[2]) * q + c[3]) * q + c[4]) * q + c[5]) / \
+            ((((d[0] * q + d[1]) * q + d[2]) * q + d[3]) * q + 1)
+    if u > 1 - 0.02425:
+        return -_normal_ppf(1 - u)
+    q = u - 0.5
+    r = q * q
+    return (((((a[0] * r + a[1]) * r + a[2]) * r + a[3]) * r + a[4]) * r + a[5]) * q / \
+        (((((b[0] * r + b[1]) * r + b[2]) * r + b[3]) * r + b[4]) * r + 1)
+
+
+class HTTPBackend(ModelBackend):
+    """
+    Client for a backend served over HTTP (see `serve`)
+    """
+    def __init__(self, url: str, timeout: float = 60.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.model_id = f"http:{self.url}"
+
+    def generate(self, prompt: str, temperature: float, max_output_tokens: int,
+                 timeout: Optional[float] = None) -> BackendResponse:
+        import urllib.error
+        import urllib.request
+
+        body = json.dumps({
+            "prompt": prompt,
+            "temperature": temperature,
+            "max_output_tokens": max_output_tokens
+        }).encode("utf-8")
+        request = urllib.request.Request(self.url + "/v1/generate", data=body,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+                payload = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise BackendError(f"{e.code} {e.read().decode('utf-8', 'replace')}", status_code=e.code) from e
+        except urllib.error.URLError as e:
+            raise BackendError(f"Connection failed: {e.reason}") from e
+        except TimeoutError as e:
+            raise BackendError("Request timed out", status_code=504) from e
+        return BackendResponse(payload["text"], payload.get("input_tokens", 0), payload.get("output_tokens", 0))
+
+
+def serve(backend: ModelBackend, host: str = "127.0.0.1",
+          port: int = DEFAULT_SIMULATOR_PORT) -> "ThreadingHTTPServer":
+    """
+    Expose a backend at POST /v1/generate; returns the (not yet started) server
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/v1/generate":
+                self._reply(404, {"error": "not found"})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            try:
+                response = backend.generate(request["prompt"], request.get("temperature", 0.1),
+                                            request.get("max_output_tokens", 200))
+            except BackendError as e:
+                self._reply(e.status_code or 500, {"error": str(e)})
+                return
+            self._reply(200, response._asdict())
+
+        def _reply(self, status: int, payload: Dict):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def make_backend(spec: Optional[str] = None, model_name: str = DEFAULT_MODEL_NAME) -> ModelBackend:
+    """
+    Build a backend from a short spec: "gemini" (default), "simulated", or an
+    http(s):// URL of a served backend. Falls back to $SENTIMENT_BACKEND.
+    """
+    spec = spec or os.getenv("SENTIMENT_BACKEND", "gemini")
+    if spec == "gemini":
+        return GeminiBackend(model_name)
+    if spec == "simulated":
+        return SimulatedBackend()
+    if spec.startswith(("http://", "https://")):
+        return HTTPBackend(spec)
+    raise ValueError(f"Unknown backend: {spec}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the simulated model backend as a local HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_SIMULATOR_PORT)
+    parser.add_argument("--latency", default="lognormal", choices=["constant", "uniform", "exponential", "lognormal"])
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--tail-probability", type=float, default=0.0)
+    parser.add_argument("--tail-multiplier", type=float, default=10.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--capacity", type=int, default=None,
+                        help="Answer 429 when more than this many calls are in flight")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    backend = SimulatedBackend(
+        latency=args.latency, latency_ms=args.latency_ms, jitter=args.jitter,
+        tail_probability=args.tail_probability, tail_multiplier=args.tail_multiplier,
+        rate_429=args.rate_429, rate_5xx=args.rate_5xx, malformed_rate=args.malformed_rate,
+        capacity=args.capacity, seed=args.seed
+    )
+    server = serve(backend, args.host, args.port)
+    print(f"Simulated backend listening on http://{args.host}:{args.port} "
+          f"(use --backend http://{args.host}:{args.port})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
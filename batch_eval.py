@@ -1,16 +1,163 @@
+import os
+import functools
 import pandas as pd
-from sentiment_llm import process_csv_file
+from sentiment_llm import (SentimentAnalyzer, process_csv_file, process_csv_file_streaming,
+                           DEFAULT_MAX_CONCURRENCY, DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_CHUNKSIZE)
+from fast_classifier import FastClassifier, DEFAULT_THRESHOLD
+from dedup import DEFAULT_THRESHOLD as DEFAULT_DEDUP_THRESHOLD
+from backends import make_backend
+from routing import ModelRouter
+from metrics import PrometheusExporter, JsonLinesExporter, configure_logging
+from live_metrics import LiveMetrics, DEFAULT_PUBLISH_INTERVAL
+from parallel_batch import process_csv_file_parallel
+from profiling import Tracer, cpu_profile, format_stage_summary
 import argparse
 
+def build_analyzer(backend=None, use_cache=True, fast_path=None, fast_path_threshold=DEFAULT_THRESHOLD,
+                   metrics_prom=None, metrics_jsonl=None, per_process_metrics=False, routing=None,
+                   profile=False):
+    """
+    Analyzer configured from the command-line options. Module-level so
+    --workers processes can rebuild it; with `per_process_metrics` each
+    process writes its metrics to `<path>.<pid>`. A `routing` policy file
+    replaces `backend` with the tiers it lists. With `profile`, its stages
+    are traced (see profiling.Tracer).
+    """
+    suffix = f".{os.getpid()}" if per_process_metrics else ""
+    analyzer = SentimentAnalyzer(
+        backend=None if routing else make_backend(backend),
+        use_cache=use_cache,
+        fast_path=FastClassifier.load(fast_path) if fast_path else None,
+        fast_path_threshold=fast_path_threshold,
+        router=ModelRouter.load(routing) if routing else None
+    )
+    if metrics_prom:
+        analyzer.metrics.add_sink(PrometheusExporter(metrics_prom + suffix))
+    if metrics_jsonl:
+        analyzer.metrics.add_sink(JsonLinesExporter(metrics_jsonl + suffix))
+    if profile:
+        analyzer.stage_timer = Tracer()
+    return analyzer
+
 def main():
     parser = argparse.ArgumentParser(description='Batch process movie reviews')
-    parser.add_argument('--input', '-i', required=True, help='Input CSV file path')
-    parser.add_argument('--output', '-o', required=True, help='Output CSV file path')
+    parser.add_argument('--input', '-i', required=True, help='Input file path (CSV, JSONL or Parquet)')
+    parser.add_argument('--output', '-o', required=True, help='Output file path (CSV or Parquet)')
+    parser.add_argument('--backend', default=None,
+                        help="'gemini', 'simulated' or the URL of a served backend (default: $SENTIMENT_BACKEND or gemini)")
+    parser.add_argument('--concurrency', '-c', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help='Maximum number of in-flight model calls (per worker with --workers)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Shard the input across this many processes sharing the --rpm budget')
+    parser.add_argument('--fixed-concurrency', action='store_true',
+                        help='Always run --concurrency calls instead of adapting to throttling')
+    parser.add_argument('--rpm', type=float, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help='Requests-per-minute budget (0 disables rate limiting)')
+    parser.add_argument('--pack-size', type=int, default=1,
+                        help='Number of reviews to classify per model call')
+    parser.add_argument('--pack-token-budget', type=int, default=None,
+                        help='Close a pack early once its reviews reach this many estimated tokens')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Bypass the on-disk result cache')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Stream the input in chunks of this many rows with checkpointing '
+                             '(always on with --workers)')
+    parser.add_argument('--checkpoint', default=None,
+                        help='Checkpoint file for streaming mode (default: <output>.checkpoint)')
+    parser.add_argument('--no-resume', action='store_true',
+                        help='Ignore an existing checkpoint and start over')
+    parser.add_argument('--fast-path', default=None,
+                        help='Local classifier model (.npz from fast_classifier.py train) to try before the LLM')
+    parser.add_argument('--fast-path-threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Minimum fast-path confidence needed to skip the LLM')
+    parser.add_argument('--dedup', action='store_true',
+                        help='Analyze one representative per group of near-duplicate reviews')
+    parser.add_argument('--dedup-threshold', type=float, default=DEFAULT_DEDUP_THRESHOLD,
+                        help='Estimated Jaccard similarity at which reviews count as duplicates')
+    parser.add_argument('--locate-evidence', action='store_true',
+                        help='Add the character spans of each evidence phrase in its review and count '
+                             'phrases the review does not contain')
+    parser.add_argument('--metrics-prom', default=None,
+                        help='Write metrics in Prometheus text format to this file after each batch')
+    parser.add_argument('--metrics-jsonl', default=None,
+                        help='Append a JSON snapshot of the metrics to this file after each batch')
+    parser.add_argument('--routing', default=None,
+                        help='JSON routing policy choosing a model tier per review (see routing.py); '
+                             'overrides --backend')
+    parser.add_argument('--live-metrics', default=None,
+                        help='Keep running label counts, confidence histogram, error rate and (with '
+                             'true_sentiment) accuracy in this JSON file while the batch runs')
+    parser.add_argument('--live-interval', type=float, default=DEFAULT_PUBLISH_INTERVAL,
+                        help='Seconds between updates of the --live-metrics file')
+    parser.add_argument('--profile', default=None, metavar='TRACE_JSON',
+                        help='Trace every pipeline stage (CSV read, prompt build, model call, parse, '
+                             'writes) across threads and workers into this Chrome trace-event file '
+                             'and print a per-stage summary')
+    parser.add_argument('--profile-cpu', default=None, metavar='PSTATS',
+                        help='Also run the main loop under cProfile and save the stats to this file')
+    parser.add_argument('--log-level', default='INFO', help='Logging level (DEBUG, INFO, WARNING, ...)')
+    parser.add_argument('--log-json', action='store_true', help='Emit logs as JSON lines')
     
     args = parser.parse_args()
+    configure_logging(args.log_level, json_format=args.log_json)
     
     print(f"Processing {args.input}...")
-    process_csv_file(args.input, args.output)
+    analyzer_options = dict(
+        backend=args.backend,
+        use_cache=not args.no_cache,
+        fast_path=args.fast_path,
+        fast_path_threshold=args.fast_path_threshold,
+        metrics_prom=args.metrics_prom,
+        metrics_jsonl=args.metrics_jsonl,
+        routing=args.routing,
+        profile=bool(args.profile)
+    )
+    options = dict(
+        max_concurrency=args.concurrency,
+        requests_per_minute=args.rpm or None,
+        pack_size=args.pack_size,
+        pack_token_budget=args.pack_token_budget,
+        dedup=args.dedup,
+        dedup_threshold=args.dedup_threshold,
+        adaptive_concurrency=not args.fixed_concurrency,
+        locate_evidence=args.locate_evidence,
+        live_metrics=LiveMetrics(args.live_metrics, interval=args.live_interval) if args.live_metrics else None
+    )
+    tracer = None
+    with cpu_profile(args.profile_cpu):
+        if args.workers > 1:
+            tracer = Tracer() if args.profile else None
+            process_csv_file_parallel(
+                args.input,
+                args.output,
+                workers=args.workers,
+                analyzer_factory=functools.partial(build_analyzer, per_process_metrics=True, **analyzer_options),
+                chunksize=args.chunksize or DEFAULT_CHUNKSIZE,
+                checkpoint_path=args.checkpoint,
+                resume=not args.no_resume,
+                tracer=tracer,
+                **options
+            )
+        elif args.chunksize:
+            analyzer = build_analyzer(**analyzer_options)
+            tracer = analyzer.stage_timer
+            process_csv_file_streaming(
+                args.input,
+                args.output,
+                chunksize=args.chunksize,
+                checkpoint_path=args.checkpoint,
+                resume=not args.no_resume,
+                analyzer=analyzer,
+                **options
+            )
+        else:
+            analyzer = build_analyzer(**analyzer_options)
+            tracer = analyzer.stage_timer
+            process_csv_file(args.input, args.output, analyzer=analyzer, **options)
+    if tracer is not None:
+        tracer.write_chrome_trace(args.profile)
+        print(format_stage_summary(tracer.summary()))
+        print(f"Trace written to {args.profile} ({len(tracer.events)} spans, {tracer.dropped} not kept)")
     print("Batch processing completed!")
 
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+import io
+import os
+from typing import Iterator, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CSV = "csv"
+JSONL = "jsonl"
+PARQUET = "parquet"
+
+FORMAT_EXTENSIONS = {
+    ".csv": CSV,
+    ".jsonl": JSONL,
+    ".ndjson": JSONL,
+    ".parquet": PARQUET,
+    ".pq": PARQUET
+}
+
+# Arrow types for the result columns in Parquet output; labels and fallback
+# reasons repeat a handful of values, so they are dictionary-encoded
+RESULT_TYPES = {
+    "predicted_label": pa.dictionary(pa.int8(), pa.string()),
+    "confidence_score": pa.float32(),
+    "explanation": pa.string(),
+    "evidence_phrases": pa.list_(pa.string()),
+    "fallback_reason": pa.dictionary(pa.int8(), pa.string()),
+    "dup_group": pa.int64(),
+    "evidence_spans": pa.list_(pa.list_(pa.int32())),
+    "unsupported_evidence": pa.int32()
+}
+
+# Rows per row group when a whole DataFrame is written at once
+DEFAULT_ROW_GROUP_SIZE = 100_000
+
+
+def file_format(path: str) -> str:
+    """
+    CSV, JSONL or PARQUET, from the file extension
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unsupported file type '{extension}' for {path} "
+                         f"(expected one of {', '.join(FORMAT_EXTENSIONS)})")
+    return FORMAT_EXTENSIONS[extension]
+
+
+def read_reviews(path, fmt: Optional[str] = None) -> pd.DataFrame:
+    """
+    Read a whole CSV, JSONL or Parquet file with Arrow-backed columns.
+    `path` may also be a binary file object (such as an upload), in which
+    case `fmt` must be given.
+    """
+    fmt = fmt or file_format(path)
+    if fmt == CSV:
+        return pd.read_csv(path, dtype_backend="pyarrow")
+    if fmt == JSONL:
+        return pd.read_json(path, lines=True, dtype_backend="pyarrow")
+    return pq.read_table(path).to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def iter_chunks(path: str, chunksize: int,
+                columns: Optional[List[str]] = None) -> Iterator[Tuple[int, pd.DataFrame]]:
+    """
+    Yield (first_row_id, DataFrame) pairs for consecutive chunks of a CSV,
+    JSONL or Parquet file, with Arrow-backed columns. With `columns`, only
+    those columns are kept (and, for CSV and Parquet, only those are parsed).
+    """
+    fmt = file_format(path)
+    if fmt == PARQUET:
+        batches = (batch.to_pandas(types_mapper=pd.ArrowDtype)
+                   for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns))
+    elif fmt == JSONL:
+        batches = pd.read_json(path, lines=True, chunksize=chunksize, dtype_backend="pyarrow")
+    else:
+        batches = pd.read_csv(path, chunksize=chunksize, usecols=columns, dtype_backend="pyarrow")
+
+    row_id = 0
+    for chunk in batches:
+        chunk = chunk.reset_index(drop=True)
+        if columns is not None:
+            chunk = chunk[columns]
+        yield row_id, chunk
+        row_id += len(chunk)
+
+
+def count_rows(path: str, chunksize: int = DEFAULT_ROW_GROUP_SIZE) -> int:
+    """
+    Number of rows in a CSV, JSONL or Parquet file; read from the footer
+    for Parquet, by streaming only the review_text column otherwise
+    """
+    if file_format(path) == PARQUET:
+        return pq.ParquetFile(path).metadata.num_rows
+    return sum(len(chunk) for _, chunk in iter_chunks(path, chunksize, columns=['review_text']))
+
+
+def review_texts(df: pd.DataFrame) -> List[str]:
+    """
+    The review_text column as Python strings, with missing values as ''
+    """
+    return [text if isinstance(text, str) else "" if pd.isna(text) else str(text)
+            for text in df['review_text']]
+
+
+def true_labels(df: pd.DataFrame) -> Optional[List[Optional[str]]]:
+    """
+    The true_sentiment column with missing values as None, or None when the
+    input has no such column
+    """
+    if 'true_sentiment' not in df:
+        return None
+    return [label if isinstance(label, str) and label else None for label in df['true_sentiment']]
+
+
+def to_arrow(df: pd.DataFrame) -> pa.Table:
+    """
+    Convert a results DataFrame to Arrow, giving the result columns their
+    Parquet types (evidence_phrases must still be lists)
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for name, arrow_type in RESULT_TYPES.items():
+        if name in table.column_names:
+            index = table.column_names.index(name)
+            table = table.set_column(index, pa.field(name, arrow_type), table.column(name).cast(arrow_type))
+    return table
+
+
+class ParquetResultWriter:
+    """
+    Writes result chunks to one Parquet file, one row group per chunk.
+
+    The schema is taken from the first chunk (columns that were entirely
+    empty in it become strings) and later chunks are cast to it. The file
+    is only readable once `close` has written the footer.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        self._writer: Optional[pq.ParquetWriter] = None
+
+    def write(self, df: pd.DataFrame):
+        table = to_arrow(df)
+        if self._writer is None:
+            schema = pa.schema([pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+                                for field in table.schema])
+            self._writer = pq.ParquetWriter(self.path, schema, compression="zstd")
+        self._writer.write_table(table.cast(self._writer.schema))
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_results(df: pd.DataFrame, path: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+    """
+    Write a results DataFrame as CSV or Parquet, chosen by the file extension
+    """
+    fmt = file_format(path)
+    if fmt == PARQUET:
+        pq.write_table(to_arrow(df), path, row_group_size=row_group_size, compression="zstd")
+    elif fmt == CSV:
+        df.to_csv(path, index=False)
+    else:
+        raise ValueError(f"Results can be written as CSV or Parquet, not {fmt}")
+
+
+def encode_results(df: pd.DataFrame, fmt: str) -> bytes:
+    """
+    A results DataFrame as the bytes of a CSV or Parquet file (e.g. for a
+    download). Evidence phrase lists are joined with ', ' for CSV.
+    """
+    buffer = io.BytesIO()
+    if fmt == PARQUET:
+        pq.write_table(to_arrow(df), buffer, compression="zstd")
+    elif fmt == CSV:
+        if 'evidence_phrases' in df:
+            df = df.assign(evidence_phrases=[phrases if isinstance(phrases, str) else ', '.join(phrases)
+                                             for phrases in df['evidence_phrases']])
+        df.to_csv(buffer, index=False)
+    else:
+        raise ValueError(f"Results can be written as CSV or Parquet, not {fmt}")
+    return buffer.getvalue()
@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from batch_io import encode_results, review_texts
+from sentiment_llm import SentimentAnalyzer, add_result_columns
+
+logger = logging.getLogger(__name__)
+
+# Rows per batch_analyze call; each finished chunk becomes visible as partial results
+DEFAULT_JOB_CHUNKSIZE = 50
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class BatchJob:
+    """
+    Analyzes a DataFrame of reviews on a background thread so a UI can poll
+    it instead of blocking.
+
+    Rows are analyzed `chunksize` at a time with
+    SentimentAnalyzer.batch_analyze (extra keyword arguments are passed
+    through, e.g. `max_concurrency`). `progress()` counts rows done including
+    the chunk in flight, and `frame()` returns the rows finished so far in
+    input order. `cancel()` stops the job after the current chunk.
+    """
+    def __init__(self, analyzer: SentimentAnalyzer, df: pd.DataFrame,
+                 chunksize: int = DEFAULT_JOB_CHUNKSIZE, **batch_options):
+        self.analyzer = analyzer
+        self.df = df.reset_index(drop=True)
+        self.chunksize = chunksize
+        self.batch_options = batch_options
+        self.total = len(self.df)
+        self.state = PENDING
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._texts = review_texts(self.df)
+        self._results: List[Dict] = []
+        self._chunk_completed = 0
+        self._exports: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="batch-job", daemon=True)
+
+    def start(self) -> "BatchJob":
+        self.state = RUNNING
+        self.started_at = time.monotonic()
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    def progress(self) -> int:
+        with self._lock:
+            return len(self._results) + self._chunk_completed
+
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def frame(self, evidence_as_list: bool = True) -> pd.DataFrame:
+        """
+        The input rows analyzed so far with their result columns
+        """
+        with self._lock:
+            results = list(self._results)
+        return add_result_columns(self.df.iloc[:len(results)].copy(), results, evidence_as_list)
+
+    def export(self, fmt: str) -> bytes:
+        """
+        Finished results as CSV or Parquet file contents, encoded once per format
+        """
+        if fmt not in self._exports:
+            self._exports[fmt] = encode_results(self.frame(), fmt)
+        return self._exports[fmt]
+
+    def _on_progress(self, completed: int, total: int):
+        with self._lock:
+            self._chunk_completed = completed
+
+    def _run(self):
+        try:
+            for start in range(0, self.total, self.chunksize):
+                if self._cancel.is_set():
+                    self.state = CANCELLED
+                    return
+                results = self.analyzer.batch_analyze(
+                    self._texts[start:start + self.chunksize],
+                    **{"progress_callback": self._on_progress, **self.batch_options}
+                )
+                with self._lock:
+                    self._results.extend(results)
+                    self._chunk_completed = 0
+            self.state = DONE
+        except Exception as e:
+            logger.exception("Batch job failed after %d rows", len(self._results))
+            self.error = str(e)
+            self.state = FAILED
+        finally:
+            self.finished_at = time.monotonic()
+            logger.info("Batch job %s: %d/%d rows in %.1fs", self.state, len(self._results), self.total,
+                        self.elapsed(), extra={"state": self.state, "completed": len(self._results)})
@@ -0,0 +1,149 @@
+"""
+Tail-latency benchmark for hedged requests (hedging.py).
+
+A few simulated users send single reviews one after another to an analyzer
+in front of the simulated backend, whose latency is lognormal with a long
+tail: a small share of calls take `--tail-multiplier` times as long. The
+same workload runs without and with a Hedger, through analyze_sentiment and
+through the streaming path; for each the table shows request latency
+percentiles, upstream calls, the hedge rate and how much hedging cut p99.
+Pass a previous result file with --compare to flag p99 regressions of the
+hedged runs.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_hedging --requests 2000 --output hedging.json
+    python -m benchmarks.bench_hedging --tail-probability 0.05 --max-hedge-rate 0.1
+    python -m benchmarks.bench_hedging --compare hedging.json --tolerance 0.25
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from backends import SimulatedBackend
+from benchmarks.bench_suite import git_commit
+from benchmarks.common import latency_summary, make_reviews
+from hedging import Hedger
+from metrics import MetricsRegistry
+from sentiment_llm import SentimentAnalyzer
+
+PATHS = ["single", "stream"]
+
+
+def run(path: str, hedged: bool, reviews: List[str], args) -> Dict:
+    backend = SimulatedBackend(latency="lognormal", latency_ms=args.latency_ms, jitter=args.jitter,
+                               tail_probability=args.tail_probability, tail_multiplier=args.tail_multiplier,
+                               seed=args.seed)
+    hedger = Hedger(percentile=args.percentile, max_hedge_rate=args.max_hedge_rate) if hedged else None
+    analyzer = SentimentAnalyzer(backend=backend, use_cache=False, metrics=MetricsRegistry(), hedger=hedger)
+
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def user(share: List[str]):
+        for review in share:
+            start = time.perf_counter()
+            if path == "stream":
+                for _ in analyzer.analyze_sentiment_stream(review):
+                    pass
+            else:
+                analyzer.analyze_sentiment(review)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    users = [threading.Thread(target=user, args=(reviews[i::args.users],)) for i in range(args.users)]
+    start = time.perf_counter()
+    for thread in users:
+        thread.start()
+    for thread in users:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "path": path,
+        "hedged": hedged,
+        "requests": len(reviews),
+        "seconds": round(elapsed, 3),
+        "latency": latency_summary(latencies),
+        "upstream_calls": backend.calls
+    }
+    if hedger is not None:
+        result["hedging"] = hedger.summary()
+    return result
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> list:
+    """
+    Hedged runs whose p99 rose by more than `tolerance`
+    """
+    regressions = []
+    for path, result in current["paths"].items():
+        previous = baseline.get("paths", {}).get(path)
+        if not previous:
+            continue
+        change = result["hedged"]["latency"]["p99_ms"] / previous["hedged"]["latency"]["p99_ms"] - 1
+        print(f"{path:>6}: hedged p99 {change:+.1%}")
+        if change > tolerance:
+            regressions.append(f"{path}: hedged p99 rose {change:.1%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how hedged requests cut tail latency")
+    parser.add_argument("--paths", nargs="+", default=PATHS, choices=PATHS)
+    parser.add_argument("--requests", type=int, default=1000, help="Reviews per run")
+    parser.add_argument("--users", type=int, default=4, help="Concurrent users sending one review at a time")
+    parser.add_argument("--review-words", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="Median upstream latency")
+    parser.add_argument("--jitter", type=float, default=0.25, help="Lognormal shape of upstream latency")
+    parser.add_argument("--tail-probability", type=float, default=0.03)
+    parser.add_argument("--tail-multiplier", type=float, default=10.0)
+    parser.add_argument("--percentile", type=float, default=0.95, help="Hedge after this latency percentile")
+    parser.add_argument("--max-hedge-rate", type=float, default=0.05, help="Largest share of calls duplicated")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", "-o", default=None, help="Write results as JSON to this path")
+    parser.add_argument("--compare", default=None, help="Baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    reviews = make_reviews(args.requests, args.review_words, seed=args.seed)
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "paths": {}
+    }
+
+    print(f"{'path':>6} {'hedged':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'calls':>6} "
+          f"{'hedge rate':>10} {'hedge wins':>10} {'p99 cut':>8}")
+    for path in args.paths:
+        baseline = run(path, False, reviews, args)
+        hedged = run(path, True, reviews, args)
+        hedged["p99_improvement"] = round(1 - hedged["latency"]["p99_ms"] / baseline["latency"]["p99_ms"], 4)
+        report["paths"][path] = {"baseline": baseline, "hedged": hedged}
+        for result in (baseline, hedged):
+            latency, hedging = result["latency"], result.get("hedging")
+            print(f"{path:>6} {'yes' if result['hedged'] else 'no':>6} {latency['p50_ms']:>8.1f} "
+                  f"{latency['p95_ms']:>8.1f} {latency['p99_ms']:>8.1f} {result['upstream_calls']:>6} "
+                  f"{hedging['hedge_rate'] if hedging else '-':>10} {hedging['hedge_wins'] if hedging else '-':>10} "
+                  f"{format(result['p99_improvement'], '.1%') if 'p99_improvement' in result else '-':>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print(f"\nCompared with {args.compare} (commit {previous.get('commit', 'unknown')}):")
+        regressions = compare(report, previous, args.tolerance)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark multi-review prompt packing against one-review-per-call.
+
+Runs offline against the simulated backend with latency that grows with
+prompt and output size, and reports reviews/second, model calls and
+estimated input tokens per review for each pack size.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_packing --reviews 200 --pack-sizes 1 5 10 20
+"""
+import argparse
+import json
+import time
+
+from backends import SimulatedBackend, lexicon_label
+from benchmarks.common import make_reviews
+from sentiment_llm import SentimentAnalyzer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prompt packing throughput")
+    parser.add_argument("--reviews", type=int, default=200)
+    parser.add_argument("--review-words", type=int, default=40)
+    parser.add_argument("--pack-sizes", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--base-latency-ms", type=float, default=50.0, help="Fixed milliseconds per call")
+    parser.add_argument("--input-ms-per-token", type=float, default=0.02)
+    parser.add_argument("--output-ms-per-token", type=float, default=0.5)
+    args = parser.parse_args()
+
+    reviews = make_reviews(args.reviews, args.review_words)
+    report = []
+    for pack_size in args.pack_sizes:
+        backend = SimulatedBackend(latency="constant", latency_ms=args.base_latency_ms,
+                                   ms_per_input_token=args.input_ms_per_token,
+                                   ms_per_output_token=args.output_ms_per_token)
+        analyzer = SentimentAnalyzer(backend=backend, use_cache=False)
+        start = time.perf_counter()
+        results = analyzer.batch_analyze(reviews, max_concurrency=args.concurrency,
+                                         requests_per_minute=None, pack_size=pack_size,
+                                         progress_callback=lambda done, total: None)
+        elapsed = time.perf_counter() - start
+        agreement = sum(r["label"] == lexicon_label(t)["label"] for r, t in zip(results, reviews)) / len(reviews)
+        report.append({
+            "pack_size": pack_size,
+            "seconds": round(elapsed, 3),
+            "reviews_per_second": round(len(reviews) / elapsed, 1),
+            "model_calls": backend.calls,
+            "input_tokens_per_review": round(backend.input_tokens / len(reviews), 1),
+            "label_agreement": agreement
+        })
+
+    print(f"{'pack':>5} {'seconds':>8} {'reviews/s':>10} {'calls':>6} {'in_tok/review':>14}")
+    for row in report:
+        print(f"{row['pack_size']:>5} {row['seconds']:>8} {row['reviews_per_second']:>10} "
+              f"{row['model_calls']:>6} {row['input_tokens_per_review']:>14}")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
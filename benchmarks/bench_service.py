@@ -0,0 +1,137 @@
+"""
+Load test for the HTTP inference service (service.py).
+
+Starts the service in-process on a free port in front of the simulated
+backend and drives it with concurrent keep-alive clients sending single
+review requests, some of them repeats of reviews other clients are asking
+about at the same time. Reports throughput, request latency, status codes,
+upstream calls and how many requests were coalesced or batched, once per
+micro-batch size.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_service --clients 64 --requests 20 --batch-sizes 1 8
+    python -m benchmarks.bench_service --clients 200 --max-queue 50   # show 429 backpressure
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+
+from backends import SimulatedBackend
+from benchmarks.common import latency_summary, make_reviews
+from metrics import MetricsRegistry
+from sentiment_llm import SentimentAnalyzer
+from service import InferenceService, read_http_message, start_service
+
+
+async def run_client(port: int, reviews: List[str], latencies: List[float], statuses: Dict[int, int]):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for review in reviews:
+            body = json.dumps({"review_text": review}).encode("utf-8")
+            start = time.perf_counter()
+            writer.write(b"POST /v1/analyze HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                         + f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+            start_line, _, _ = await read_http_message(reader)
+            status = int(start_line.split()[1])
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def run_load(batch_size: int, args) -> Dict:
+    backend = SimulatedBackend(latency="constant", latency_ms=args.latency_ms,
+                               ms_per_input_token=args.input_ms_per_token,
+                               ms_per_output_token=args.output_ms_per_token,
+                               capacity=args.backend_capacity)
+    registry = MetricsRegistry()
+    analyzer = SentimentAnalyzer(backend=backend, use_cache=False, metrics=registry)
+    service = InferenceService(analyzer, max_batch_size=batch_size, batch_window=args.batch_window_ms / 1000,
+                               max_concurrency=args.concurrency, max_queue=args.max_queue)
+    server = await start_service(service, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    # Each request repeats a recently requested review with probability duplicate_rate
+    rng = random.Random(args.seed)
+    corpus = make_reviews(args.clients * args.requests, args.review_words, seed=args.seed)
+    workload = [[] for _ in range(args.clients)]
+    recent: List[str] = []
+    for i in range(args.requests):
+        for client in range(args.clients):
+            review = rng.choice(recent[-args.clients:]) if recent and rng.random() < args.duplicate_rate \
+                else corpus[i * args.clients + client]
+            recent.append(review)
+            workload[client].append(review)
+
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(port, reviews, latencies, statuses) for reviews in workload))
+    elapsed = time.perf_counter() - start
+
+    server.close()
+    await server.wait_closed()
+    await service.stop()
+
+    batches = service.batch_size.samples()
+    batch_count = next(value for name, _, value in batches if name.endswith("_count"))
+    batched_reviews = next(value for name, _, value in batches if name.endswith("_sum"))
+    answered = statuses.get(200, 0)
+    return {
+        "batch_size": batch_size,
+        "requests": args.clients * args.requests,
+        "seconds": round(elapsed, 3),
+        "answered_per_second": round(answered / elapsed, 1),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "latency": latency_summary(latencies),
+        "upstream_calls": backend.calls,
+        "coalesced": int(service.coalesced.value()),
+        "mean_batch": round(batched_reviews / batch_count, 2) if batch_count else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the HTTP inference service")
+    parser.add_argument("--clients", type=int, default=64, help="Concurrent keep-alive connections")
+    parser.add_argument("--requests", type=int, default=20, help="Sequential requests per client")
+    parser.add_argument("--duplicate-rate", type=float, default=0.2,
+                        help="Chance a request repeats a review another client just asked about")
+    parser.add_argument("--review-words", type=int, default=40)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--batch-window-ms", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=8, help="Upstream slots in the service")
+    parser.add_argument("--max-queue", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fixed milliseconds per upstream call")
+    parser.add_argument("--input-ms-per-token", type=float, default=0.02)
+    parser.add_argument("--output-ms-per-token", type=float, default=0.5)
+    parser.add_argument("--backend-capacity", type=int, default=None,
+                        help="Simulated backend answers 429 above this many in-flight calls")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", "-o", default=None, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    report = []
+    print(f"{'batch':>5} {'requests':>8} {'ok/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'calls':>6} {'coalesced':>9} {'mean batch':>10}  statuses")
+    for batch_size in args.batch_sizes:
+        result = asyncio.run(run_load(batch_size, args))
+        report.append(result)
+        latency = result["latency"]
+        print(f"{batch_size:>5} {result['requests']:>8} {result['answered_per_second']:>8} "
+              f"{latency['p50_ms']:>8} {latency['p95_ms']:>8} {latency['p99_ms']:>8} "
+              f"{result['upstream_calls']:>6} {result['coalesced']:>9} {result['mean_batch']:>10}  "
+              f"{result['statuses']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Cold-start benchmark: how long a fresh interpreter takes to import the
+analyzer, build one and answer its first review.
+
+Every run is a new `python` process, so nothing is warm except the OS file
+cache and compiled bytecode. The child reports import, construction and
+first-call times and which heavy dependencies (pandas, numpy, pyarrow, the
+Gemini SDK) it ended up loading; the parent adds the whole process wall
+time. The "gemini" scenario builds a GeminiBackend (with a placeholder key
+if none is set) but makes no call, which shows what construction alone
+costs. Pass --importtime to list the slowest imports of one extra run, and
+a previous result file with --compare to flag regressions.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_startup --runs 5 --output startup.json
+    python -m benchmarks.bench_startup --compare startup.json --tolerance 0.25
+    python -m benchmarks.bench_startup --scenarios simulated --importtime 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from benchmarks.bench_suite import git_commit
+
+SCENARIOS = ["simulated", "gemini", "service"]
+
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "google.generativeai", "plotly", "tenacity"]
+
+# Runs in the child; timings are taken around each step and printed as JSON
+CHILD = """
+import json, sys, time
+scenario, heavy = sys.argv[1], sys.argv[2].split(",")
+timings = {}
+start = time.perf_counter()
+if scenario == "service":
+    import service
+from sentiment_llm import SentimentAnalyzer
+timings["import_ms"] = (time.perf_counter() - start) * 1000
+
+start = time.perf_counter()
+if scenario == "gemini":
+    from backends import GeminiBackend
+    backend = GeminiBackend()
+else:
+    from backends import SimulatedBackend
+    backend = SimulatedBackend(latency="constant", latency_ms=0)
+analyzer = SentimentAnalyzer(backend=backend, use_cache=False)
+timings["construct_ms"] = (time.perf_counter() - start) * 1000
+
+if scenario != "gemini":
+    start = time.perf_counter()
+    analyzer.analyze_sentiment("A moving, beautifully acted film.")
+    timings["first_call_ms"] = (time.perf_counter() - start) * 1000
+
+timings["heavy_modules"] = [name for name in heavy if name in sys.modules]
+print(json.dumps(timings))
+"""
+
+
+def run_once(scenario: str, importtime: bool = False) -> Dict:
+    """
+    Run the child for one scenario in a fresh interpreter
+    """
+    env = dict(os.environ)
+    if scenario == "gemini":
+        env.setdefault("GEMINI_API_KEY", "placeholder")
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + \
+        ["-c", CHILD, scenario, ",".join(HEAVY_MODULES)]
+    start = time.perf_counter()
+    completed = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - start) * 1000
+    if importtime:
+        result["importtime"] = completed.stderr
+    return result
+
+
+def slowest_imports(importtime_log: str, top: int) -> List[Dict]:
+    """
+    Modules with the largest cumulative import time, nested ones included
+    """
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        rows.append({"module": name, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    return sorted(rows, key=lambda row: -row["cumulative_ms"])[:top]
+
+
+def summarize(runs: List[Dict]) -> Dict:
+    """
+    Median of each timing across runs
+    """
+    summary = {key: round(statistics.median(run[key] for run in runs), 1)
+               for key in runs[0] if key.endswith("_ms")}
+    summary["heavy_modules"] = runs[-1]["heavy_modules"]
+    summary["runs"] = len(runs)
+    return summary
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> list:
+    """
+    Scenarios whose process or import time rose by more than `tolerance`
+    """
+    regressions = []
+    for name, result in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        changes = {key: result[key] / previous[key] - 1 for key in ("process_ms", "import_ms") if previous.get(key)}
+        print(f"{name:>10}: " + ", ".join(f"{key[:-3]} {change:+.1%}" for key, change in changes.items()))
+        regressions += [f"{name}: {key[:-3]} time rose {change:.1%}"
+                        for key, change in changes.items() if change > tolerance]
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time of the sentiment analyzer")
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per scenario")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N",
+                        help="Also list the N slowest imports of each scenario")
+    parser.add_argument("--output", "-o", default=None, help="Write results as JSON to this path")
+    parser.add_argument("--compare", default=None, help="Baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "scenarios": {}
+    }
+
+    print(f"{'scenario':>10} {'process ms':>10} {'import ms':>9} {'build ms':>8} {'first ms':>8}  heavy modules")
+    for name in args.scenarios:
+        run_once(name)  # warm the bytecode and file caches
+        result = summarize([run_once(name) for _ in range(args.runs)])
+        if args.importtime:
+            result["slowest_imports"] = slowest_imports(run_once(name, importtime=True)["importtime"],
+                                                        args.importtime)
+        report["scenarios"][name] = result
+        print(f"{name:>10} {result['process_ms']:>10} {result['import_ms']:>9} {result['construct_ms']:>8} "
+              f"{result.get('first_call_ms', '-'):>8}  {', '.join(result['heavy_modules']) or '-'}")
+        for row in result.get("slowest_imports", []):
+            print(f"{'':>12}{row['module']:<32} {row['cumulative_ms']:>8.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare} (commit {baseline.get('commit', 'unknown')}):")
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Throughput and latency benchmark suite for the single-review, batch and CSV
+paths, run offline against the simulated backend.
+
+Each scenario runs in a fresh process so peak RSS is attributable to it.
+Results are printed and written as JSON; pass a previous result file with
+--compare to flag throughput or latency regressions.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_suite --reviews 2000 --output bench.json
+    python -m benchmarks.bench_suite --compare bench.json --tolerance 0.2
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict
+
+from benchmarks.common import RecordingBackend, latency_summary, make_reviews, peak_rss_mb
+
+SCENARIOS = ["single", "batch", "csv", "csv_streaming"]
+
+
+def run_scenario(name: str, config: Dict) -> Dict:
+    """
+    Run one scenario in the current process and return its measurements
+    """
+    import pandas as pd
+    from backends import SimulatedBackend
+    from profiling import StageTimer
+    from sentiment_llm import SentimentAnalyzer, process_csv_file_robust, process_csv_file_streaming
+
+    backend = RecordingBackend(SimulatedBackend(
+        latency=config["latency"], latency_ms=config["latency_ms"], jitter=config["jitter"],
+        tail_probability=config["tail_probability"], tail_multiplier=config["tail_multiplier"],
+        seed=config["seed"]
+    ))
+    analyzer = SentimentAnalyzer(backend=backend, use_cache=False)
+    analyzer.stage_timer = StageTimer()
+    batch_options = dict(
+        max_concurrency=config["concurrency"],
+        requests_per_minute=None,
+        pack_size=config["pack_size"],
+        progress_callback=lambda done, total: None
+    )
+
+    reviews = make_reviews(config["reviews"], config["review_words"], seed=config["seed"])
+    if name == "single":
+        reviews = reviews[:config["single_reviews"]]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        input_csv = os.path.join(workdir, "input.csv")
+        output_csv = os.path.join(workdir, "output.csv")
+        if name.startswith("csv"):
+            pd.DataFrame({"review_text": reviews}).to_csv(input_csv, index=False)
+
+        start = time.perf_counter()
+        if name == "single":
+            for review in reviews:
+                analyzer.analyze_sentiment(review)
+        elif name == "batch":
+            analyzer.batch_analyze(reviews, **batch_options)
+        elif name == "csv":
+            process_csv_file_robust(input_csv, output_csv, analyzer=analyzer, **batch_options)
+        elif name == "csv_streaming":
+            process_csv_file_streaming(input_csv, output_csv, chunksize=config["chunksize"],
+                                       resume=False, analyzer=analyzer, **batch_options)
+        else:
+            raise ValueError(f"Unknown scenario: {name}")
+        elapsed = time.perf_counter() - start
+
+    return {
+        "reviews": len(reviews),
+        "seconds": round(elapsed, 4),
+        "reviews_per_second": round(len(reviews) / elapsed, 2),
+        "call_latency": latency_summary(backend.latencies),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": analyzer.stage_timer.summary()
+    }
+
+
+def _child(name: str, config: Dict, queue):
+    # The benchmarks print nothing of interest from inside the pipeline
+    sys.stdout = open(os.devnull, "w")
+    queue.put(run_scenario(name, config))
+
+
+def run_isolated(name: str, config: Dict) -> Dict:
+    """
+    Run a scenario in a spawned process so its peak RSS is its own
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_child, args=(name, config, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> list:
+    """
+    Scenarios whose throughput fell or p95 latency rose by more than `tolerance`
+    """
+    regressions = []
+    for name, result in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        throughput_change = result["reviews_per_second"] / previous["reviews_per_second"] - 1
+        p95_before = previous["call_latency"]["p95_ms"]
+        p95_change = result["call_latency"]["p95_ms"] / p95_before - 1 if p95_before else 0.0
+        print(f"{name:>14}: throughput {throughput_change:+.1%}, p95 call latency {p95_change:+.1%}")
+        if throughput_change < -tolerance:
+            regressions.append(f"{name}: throughput dropped {throughput_change:.1%}")
+        if p95_change > tolerance:
+            regressions.append(f"{name}: p95 latency rose {p95_change:.1%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sentiment pipeline offline")
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument("--reviews", type=int, default=1000, help="Corpus size for batch and CSV scenarios")
+    parser.add_argument("--single-reviews", type=int, default=50, help="Sequential calls in the single scenario")
+    parser.add_argument("--review-words", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--pack-size", type=int, default=1)
+    parser.add_argument("--chunksize", type=int, default=250)
+    parser.add_argument("--latency", default="lognormal",
+                        choices=["constant", "uniform", "exponential", "lognormal"])
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--tail-probability", type=float, default=0.0)
+    parser.add_argument("--tail-multiplier", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", "-o", default=None, help="Write results as JSON to this path")
+    parser.add_argument("--compare", default=None, help="Baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items()
+              if key not in ("scenarios", "output", "compare", "tolerance")}
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": config,
+        "scenarios": {}
+    }
+
+    print(f"{'scenario':>14} {'reviews':>8} {'reviews/s':>10} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'RSS MB':>7}")
+    for name in args.scenarios:
+        result = run_isolated(name, config)
+        report["scenarios"][name] = result
+        latency = result["call_latency"]
+        print(f"{name:>14} {result['reviews']:>8} {result['reviews_per_second']:>10} "
+              f"{latency['p50_ms']:>8} {latency['p95_ms']:>8} {latency['p99_ms']:>8} "
+              f"{result['peak_rss_mb']:>7}")
+        for stage, timing in sorted(result["stages"].items(), key=lambda item: -item[1]["seconds"]):
+            print(f"{'':>16}{stage:<16} {timing['seconds']:>9.3f}s total {timing['mean_ms']:>9.3f} ms mean")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare} (commit {baseline.get('commit', 'unknown')}):")
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Shared helpers for the offline benchmarks: synthetic corpora, a latency
+recording backend wrapper and summary statistics.
+"""
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from backends import BackendResponse, ModelBackend
+
+POSITIVE_WORDS = ["fantastic", "brilliant", "superb", "moving", "great"]
+NEGATIVE_WORDS = ["terrible", "boring", "awful", "dull", "waste"]
+NEUTRAL_WORDS = ["fine", "okay", "average", "passable", "forgettable"]
+FILLER = ["the plot", "the acting", "the score", "the pacing", "the ending", "the cast",
+          "the dialogue", "the cinematography", "the soundtrack", "the editing"]
+
+
+def make_reviews(n: int, words: int, seed: int = 0) -> List[str]:
+    """
+    Synthetic IMDB-style reviews of roughly `words` words each
+    """
+    rng = random.Random(seed)
+    vocabulary = POSITIVE_WORDS + NEGATIVE_WORDS + NEUTRAL_WORDS
+    reviews = []
+    for _ in range(n):
+        parts = []
+        length = 0
+        while length < words:
+            sentence = f"{rng.choice(FILLER)} was {rng.choice(vocabulary)}."
+            parts.append(sentence)
+            length += len(sentence.split())
+        reviews.append(" ".join(parts).capitalize())
+    return reviews
+
+
+class RecordingBackend(ModelBackend):
+    """
+    Wraps a backend and records the latency of every call
+    """
+    def __init__(self, backend: ModelBackend):
+        self.backend = backend
+        self.model_id = backend.model_id
+        self.latencies: List[float] = []
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, temperature: float, max_output_tokens: int,
+                 timeout: Optional[float] = None) -> BackendResponse:
+        start = time.perf_counter()
+        try:
+            return self.backend.generate(prompt, temperature, max_output_tokens, timeout)
+        finally:
+            with self._lock:
+                self.latencies.append(time.perf_counter() - start)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Linear-interpolated percentile (q in 0-100) of a list of numbers
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """
+    p50/p95/p99 and mean of a latency sample, in milliseconds
+    """
+    return {
+        "count": len(seconds),
+        "mean_ms": round(1000 * sum(seconds) / len(seconds), 3) if seconds else 0.0,
+        "p50_ms": round(1000 * percentile(seconds, 50), 3),
+        "p95_ms": round(1000 * percentile(seconds, 95), 3),
+        "p99_ms": round(1000 * percentile(seconds, 99), 3)
+    }
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process in MB (None where unsupported)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
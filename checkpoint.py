@@ -0,0 +1,112 @@
+import json
+import os
+from typing import List, Tuple
+
+
+class Checkpoint:
+    """
+    Append-only record of which input rows have been written to the output.
+
+    Each line is a JSON object covering a contiguous range of row IDs (their
+    0-based position in the input) together with the output file size right
+    after that range was flushed. On resume the output is truncated back to
+    the last recorded size, so rows written after the final checkpoint line
+    (e.g. by a crash mid-chunk) are discarded instead of duplicated.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.ranges: List[Tuple[int, int]] = []
+        self.output_bytes = 0
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        valid_lines = []
+        torn = False
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash; everything before it is valid
+                    torn = True
+                    break
+                valid_lines.append(line if line.endswith("\n") else line + "\n")
+                self._add_range(entry["start"], entry["end"])
+                self.output_bytes = entry["output_bytes"]
+        if torn:
+            # Rewrite without the torn line so later appends start on a clean line
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.writelines(valid_lines)
+
+    def _add_range(self, start: int, end: int):
+        # Chunks usually complete in order, so extend the last range when contiguous
+        if self.ranges and self.ranges[-1][1] == start:
+            self.ranges[-1] = (self.ranges[-1][0], end)
+        else:
+            self.ranges.append((start, end))
+
+    @property
+    def exists(self) -> bool:
+        return bool(self.ranges)
+
+    @property
+    def completed_rows(self) -> int:
+        return sum(end - start for start, end in self.ranges)
+
+    def pending_rows(self, start: int, end: int) -> List[int]:
+        """
+        Row IDs in [start, end) that have not been recorded yet
+        """
+        done = set()
+        for range_start, range_end in self.ranges:
+            if range_start < end and range_end > start:
+                done.update(range(max(start, range_start), min(end, range_end)))
+        return [row_id for row_id in range(start, end) if row_id not in done]
+
+    def truncate_output(self, output_path: str):
+        """
+        Cut the output file back to the size recorded at the last checkpoint
+        """
+        if os.path.exists(output_path) and os.path.getsize(output_path) > self.output_bytes:
+            with open(output_path, "r+b") as f:
+                f.truncate(self.output_bytes)
+
+    def record(self, start: int, end: int, output_bytes: int):
+        """
+        Durably mark rows [start, end) as written
+        """
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"start": start, "end": end, "output_bytes": output_bytes}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._add_range(start, end)
+        self.output_bytes = output_bytes
+
+    def reset(self):
+        """
+        Forget all progress and delete the checkpoint file
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.ranges = []
+        self.output_bytes = 0
+
+
+def checkpointed_rows(path: str) -> int:
+    """
+    Rows recorded in a checkpoint file, read without repairing it (a torn
+    last line is skipped), so a run in progress can be watched from another
+    thread or process
+    """
+    if not os.path.exists(path):
+        return 0
+    rows = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            rows += entry["end"] - entry["start"]
+    return rows
@@ -0,0 +1,161 @@
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 16
+SHINGLE_SIZE = 5
+
+# Texts whose signatures are computed together; bounds the temporary
+# (shingles x num_perm) array to a few tens of MB
+SIGNATURE_BLOCK = 256
+
+# MinHash permutations use multiply-shift hashing h(x) = ((a*x + b) mod 2^64) >> 32,
+# which needs no modulo beyond natural uint64 wraparound
+SHIFT_32 = np.uint64(32)
+GOLDEN_RATIO_64 = np.uint64(0x9E3779B97F4A7C15)
+
+NON_WORD = re.compile(r"[^\w\s]+")
+
+
+def normalize_for_dedup(text: str) -> str:
+    """
+    Lowercase, drop punctuation and collapse whitespace so reposts with
+    cosmetic edits compare equal
+    """
+    return " ".join(NON_WORD.sub(" ", str(text).lower()).split())
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """
+    32-bit hashes of the byte n-grams of a normalized review.
+
+    Each window of `size` UTF-8 bytes is packed into a uint64 and mixed with
+    a multiplicative hash, all in NumPy, so no per-shingle Python work is done.
+    """
+    data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+    if len(data) <= size:
+        packed = np.zeros(1, dtype=np.uint64)
+        for k, byte in enumerate(data):
+            packed[0] |= byte << np.uint64(8 * k)
+    else:
+        windows = len(data) - size + 1
+        packed = np.zeros(windows, dtype=np.uint64)
+        for k in range(size):
+            packed |= data[k:k + windows] << np.uint64(8 * k)
+    return (packed * GOLDEN_RATIO_64) >> SHIFT_32
+
+
+class MinHasher:
+    """
+    Vectorized MinHash signatures over byte shingles
+    """
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        # Odd 64-bit multipliers and arbitrary offsets
+        self.a = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        return self.signatures([text])[0]
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        """
+        Signatures for many texts at once, one row per text.
+
+        Shingles of all texts are permuted in a single array operation and
+        reduced per text with `np.minimum.reduceat`.
+        """
+        hashes = [shingles(text) for text in texts]
+        offsets = np.cumsum([0] + [len(h) for h in hashes[:-1]])
+        # Permutations along rows so reduceat runs over contiguous memory
+        permuted = (self.a[:, None] * np.concatenate(hashes)[None, :] + self.b[:, None]) >> SHIFT_32
+        return np.minimum.reduceat(permuted.astype(np.uint32), offsets, axis=1).T.copy()
+
+
+class UnionFind:
+    """
+    Disjoint sets whose root is always the smallest member index
+    """
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, i: int) -> int:
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, i: int, j: int):
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i != root_j:
+            self.parent[max(root_i, root_j)] = min(root_i, root_j)
+
+
+def find_duplicate_groups(texts: List[str], threshold: float = DEFAULT_THRESHOLD,
+                          num_perm: int = DEFAULT_NUM_PERM, bands: int = DEFAULT_BANDS) -> List[int]:
+    """
+    Map every text to the index of its group's representative (the first
+    occurrence in input order).
+
+    Exact duplicates after normalization are grouped by a dictionary lookup.
+    Remaining texts get a MinHash signature that is split into `bands` LSH
+    bands; texts sharing any band bucket become candidates and are merged
+    when their estimated Jaccard similarity reaches `threshold`. Each text is
+    compared only with the first occupant of its buckets, so the work is
+    linear in the number of texts.
+    """
+    if num_perm % bands:
+        raise ValueError("num_perm must be divisible by bands")
+    rows = num_perm // bands
+    min_matches = threshold * num_perm
+    hasher = MinHasher(num_perm)
+    groups = UnionFind(len(texts))
+
+    # Exact duplicates (after normalization) never need a signature
+    exact: Dict[str, int] = {}
+    unique: List[int] = []
+    normalized_texts: List[str] = []
+    for i, text in enumerate(texts):
+        normalized = normalize_for_dedup(text)
+        if normalized in exact:
+            groups.union(exact[normalized], i)
+        else:
+            exact[normalized] = i
+            unique.append(i)
+            normalized_texts.append(normalized)
+    del exact
+
+    buckets: Dict[Tuple[int, bytes], int] = {}
+    signatures: Dict[int, np.ndarray] = {}
+    for block_start in range(0, len(unique), SIGNATURE_BLOCK):
+        block = unique[block_start:block_start + SIGNATURE_BLOCK]
+        block_signatures = hasher.signatures(normalized_texts[block_start:block_start + SIGNATURE_BLOCK])
+        for i, signature in zip(block, block_signatures):
+            signatures[i] = signature
+            candidates = set()
+            for band in range(bands):
+                key = (band, signature[band * rows:(band + 1) * rows].tobytes())
+                other = buckets.setdefault(key, i)
+                if other != i:
+                    candidates.add(other)
+            for other in candidates:
+                if groups.find(other) != groups.find(i) and \
+                        np.count_nonzero(signatures[other] == signature) >= min_matches:
+                    groups.union(other, i)
+
+    return [groups.find(i) for i in range(len(texts))]
+
+
+def collapse(texts: List[str], threshold: float = DEFAULT_THRESHOLD) -> Tuple[List[int], List[int]]:
+    """
+    Return (representative indices, group id per text) for a batch
+    """
+    group_of = find_duplicate_groups(texts, threshold=threshold)
+    representatives = sorted(set(group_of))
+    return representatives, group_of
@@ -0,0 +1,246 @@
+import json
+import warnings
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from batch_io import iter_chunks
+from fast_classifier import LABELS
+
+DEFAULT_CALIBRATION_BINS = 10
+DEFAULT_EVAL_CHUNKSIZE = 1_000_000
+DEFAULT_CONFIDENCE_LEVEL = 0.95
+
+# Confusion matrix column for predictions outside the label set (e.g. "Error")
+OTHER_PREDICTION = "Other"
+
+EVAL_COLUMNS = ["true_sentiment", "predicted_label", "confidence_score"]
+
+
+def label_codes(values, labels: Sequence[str] = LABELS) -> np.ndarray:
+    """
+    Index of each value in `labels`, or -1 for anything else (including
+    missing values)
+    """
+    return pd.Categorical(values, categories=labels).codes.astype(np.int64)
+
+
+def confusion_scores(confusion: np.ndarray, undefined: float = 0.0) -> Dict[str, np.ndarray]:
+    """
+    Accuracy and per-class precision, recall and F1 from a confusion matrix
+    of shape (..., k, k + 1) (rows actual, columns predicted, last column
+    predictions outside the label set). Leading dimensions are kept, so a
+    stack of bootstrap matrices is scored in one call. Undefined per-class
+    ratios are `undefined`: precision for a class never predicted, recall
+    for one absent from the truth, F1 for one that is neither. Averages
+    always count them as 0.
+    """
+    k = confusion.shape[-2]
+    true_positive = np.diagonal(confusion[..., :k], axis1=-2, axis2=-1).astype(np.float64)
+    support = confusion.sum(axis=-1).astype(np.float64)
+    predicted = confusion[..., :k].sum(axis=-2).astype(np.float64)
+    total = support.sum(axis=-1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted > 0, true_positive / predicted, 0.0)
+        recall = np.where(support > 0, true_positive / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        accuracy = np.where(total > 0, true_positive.sum(axis=-1) / total, 0.0)
+        weights = np.where(total[..., None] > 0, support / total[..., None], 0.0)
+        # Macro averages cover the classes that occur as either truth or prediction
+        present = (support + predicted) > 0
+        macro = lambda scores: np.where(present.any(axis=-1),
+                                        (scores * present).sum(axis=-1) / present.sum(axis=-1), 0.0)
+
+    return {
+        "accuracy": accuracy,
+        "precision": np.where(predicted > 0, precision, undefined),
+        "recall": np.where(support > 0, recall, undefined),
+        "f1": np.where(present, f1, undefined),
+        "macro_precision": macro(precision),
+        "macro_recall": macro(recall),
+        "macro_f1": macro(f1),
+        "weighted_precision": (precision * weights).sum(axis=-1),
+        "weighted_recall": (recall * weights).sum(axis=-1),
+        "weighted_f1": (f1 * weights).sum(axis=-1)
+    }
+
+
+class Evaluator:
+    """
+    Single-pass evaluation of a results file.
+
+    `update` folds a chunk of (true label, predicted label, confidence) into
+    fixed-size counters: the confusion matrix, and per calibration bin the
+    row count, confidence sum and number correct. Memory does not grow with
+    the number of rows, so files larger than RAM can be evaluated chunk by
+    chunk. `report` derives every metric from those counters.
+
+    Bootstrap intervals use the Poisson bootstrap: resampling rows with
+    Poisson(1) weights makes each confusion matrix cell Poisson(count), so
+    replicates are drawn from the finished matrix without a second pass.
+    """
+    def __init__(self, labels: Sequence[str] = LABELS, n_bins: int = DEFAULT_CALIBRATION_BINS):
+        self.labels = list(labels)
+        self.n_bins = n_bins
+        k = len(self.labels)
+        self.confusion = np.zeros((k, k + 1), dtype=np.int64)
+        # Rows whose true label is missing or not one of `labels`
+        self.skipped = 0
+        # Rows with a predicted label but no usable confidence score
+        self.missing_confidence = 0
+        self.bin_counts = np.zeros(n_bins, dtype=np.int64)
+        self.bin_confidence = np.zeros(n_bins, dtype=np.float64)
+        self.bin_correct = np.zeros(n_bins, dtype=np.int64)
+        # Per predicted class (including OTHER_PREDICTION): rows with a score, score sum
+        self.class_scored = np.zeros(k + 1, dtype=np.int64)
+        self.class_confidence = np.zeros(k + 1, dtype=np.float64)
+
+    def update(self, true_labels, predicted_labels, confidence):
+        k = len(self.labels)
+        truth = label_codes(true_labels, self.labels)
+        predicted = label_codes(predicted_labels, self.labels)
+        predicted[predicted < 0] = k
+        confidence = pd.to_numeric(pd.Series(confidence), errors="coerce").to_numpy(np.float64, na_value=np.nan)
+
+        known = truth >= 0
+        self.skipped += int((~known).sum())
+        truth, predicted, confidence = truth[known], predicted[known], confidence[known]
+        self.confusion += np.bincount(truth * (k + 1) + predicted, minlength=k * (k + 1)).reshape(k, k + 1)
+
+        scored = np.isfinite(confidence)
+        self.missing_confidence += int((~scored & (predicted < k)).sum())
+        self.class_scored += np.bincount(predicted[scored], minlength=k + 1)
+        self.class_confidence += np.bincount(predicted[scored], weights=confidence[scored], minlength=k + 1)
+
+        # Calibration only covers real answers; errors carry no meaningful score
+        scored &= predicted < k
+        score = np.clip(confidence[scored], 0.0, 1.0)
+        bins = np.minimum((score * self.n_bins).astype(np.int64), self.n_bins - 1)
+        self.bin_counts += np.bincount(bins, minlength=self.n_bins)
+        self.bin_confidence += np.bincount(bins, weights=score, minlength=self.n_bins)
+        self.bin_correct += np.bincount(bins, weights=truth[scored] == predicted[scored],
+                                        minlength=self.n_bins).astype(np.int64)
+
+    def calibration(self) -> Dict:
+        """
+        Reliability table plus expected and maximum calibration error
+        """
+        counts = self.bin_counts
+        scored = counts.sum()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean_confidence = np.where(counts > 0, self.bin_confidence / counts, 0.0)
+            accuracy = np.where(counts > 0, self.bin_correct / counts, 0.0)
+        gaps = np.abs(accuracy - mean_confidence)
+        edges = np.linspace(0.0, 1.0, self.n_bins + 1)
+        return {
+            "ece": float((gaps * counts).sum() / scored) if scored else 0.0,
+            "mce": float(gaps[counts > 0].max()) if scored else 0.0,
+            "bins": [
+                {"lower": round(float(edges[i]), 6), "upper": round(float(edges[i + 1]), 6),
+                 "count": int(counts[i]), "mean_confidence": float(mean_confidence[i]),
+                 "accuracy": float(accuracy[i])}
+                for i in range(self.n_bins)
+            ]
+        }
+
+    def report(self, bootstrap: int = 0, confidence_level: float = DEFAULT_CONFIDENCE_LEVEL,
+               seed: Optional[int] = None) -> Dict:
+        """
+        The evaluation as a JSON-serializable dict, with percentile intervals
+        from `bootstrap` replicates if requested
+        """
+        scores = confusion_scores(self.confusion)
+        predicted_labels = self.labels + [OTHER_PREDICTION]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            class_confidence = np.where(self.class_scored > 0, self.class_confidence / self.class_scored, np.nan)
+        scored = self.class_scored.sum()
+
+        report = {
+            "rows": int(self.confusion.sum()) + self.skipped,
+            "evaluated": int(self.confusion.sum()),
+            "skipped": self.skipped,
+            "accuracy": float(scores["accuracy"]),
+            "macro_avg": {metric: float(scores["macro_" + metric]) for metric in ("precision", "recall", "f1")},
+            "weighted_avg": {metric: float(scores["weighted_" + metric]) for metric in ("precision", "recall", "f1")},
+            "classes": {
+                label: {
+                    "precision": float(scores["precision"][i]),
+                    "recall": float(scores["recall"][i]),
+                    "f1": float(scores["f1"][i]),
+                    "support": int(self.confusion[i].sum()),
+                    "predicted": int(self.confusion[:, i].sum())
+                }
+                for i, label in enumerate(self.labels)
+            },
+            "confusion_matrix": {
+                "actual": self.labels,
+                "predicted": predicted_labels,
+                "counts": self.confusion.tolist()
+            },
+            "confidence": {
+                "mean": float(self.class_confidence.sum() / scored) if scored else None,
+                "missing": self.missing_confidence,
+                "by_predicted_label": {label: None if np.isnan(value) else float(value)
+                                       for label, value in zip(predicted_labels, class_confidence)}
+            },
+            "calibration": self.calibration()
+        }
+        if bootstrap:
+            report["bootstrap"] = self.bootstrap_intervals(bootstrap, confidence_level, seed)
+        return report
+
+    def bootstrap_intervals(self, replicates: int, confidence_level: float = DEFAULT_CONFIDENCE_LEVEL,
+                            seed: Optional[int] = None) -> Dict:
+        """
+        Percentile intervals of the headline metrics over `replicates`
+        Poisson bootstrap samples. A class's precision or recall is left out
+        of the samples in which it is undefined (the class drew no
+        predictions or no true rows), rather than counted as 0; it is None
+        if it was never defined.
+        """
+        rng = np.random.default_rng(seed)
+        samples = confusion_scores(rng.poisson(self.confusion, size=(replicates,) + self.confusion.shape),
+                                   undefined=np.nan)
+        tail = (1.0 - confidence_level) / 2 * 100
+        interval = lambda values: [float(bound) for bound in np.percentile(values, [tail, 100 - tail], axis=0)]
+        with warnings.catch_warnings():
+            # All-NaN columns (a class undefined in every sample) become None below
+            warnings.simplefilter("ignore", RuntimeWarning)
+            per_class = {metric: np.nanpercentile(samples[metric], [tail, 100 - tail], axis=0)
+                         for metric in ("precision", "recall", "f1")}
+        bound = lambda value: None if np.isnan(value) else float(value)
+        return {
+            "replicates": replicates,
+            "confidence_level": confidence_level,
+            "accuracy": interval(samples["accuracy"]),
+            "macro_f1": interval(samples["macro_f1"]),
+            "weighted_f1": interval(samples["weighted_f1"]),
+            "classes": {
+                label: {metric: [bound(bounds[0][i]), bound(bounds[1][i])] for metric, bounds in per_class.items()}
+                for i, label in enumerate(self.labels)
+            }
+        }
+
+
+def evaluate_file(path: str, chunksize: int = DEFAULT_EVAL_CHUNKSIZE, n_bins: int = DEFAULT_CALIBRATION_BINS,
+                  bootstrap: int = 0, confidence_level: float = DEFAULT_CONFIDENCE_LEVEL,
+                  seed: Optional[int] = None) -> Dict:
+    """
+    Evaluate a CSV, JSONL or Parquet results file in one streaming pass,
+    reading only the label and confidence columns
+    """
+    evaluator = Evaluator(n_bins=n_bins)
+    for _, chunk in iter_chunks(path, chunksize, columns=EVAL_COLUMNS):
+        evaluator.update(chunk["true_sentiment"], chunk["predicted_label"], chunk["confidence_score"])
+    report = evaluator.report(bootstrap, confidence_level, seed)
+    report["source"] = path
+    return report
+
+
+def write_report(report: Dict, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
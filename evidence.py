@@ -0,0 +1,220 @@
+"""
+Locating evidence phrases in the reviews they were quoted from.
+
+The model returns `evidence_phrases` as free strings, which may differ from
+the review in case, spacing and punctuation, and sometimes do not occur in
+it at all. Reviews and phrases are both reduced to lowercase word tokens,
+and the phrases of a block of rows are compiled into one Aho-Corasick
+automaton over those tokens, so every review is scanned once, in time linear
+in its length, no matter how many phrases it is checked against. Phrases not
+found exactly fall back to a fuzzy match against windows of the review's
+tokens. Each phrase gets the character span it covers in the original text,
+or None when it could not be located (evidence the model made up).
+"""
+import re
+from difflib import SequenceMatcher
+from itertools import accumulate
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+Span = Tuple[int, int]
+
+# Words, keeping contractions ("don't") in one token
+TOKEN = re.compile(r"\w+(?:'\w+)*")
+TOKEN_SPLIT = re.compile(r"(\w+(?:'\w+)*)")
+
+# Minimum difflib similarity for a phrase to match a window of the review
+# when it does not occur verbatim
+DEFAULT_FUZZY_THRESHOLD = 0.85
+
+# Leading characters a review token must share with a phrase token for the
+# windows around it to be fuzzy-matched
+FUZZY_PREFIX = 3
+
+# Rows whose phrases share one automaton; bounds its size on large batches
+DEFAULT_BLOCK_ROWS = 10_000
+
+
+def tokenize(text: str) -> Tuple[List[str], List[Span]]:
+    """
+    Lowercase word tokens of a text and their character spans
+    """
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # Rare characters whose lowercase form is longer; offsets need a match per token
+        matches = list(TOKEN.finditer(text))
+        return [match.group().lower() for match in matches], [match.span() for match in matches]
+    # Splitting on a capturing pattern alternates separators and tokens, so the
+    # running length of the parts gives every token's offsets without a Python loop
+    parts = TOKEN_SPLIT.split(lowered)
+    offsets = list(accumulate(map(len, parts)))
+    return parts[1::2], list(zip(offsets[0::2], offsets[1::2]))
+
+
+class PhraseAutomaton:
+    """
+    Aho-Corasick automaton over token sequences.
+
+    Patterns are added as tuples of tokens and get consecutive ids; `build`
+    then computes the failure links. `scan(tokens)` yields (pattern id, end)
+    for every occurrence, `end` being the index after its last token.
+    """
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._pattern: List[Optional[int]] = [None]  # pattern ending at each state
+        self._fail: List[int] = [0]
+        self._output: List[int] = [0]  # nearest state on the failure chain that ends a pattern
+        self.lengths: List[int] = []
+        self._ids: Dict[Tuple[str, ...], int] = {}
+
+    def add(self, tokens: Tuple[str, ...]) -> int:
+        """
+        The id of a pattern, adding it if it is new
+        """
+        if tokens in self._ids:
+            return self._ids[tokens]
+        state = 0
+        for token in tokens:
+            following = self._goto[state].get(token)
+            if following is None:
+                following = len(self._goto)
+                self._goto[state][token] = following
+                self._goto.append({})
+                self._pattern.append(None)
+                self._fail.append(0)
+                self._output.append(0)
+            state = following
+        pattern = self._ids[tokens] = len(self.lengths)
+        self._pattern[state] = pattern
+        self.lengths.append(len(tokens))
+        return pattern
+
+    def build(self) -> "PhraseAutomaton":
+        """
+        Compute failure and output links breadth-first
+        """
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for token, following in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(token, 0)
+                self._fail[following] = target if target != following else 0
+                fallback = self._fail[following]
+                self._output[following] = fallback if self._pattern[fallback] is not None \
+                    else self._output[fallback]
+                queue.append(following)
+        return self
+
+    def scan(self, tokens: Sequence[str]) -> Iterable[Tuple[int, int]]:
+        goto, fail, pattern, output = self._goto, self._fail, self._pattern, self._output
+        state = 0
+        for end, token in enumerate(tokens, 1):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            match = state if pattern[state] is not None else output[state]
+            while match:
+                yield pattern[match], end
+                match = output[match]
+
+
+def fuzzy_span(phrase: Sequence[str], tokens: Sequence[str], spans: Sequence[Span],
+               threshold: float = DEFAULT_FUZZY_THRESHOLD) -> Optional[Span]:
+    """
+    The span of the window of `tokens` (one token shorter to one longer than
+    the phrase) most similar to it, if the similarity reaches `threshold`.
+    Only windows holding a token that starts like one of the phrase's are
+    compared.
+    """
+    prefixes = {token[:FUZZY_PREFIX] for token in phrase}
+    anchors = [i for i, token in enumerate(tokens) if token[:FUZZY_PREFIX] in prefixes]
+    if not anchors:
+        return None
+    matcher = SequenceMatcher(autojunk=False)
+    matcher.set_seq2(" ".join(phrase))
+    best, best_ratio = None, threshold
+    for size in {max(1, len(phrase) - 1), len(phrase), len(phrase) + 1}:
+        starts = sorted({start for anchor in anchors
+                         for start in range(max(0, anchor - size + 1), min(anchor, len(tokens) - size) + 1)})
+        for start in starts:
+            matcher.set_seq1(" ".join(tokens[start:start + size]))
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = (spans[start][0], spans[start + size - 1][1]), ratio
+    return best
+
+
+def locate_block(texts: Sequence[str], phrases: Sequence[Sequence[str]],
+                 fuzzy_threshold: Optional[float]) -> List[Tuple[Optional[Span], ...]]:
+    automaton = PhraseAutomaton()
+    wanted = [[automaton.add(tuple(tokenize(phrase)[0])) for phrase in row_phrases or ()]
+              for row_phrases in phrases]
+    automaton.build()
+
+    located = []
+    for text, row_phrases, ids in zip(texts, phrases, wanted):
+        tokens, token_spans = tokenize(text)
+        found: Dict[int, Span] = {}
+        if ids:
+            pending = set(ids)
+            for pattern, end in automaton.scan(tokens):
+                if pattern in pending:
+                    pending.discard(pattern)
+                    found[pattern] = (token_spans[end - automaton.lengths[pattern]][0], token_spans[end - 1][1])
+                    if not pending:
+                        break
+        row = []
+        for phrase, pattern in zip(row_phrases or (), ids):
+            span = found.get(pattern)
+            if span is None and fuzzy_threshold is not None and automaton.lengths[pattern]:
+                span = fuzzy_span(tokenize(phrase)[0], tokens, token_spans, fuzzy_threshold)
+            row.append(span)
+        located.append(tuple(row))
+    return located
+
+
+def locate_batch(texts: Sequence[str], phrases: Sequence[Sequence[str]],
+                 fuzzy_threshold: Optional[float] = DEFAULT_FUZZY_THRESHOLD,
+                 block_rows: int = DEFAULT_BLOCK_ROWS) -> List[Tuple[Optional[Span], ...]]:
+    """
+    The span of each row's evidence phrases in its text, row by row (None
+    for phrases that could not be located). One automaton is built per
+    `block_rows` rows; `fuzzy_threshold=None` disables the fuzzy fallback.
+    """
+    located = []
+    for start in range(0, len(texts), block_rows):
+        located += locate_block(texts[start:start + block_rows], phrases[start:start + block_rows],
+                                fuzzy_threshold)
+    return located
+
+
+def locate(text: str, phrases: Sequence[str],
+           fuzzy_threshold: Optional[float] = DEFAULT_FUZZY_THRESHOLD) -> Tuple[Optional[Span], ...]:
+    """
+    The span of each evidence phrase in one review
+    """
+    return locate_block([text], [phrases], fuzzy_threshold)[0]
+
+
+def format_spans(spans: Optional[Sequence[Optional[Span]]]) -> str:
+    """
+    Spans as 'start:end' joined with ', ' (aligned with the CSV
+    evidence_phrases column), '-' for phrases that were not located
+    """
+    return ', '.join(f"{span[0]}:{span[1]}" if span else "-" for span in spans or ())
+
+
+def merge_spans(spans: Iterable[Optional[Span]]) -> List[Span]:
+    """
+    The located spans sorted, with overlapping ones merged (for highlighting)
+    """
+    merged: List[Span] = []
+    for start, end in sorted(span for span in spans if span):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
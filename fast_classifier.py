@@ -0,0 +1,188 @@
+import argparse
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+LABELS = ["Positive", "Negative", "Neutral"]
+DEFAULT_NUM_FEATURES = 2 ** 18
+DEFAULT_THRESHOLD = 0.9
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+|[!?]")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def ngrams(text: str) -> List[str]:
+    """
+    Word unigrams and bigrams of a review
+    """
+    tokens = tokenize(text)
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class FastClassifier:
+    """
+    Hashed n-gram multinomial logistic regression implemented in NumPy.
+
+    Meant as a cheap first tier in front of the LLM: it is trained on labels
+    the LLM already produced (results.csv-style files) and only answers when
+    its top class probability clears a confidence threshold.
+    """
+    def __init__(self, num_features: int = DEFAULT_NUM_FEATURES):
+        self.num_features = num_features
+        self.weights = np.zeros((num_features, len(LABELS)), dtype=np.float32)
+        self.bias = np.zeros(len(LABELS), dtype=np.float32)
+
+    def _hash(self, gram: str) -> int:
+        # crc32 rather than hash() so feature indices are stable across processes
+        return zlib.crc32(gram.encode("utf-8")) % self.num_features
+
+    def _features(self, text: str) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        grams = ngrams(text)
+        if not grams:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32), []
+        indices = np.fromiter((self._hash(g) for g in grams), dtype=np.int64, count=len(grams))
+        # L2-normalized term counts so long reviews don't saturate the softmax
+        values = np.full(len(grams), 1.0 / np.sqrt(len(grams)), dtype=np.float32)
+        return indices, values, grams
+
+    def predict_proba(self, text: str) -> np.ndarray:
+        indices, values, _ = self._features(text)
+        return self._probabilities(indices, values)
+
+    def _probabilities(self, indices: np.ndarray, values: np.ndarray) -> np.ndarray:
+        logits = self.bias + values @ self.weights[indices] if len(indices) else self.bias.copy()
+        return softmax(logits[None, :])[0]
+
+    def predict(self, text: str) -> Dict:
+        """
+        Classify one review, returning the usual result schema
+        """
+        indices, values, grams = self._features(text)
+        probs = self._probabilities(indices, values)
+        label_index = int(np.argmax(probs))
+
+        # Evidence: the n-grams pushing hardest toward the predicted class
+        evidence = []
+        if grams:
+            contribution = self.weights[indices, label_index] - self.weights[indices].mean(axis=1)
+            for position in np.argsort(-contribution):
+                if contribution[position] <= 0 or len(evidence) == 3:
+                    break
+                if grams[position] not in evidence:
+                    evidence.append(grams[position])
+
+        return {
+            "label": LABELS[label_index],
+            "confidence": round(float(probs[label_index]), 2),
+            "explanation": f"Local fast-path classifier ({probs[label_index]:.0%} class probability)",
+            "evidence_phrases": evidence
+        }
+
+    def fit(self, texts: List[str], labels: List[str], sample_weight: Optional[List[float]] = None,
+            epochs: int = 200, learning_rate: float = 0.5, l2: float = 1e-4):
+        """
+        Full-batch gradient descent on the softmax cross-entropy loss
+        """
+        targets = np.array([LABELS.index(label) for label in labels])
+        weight = np.ones(len(texts), dtype=np.float32) if sample_weight is None else \
+            np.asarray(sample_weight, dtype=np.float32)
+        weight = weight / weight.sum()
+
+        # Flatten every document's features into one CSR-style layout
+        doc_features = [self._features(text)[:2] for text in texts]
+        lengths = np.array([len(idx) for idx, _ in doc_features])
+        indices = np.concatenate([idx for idx, _ in doc_features]) if len(texts) else np.zeros(0, dtype=np.int64)
+        values = np.concatenate([val for _, val in doc_features]) if len(texts) else np.zeros(0, dtype=np.float32)
+        doc_of_token = np.repeat(np.arange(len(texts)), lengths)
+        onehot = np.eye(len(LABELS), dtype=np.float32)[targets]
+
+        for _ in range(epochs):
+            token_logits = self.weights[indices] * values[:, None]
+            logits = np.zeros((len(texts), len(LABELS)), dtype=np.float32)
+            np.add.at(logits, doc_of_token, token_logits)
+            logits += self.bias
+            delta = (softmax(logits) - onehot) * weight[:, None]
+
+            grad = np.zeros_like(self.weights)
+            np.add.at(grad, indices, delta[doc_of_token] * values[:, None])
+            grad += l2 * self.weights
+            self.weights -= learning_rate * grad
+            self.bias -= learning_rate * delta.sum(axis=0)
+        return self
+
+    def save(self, path: str):
+        np.savez_compressed(path, weights=self.weights, bias=self.bias)
+
+    @classmethod
+    def load(cls, path: str) -> "FastClassifier":
+        data = np.load(path)
+        model = cls(num_features=data["weights"].shape[0])
+        model.weights = data["weights"]
+        model.bias = data["bias"]
+        return model
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+
+def load_training_data(csv_path: str, label_column: str = "predicted_label",
+                       weight_column: Optional[str] = "confidence_score"):
+    """
+    Read review texts, labels and optional weights from a results.csv-style file
+    """
+    import pandas as pd
+
+    df = pd.read_csv(csv_path)
+    df = df[df[label_column].isin(LABELS) & df["review_text"].notna()]
+    weights = df[weight_column].clip(lower=0.05).tolist() if weight_column and weight_column in df else None
+    return df["review_text"].astype(str).tolist(), df[label_column].tolist(), weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or evaluate the local fast-path classifier")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train = subparsers.add_parser("train", help="Fit a model on accumulated LLM results")
+    train.add_argument("--input", "-i", required=True, nargs="+", help="results.csv-style files")
+    train.add_argument("--model", "-m", required=True, help="Output model path (.npz)")
+    train.add_argument("--label-column", default="predicted_label")
+    train.add_argument("--epochs", type=int, default=200)
+
+    evaluate = subparsers.add_parser("evaluate", help="Report accuracy and coverage at a threshold")
+    evaluate.add_argument("--input", "-i", required=True)
+    evaluate.add_argument("--model", "-m", required=True)
+    evaluate.add_argument("--label-column", default="predicted_label")
+    evaluate.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    args = parser.parse_args()
+
+    if args.command == "train":
+        texts, labels, weights = [], [], []
+        for path in args.input:
+            t, l, w = load_training_data(path, args.label_column)
+            texts += t
+            labels += l
+            weights += w if w is not None else [1.0] * len(t)
+        model = FastClassifier().fit(texts, labels, sample_weight=weights, epochs=args.epochs)
+        model.save(args.model)
+        print(f"Trained on {len(texts)} reviews, saved to {args.model}")
+    else:
+        model = FastClassifier.load(args.model)
+        texts, labels, _ = load_training_data(args.input, args.label_column, weight_column=None)
+        predictions = [model.predict(text) for text in texts]
+        answered = [(p, l) for p, l in zip(predictions, labels) if p["confidence"] >= args.threshold]
+        correct = sum(p["label"] == l for p, l in answered)
+        print(f"Coverage at threshold {args.threshold}: {len(answered)}/{len(texts)} "
+              f"({len(answered) / max(len(texts), 1):.1%})")
+        print(f"Accuracy on answered reviews: {correct / max(len(answered), 1):.1%}")
+
+
+if __name__ == "__main__":
+    main()
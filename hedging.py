@@ -0,0 +1,156 @@
+"""
+Hedged requests for the interactive path.
+
+A model call that has not answered by the time most recent calls had (a
+tunable percentile of their latency) is usually stuck in the backend's long
+tail, and a second copy of the same request will often overtake it. A
+Hedger issues that copy and returns whichever answer arrives first and is
+valid; the slower one is discarded when it lands. Hedges are capped at
+`max_hedge_rate` of all calls, so the extra load stays bounded even when
+the whole backend slows down.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Percentile of recent latency after which a duplicate request is sent
+DEFAULT_HEDGE_PERCENTILE = 0.95
+
+# Largest share of calls that may be duplicated
+DEFAULT_MAX_HEDGE_RATE = 0.05
+
+# Recent call latencies (per kind of call) the hedge delay is computed from
+DEFAULT_HEDGE_WINDOW = 200
+
+# Calls of a kind that must have been seen before any of them is hedged
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+
+# Threads running primaries and hedges; calls beyond this many queue
+DEFAULT_HEDGE_WORKERS = 32
+
+
+class Hedger:
+    """
+    Runs calls with a hedge, see the module docstring.
+
+    `call(fn, kind)` runs `fn()` and, if it has not finished after the
+    `percentile` latency of the last `window` calls of the same kind, runs
+    it a second time while the hedge budget allows. A result is taken if
+    `accept(result)` holds; otherwise (or on an error) the other copy is
+    waited for, and if neither is acceptable the primary's outcome is
+    returned or raised. `discard(result)` is called on answers that lost
+    the race, e.g. to close a stream. Until `min_samples` calls of a kind
+    have completed they run inline and are never hedged. `on_hedge(winner)`
+    is told whether the "primary" or the "hedge" answered each hedged call,
+    or "none" if neither was acceptable.
+    """
+    def __init__(self, percentile: float = DEFAULT_HEDGE_PERCENTILE,
+                 max_hedge_rate: float = DEFAULT_MAX_HEDGE_RATE,
+                 window: int = DEFAULT_HEDGE_WINDOW, min_samples: int = DEFAULT_HEDGE_MIN_SAMPLES,
+                 max_workers: int = DEFAULT_HEDGE_WORKERS,
+                 on_hedge: Optional[Callable[[str], None]] = None):
+        self.percentile = percentile
+        self.max_hedge_rate = max_hedge_rate
+        self.window = window
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self.on_hedge = on_hedge
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies: Dict[str, deque] = {}
+        self._delays: Dict[str, Optional[float]] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def delay(self, kind: str = "single") -> Optional[float]:
+        """
+        Seconds a call of this kind may take before it is hedged; None
+        while too few calls have been seen
+        """
+        with self._lock:
+            if kind not in self._delays:
+                latencies = self._latencies.get(kind, ())
+                if len(latencies) < self.min_samples:
+                    return None
+                ordered = sorted(latencies)
+                self._delays[kind] = ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+            return self._delays[kind]
+
+    def _record(self, kind: str, seconds: float):
+        with self._lock:
+            self._latencies.setdefault(kind, deque(maxlen=self.window)).append(seconds)
+            self._delays.pop(kind, None)
+
+    def _timed(self, fn: Callable[[], T], kind: str) -> Callable[[], T]:
+        def run() -> T:
+            start = time.perf_counter()
+            try:
+                return fn()
+            finally:
+                self._record(kind, time.perf_counter() - start)
+        return run
+
+    def _may_hedge(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > self.max_hedge_rate * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+    def call(self, fn: Callable[[], T], kind: str = "single",
+             accept: Callable[[T], bool] = lambda result: True,
+             discard: Optional[Callable[[T], None]] = None) -> T:
+        with self._lock:
+            self.calls += 1
+        delay = self.delay(kind)
+        if delay is None:
+            return self._timed(fn, kind)()
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="hedge")
+        primary = self._executor.submit(self._timed(fn, kind))
+        if wait([primary], timeout=delay).done or not self._may_hedge():
+            return primary.result()
+
+        hedge = self._executor.submit(self._timed(fn, kind))
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in (primary, hedge):
+                if future in done and future.exception() is None and accept(future.result()):
+                    self._settle("hedge" if future is hedge else "primary", pending, discard)
+                    return future.result()
+        self._settle("none", (), discard)
+        if discard is not None and hedge.exception() is None:
+            discard(hedge.result())
+        return primary.result()
+
+    def _settle(self, winner: str, losers, discard: Optional[Callable[[T], None]]):
+        """
+        Count the winner of a hedged call and discard the answers still in
+        flight once they arrive
+        """
+        with self._lock:
+            self.hedge_wins += winner == "hedge"
+        if self.on_hedge:
+            self.on_hedge(winner)
+        if discard is not None:
+            for future in losers:
+                future.add_done_callback(lambda f: f.exception() is None and discard(f.result()))
+
+    def summary(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedge_rate": round(self.hedges / self.calls, 4) if self.calls else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "delays_ms": {kind: round(1000 * delay, 1) for kind in list(self._latencies)
+                          if (delay := self.delay(kind)) is not None}
+        }
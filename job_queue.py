@@ -0,0 +1,670 @@
+"""
+Durable job queue and worker daemon for batch analysis.
+
+Jobs (an input file to analyze into an output file) are submitted to a
+SQLite queue with a priority, an optional deadline, an optional
+requests-per-minute cap of their own and the batch options to run with.
+A long-running worker takes them off the queue and runs several at once,
+each through process_csv_file_robust (or process_csv_file_streaming when
+the job has a chunksize), all drawing model calls from one shared
+requests-per-minute budget.
+
+The budget is split between the running jobs by weighted fair queuing
+(rate_limiter.WeightedFairScheduler): each job's share is proportional to
+its weight times PRIORITY_SHARE ** priority, so a small urgent job admitted
+next to a 5M-row backfill gets most of the quota while it runs and the
+backfill keeps the rest. Pending jobs are admitted highest priority first,
+then earliest deadline; when every slot is taken, a job that outranks one
+already running, or whose deadline is at risk, is admitted anyway. A
+running job projected to miss its deadline is served ahead of the fair
+queue until it is back on track.
+
+Several workers may serve one queue, each with its own budget: a worker
+claims a job atomically and holds a lease on it that it renews on every
+pass, and only jobs whose lease has expired (their worker died) are put
+back in the queue.
+
+Status, progress and ETA are read from the queue (`status`), and jobs are
+cancelled through it (`cancel`), from any process:
+
+    python job_queue.py submit -i backfill.parquet -o backfill_out.parquet --priority -1 --chunksize 50000
+    python job_queue.py submit -i urgent.csv -o urgent_out.csv --priority 2 --deadline 30
+    python job_queue.py worker --rpm 600 --max-jobs 4
+    python job_queue.py status
+    python job_queue.py cancel 3
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import signal
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from checkpoint import checkpointed_rows
+from live_metrics import ERROR_LABEL, LiveMetrics
+from metrics import configure_logging
+from rate_limiter import FairShareLimiter, LimiterClosed, TokenBucket, WeightedFairScheduler
+from sentiment_llm import (DEFAULT_MAX_CONCURRENCY, DEFAULT_REQUESTS_PER_MINUTE, SentimentAnalyzer,
+                           process_csv_file_robust, process_csv_file_streaming)
+
+logger = logging.getLogger(__name__)
+
+# Shared by submitters and the worker unless SENTIMENT_QUEUE_PATH overrides it
+DEFAULT_QUEUE_PATH = os.getenv(
+    "SENTIMENT_QUEUE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".sentiment_jobs.sqlite")
+)
+
+# Jobs the worker runs at once, not counting ones admitted ahead of their turn
+DEFAULT_MAX_JOBS = 4
+
+# Seconds between two passes of the worker over the queue
+DEFAULT_POLL_INTERVAL = 2.0
+
+# Seconds a running job's worker may go without renewing its lease before
+# the job is considered abandoned and requeued; must exceed the poll interval
+DEFAULT_LEASE_SECONDS = 30.0
+
+# Factor by which each priority level multiplies a job's share of the budget
+PRIORITY_SHARE = 4.0
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Batch options a job may carry (passed to process_csv_file_robust)
+JOB_OPTIONS = ("max_concurrency", "pack_size", "pack_token_budget", "dedup", "dedup_threshold",
+               "adaptive_concurrency", "locate_evidence", "chunksize", "resume")
+
+
+class JobCancelled(LimiterClosed):
+    """
+    Raised into a running job's model calls once it has been cancelled
+    """
+
+
+class WorkerStopping(LimiterClosed):
+    """
+    Raised into running jobs when the worker shuts down; they are requeued
+    """
+
+
+class JobQueue:
+    """
+    Persistent queue of batch analysis jobs backed by SQLite.
+
+    Rows hold the job's definition (input, output, priority, weight,
+    deadline, rate cap, batch options) and its progress as last reported by
+    the worker. The database runs in WAL mode so submitters, `status` calls
+    and the worker can share one file.
+    """
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT,
+                owner TEXT,
+                input TEXT NOT NULL,
+                output TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                weight REAL NOT NULL DEFAULT 1.0,
+                deadline REAL,
+                max_rpm REAL,
+                options TEXT NOT NULL DEFAULT '{}',
+                state TEXT NOT NULL,
+                total_rows INTEGER,
+                completed_rows INTEGER NOT NULL DEFAULT 0,
+                errors INTEGER NOT NULL DEFAULT 0,
+                rows_per_second REAL,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                submitted_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                error TEXT,
+                worker TEXT,
+                heartbeat_at REAL
+            )
+        """)
+        # Queues created before workers held leases
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in (("worker", "TEXT"), ("heartbeat_at", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, priority, deadline)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL)")
+        self._conn.commit()
+
+    def _execute(self, sql: str, parameters=()) -> sqlite3.Cursor:
+        with self._lock:
+            cursor = self._conn.execute(sql, parameters)
+            self._conn.commit()
+            return cursor
+
+    def _query(self, sql: str, parameters=()) -> List[Dict]:
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, parameters).fetchall()]
+
+    def submit(self, input_path: str, output_path: str, priority: int = 0, weight: float = 1.0,
+               deadline: Optional[float] = None, max_rpm: Optional[float] = None,
+               name: Optional[str] = None, owner: Optional[str] = None,
+               total_rows: Optional[int] = None, **options) -> int:
+        """
+        Queue a job and return its id. `deadline` is a Unix time; `options`
+        are batch options from JOB_OPTIONS. Without `total_rows` the input
+        is counted, so the job has progress and an ETA from the start.
+        """
+        unknown = set(options) - set(JOB_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unsupported job options: {', '.join(sorted(unknown))}")
+        if weight <= 0:
+            raise ValueError("weight must be positive")
+        if total_rows is None:
+            from batch_io import count_rows
+            total_rows = count_rows(input_path)
+        cursor = self._execute(
+            "INSERT INTO jobs (name, owner, input, output, priority, weight, deadline, max_rpm, options, state, "
+            "total_rows, submitted_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (name or os.path.basename(input_path), owner, os.path.abspath(input_path),
+             os.path.abspath(output_path), priority, weight, deadline, max_rpm, json.dumps(options), PENDING,
+             total_rows, time.time())
+        )
+        return cursor.lastrowid
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        jobs = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return self._decode(jobs[0]) if jobs else None
+
+    def jobs(self, include_finished: bool = False) -> List[Dict]:
+        """
+        Jobs in the order the worker would take them: running, then pending
+        by priority and deadline, then (optionally) finished ones, latest
+        first
+        """
+        jobs = [self._decode(job) for job in self._query(
+            "SELECT * FROM jobs" + ("" if include_finished else " WHERE state IN (?, ?)") +
+            " ORDER BY state != ?, state != ?, priority DESC, deadline IS NULL, deadline, "
+            "COALESCE(finished_at, 0) DESC, id",
+            (() if include_finished else (PENDING, RUNNING)) + (RUNNING, PENDING)
+        )]
+        return self._with_eta(jobs)
+
+    def pending(self) -> List[Dict]:
+        return self._with_eta([self._decode(job) for job in self._query(
+            "SELECT * FROM jobs WHERE state = ? AND cancel_requested = 0 "
+            "ORDER BY priority DESC, deadline IS NULL, deadline, id", (PENDING,)
+        )])
+
+    def cancel(self, job_id: int) -> Optional[str]:
+        """
+        Cancel a job: pending jobs at once, running ones by flagging them for
+        the worker, which stops them between model calls. Returns the job's
+        state afterwards (None if there is no such job).
+        """
+        self._execute("UPDATE jobs SET state = ?, finished_at = ? WHERE id = ? AND state = ?",
+                      (CANCELLED, time.time(), job_id, PENDING))
+        self._execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND state = ?", (job_id, RUNNING))
+        job = self.get(job_id)
+        return job and job["state"]
+
+    def cancel_requested(self, job_id: int) -> bool:
+        job = self.get(job_id)
+        return bool(job and job["cancel_requested"])
+
+    def claim(self, job_id: int, worker: str) -> bool:
+        """
+        Move a pending job to running under `worker`'s lease. False if it is
+        no longer pending (another worker claimed it, or it was cancelled).
+        """
+        now = time.time()
+        return self._execute(
+            "UPDATE jobs SET state = ?, worker = ?, heartbeat_at = ?, started_at = COALESCE(started_at, ?), "
+            "error = NULL WHERE id = ? AND state = ? AND cancel_requested = 0",
+            (RUNNING, worker, now, now, job_id, PENDING)).rowcount == 1
+
+    def progress(self, job_id: int, completed_rows: int, errors: int, rows_per_second: Optional[float],
+                 worker: Optional[str] = None) -> bool:
+        """
+        Record a running job's progress and, with `worker`, renew that
+        worker's lease on it. False if `worker` no longer holds the job.
+        """
+        if worker is None:
+            return self._execute("UPDATE jobs SET completed_rows = ?, errors = ?, rows_per_second = ? "
+                                 "WHERE id = ?", (completed_rows, errors, rows_per_second, job_id)).rowcount == 1
+        return self._execute(
+            "UPDATE jobs SET completed_rows = ?, errors = ?, rows_per_second = ?, heartbeat_at = ? "
+            "WHERE id = ? AND state = ? AND worker = ?",
+            (completed_rows, errors, rows_per_second, time.time(), job_id, RUNNING, worker)).rowcount == 1
+
+    def finish(self, job_id: int, state: str, error: Optional[str] = None, worker: Optional[str] = None):
+        """
+        Record how a job ended (PENDING to requeue it); with `worker`, only
+        while that worker still holds it
+        """
+        sql = "UPDATE jobs SET state = ?, finished_at = ?, error = ?, rows_per_second = NULL, heartbeat_at = NULL " \
+              "WHERE id = ?"
+        parameters = (state, time.time() if state in FINISHED else None, error, job_id)
+        if worker is not None:
+            sql += " AND state = ? AND worker = ?"
+            parameters += (RUNNING, worker)
+        self._execute(sql, parameters)
+
+    def requeue_interrupted(self, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> int:
+        """
+        Put running jobs whose worker has not renewed its lease for
+        `lease_seconds` (it died) back in the queue, or mark them cancelled
+        if that was requested; returns how many were requeued
+        """
+        now = time.time()
+        expired = "state = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)"
+        self._execute(f"UPDATE jobs SET state = ?, finished_at = ? WHERE {expired} AND cancel_requested = 1",
+                      (CANCELLED, now, RUNNING, now - lease_seconds))
+        return self._execute(f"UPDATE jobs SET state = ?, rows_per_second = NULL, worker = NULL WHERE {expired}",
+                             (PENDING, RUNNING, now - lease_seconds)).rowcount
+
+    def set_throughput(self, rows_per_second: float):
+        self._execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rows_per_second', ?)",
+                      (rows_per_second,))
+
+    def throughput(self) -> Optional[float]:
+        rows = self._query("SELECT value FROM meta WHERE key = 'rows_per_second'")
+        return rows[0]["value"] if rows else None
+
+    def _decode(self, job: Dict) -> Dict:
+        job["options"] = json.loads(job["options"])
+        return job
+
+    def _with_eta(self, jobs: List[Dict]) -> List[Dict]:
+        """
+        Add each job's estimated seconds to completion. A running job's comes
+        from its own recent rate. A pending job's assumes the worker's last
+        known overall throughput and that every job ahead of it (running
+        ones and pending ones it does not outrank) finishes first, which
+        overstates the wait of jobs that will be admitted early.
+        """
+        throughput = self.throughput()
+        ahead = sum(max((job["total_rows"] or 0) - job["completed_rows"], 0)
+                    for job in self._query("SELECT total_rows, completed_rows FROM jobs WHERE state = ?",
+                                           (RUNNING,)))
+        ranked = {job["id"]: rank for rank, job in enumerate(self._query(
+            "SELECT id FROM jobs WHERE state = ? ORDER BY priority DESC, deadline IS NULL, deadline, id",
+            (PENDING,)))}
+        queued = [0] * (len(ranked) + 1)
+        for job in self._query("SELECT id, total_rows FROM jobs WHERE state = ?", (PENDING,)):
+            queued[ranked[job["id"]] + 1] = job["total_rows"] or 0
+        for i in range(1, len(queued)):
+            queued[i] += queued[i - 1]
+
+        for job in jobs:
+            remaining = max((job["total_rows"] or 0) - job["completed_rows"], 0) if job["total_rows"] else None
+            job["eta_seconds"] = None
+            if job["state"] == RUNNING and remaining is not None and job["rows_per_second"]:
+                job["eta_seconds"] = remaining / job["rows_per_second"]
+            elif job["state"] == PENDING and remaining is not None and throughput:
+                job["eta_seconds"] = (ahead + queued[ranked[job["id"]] + 1]) / throughput
+        return jobs
+
+
+def effective_weight(job: Dict) -> float:
+    """
+    A job's share of the budget relative to other running jobs
+    """
+    return job["weight"] * PRIORITY_SHARE ** job["priority"]
+
+
+class RunningJob:
+    """
+    A job the worker is running on its own thread, with the limiter through
+    which its model calls draw from the shared budget. `checkpoint_path` is
+    set for streaming jobs whose output survives an interruption.
+    """
+    def __init__(self, job: Dict, limiter: FairShareLimiter, live: LiveMetrics,
+                 checkpoint_path: Optional[str] = None):
+        self.job = job
+        self.limiter = limiter
+        self.live = live
+        self.checkpoint_path = checkpoint_path
+        self.thread: Optional[threading.Thread] = None
+        self.urgent = False
+        self._rows = 0
+        self._rate: Optional[float] = None
+        self._sampled_at = time.monotonic()
+
+    @property
+    def completed(self) -> int:
+        """
+        Rows done: those recorded in the checkpoint, for checkpointed jobs
+        (rows analyzed since are redone after an interruption); rows
+        analyzed so far for others, whose output is written at the end
+        """
+        if self.checkpoint_path is not None:
+            return checkpointed_rows(self.checkpoint_path)
+        return self.live.rows
+
+    def kept(self, state: str) -> int:
+        """
+        Rows done once the job ended in `state`
+        """
+        return self.completed if state == DONE or self.checkpoint_path is not None else 0
+
+    def errors(self) -> int:
+        return self.live.labels.get(ERROR_LABEL, 0)
+
+    def rate(self) -> Optional[float]:
+        """
+        Rows per second, smoothed over successive polls
+        """
+        now, rows = time.monotonic(), self.live.rows
+        if now - self._sampled_at >= 1.0:
+            recent = (rows - self._rows) / (now - self._sampled_at)
+            self._rate = recent if self._rate is None else 0.5 * self._rate + 0.5 * recent
+            self._rows, self._sampled_at = rows, now
+        return self._rate
+
+    def eta(self) -> Optional[float]:
+        rate = self.rate()
+        if not rate or not self.job["total_rows"]:
+            return None
+        return max(self.job["total_rows"] - self.completed, 0) / rate
+
+
+class JobDaemon:
+    """
+    Worker that runs queued jobs, see the module docstring.
+
+    Up to `max_jobs` jobs run at once (more when higher-priority or
+    deadline-bound ones arrive), each on its own thread with an analyzer
+    from `analyzer_factory`, sharing a `requests_per_minute` budget by
+    weighted fair queuing. Every `poll_interval` seconds the worker admits
+    jobs, records progress and ETAs (renewing its lease on running jobs),
+    flags jobs at risk of missing their deadline as urgent, stops jobs
+    cancelled in the queue and requeues jobs whose worker's lease has
+    expired. Jobs are stopped between model calls; on shutdown running jobs
+    go back to the queue, and streaming jobs resume from their checkpoint.
+    """
+    def __init__(self, queue: JobQueue, requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                 max_jobs: int = DEFAULT_MAX_JOBS,
+                 analyzer_factory: Callable[[], SentimentAnalyzer] = SentimentAnalyzer,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, lease: float = DEFAULT_LEASE_SECONDS):
+        if lease <= poll_interval:
+            raise ValueError(f"lease ({lease}s) must exceed poll_interval ({poll_interval}s)")
+        self.queue = queue
+        self.lease = lease
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.max_jobs = max_jobs
+        self.analyzer_factory = analyzer_factory
+        self.poll_interval = poll_interval
+        self.scheduler = WeightedFairScheduler(TokenBucket.per_minute(requests_per_minute))
+        self.running: Dict[int, RunningJob] = {}
+        self._stopping = threading.Event()
+
+    def admit(self) -> List[Dict]:
+        """
+        Pending jobs to start now
+        """
+        admitted = []
+        lowest = min((running.job["priority"] for running in self.running.values()), default=None)
+        for job in self.queue.pending():
+            if len(self.running) + len(admitted) < self.max_jobs:
+                admitted.append(job)
+            elif len(self.running) + len(admitted) < 2 * self.max_jobs and \
+                    (lowest is not None and job["priority"] > lowest or self.at_risk(job, job["eta_seconds"])):
+                admitted.append(job)
+        return admitted
+
+    @staticmethod
+    def at_risk(job: Dict, eta: Optional[float]) -> bool:
+        return job["deadline"] is not None and eta is not None and time.time() + eta > job["deadline"]
+
+    def start_job(self, job: Dict):
+        if not self.queue.claim(job["id"], self.worker_id):
+            return
+        options = dict(job["options"])
+        chunksize = options.pop("chunksize", None)
+        resume = options.pop("resume", True)
+        quota = TokenBucket.per_minute(job["max_rpm"]) if job["max_rpm"] else None
+        limiter = FairShareLimiter(self.scheduler, f"job-{job['id']}", effective_weight(job), quota)
+        from batch_io import PARQUET, file_format
+        # Streaming jobs with a CSV output record finished chunks in <output>.checkpoint
+        checkpointed = chunksize and file_format(job["output"]) != PARQUET
+        running = RunningJob(job, limiter, LiveMetrics(), job["output"] + ".checkpoint" if checkpointed else None)
+        self.running[job["id"]] = running
+        logger.info("Starting job %d (%s, %s rows, priority %d)", job["id"], job["name"], job["total_rows"],
+                    job["priority"], extra={"job_id": job["id"]})
+
+        def run():
+            state, error = DONE, None
+            try:
+                common = dict(analyzer=self.analyzer_factory(), live_metrics=running.live, limiter=limiter,
+                              requests_per_minute=None, **options)
+                if chunksize:
+                    process_csv_file_streaming(job["input"], job["output"], chunksize=chunksize, resume=resume,
+                                               **common)
+                else:
+                    process_csv_file_robust(job["input"], job["output"], **common)
+            except JobCancelled:
+                state = CANCELLED
+            except WorkerStopping:
+                state = PENDING
+            except Exception as e:
+                logger.exception("Job %d failed", job["id"], extra={"job_id": job["id"]})
+                state, error = FAILED, f"{type(e).__name__}: {e}"
+            finally:
+                self.scheduler.unregister(limiter.flow)
+            self.queue.progress(job["id"], running.kept(state), running.errors(), None, worker=self.worker_id)
+            self.queue.finish(job["id"], state, error, worker=self.worker_id)
+            logger.info("Job %d %s", job["id"], state, extra={"job_id": job["id"], "state": state})
+
+        running.thread = threading.Thread(target=run, name=f"job-{job['id']}", daemon=True)
+        running.thread.start()
+
+    def poll(self):
+        for job_id, running in list(self.running.items()):
+            if not running.thread.is_alive():
+                del self.running[job_id]
+                continue
+            if self.queue.cancel_requested(job_id):
+                running.limiter.close(JobCancelled(f"Job {job_id} was cancelled"))
+            eta = running.eta()
+            if not self.queue.progress(job_id, running.completed, running.errors(), running.rate(),
+                                       worker=self.worker_id):
+                running.limiter.close(WorkerStopping(f"Job {job_id} was taken over by another worker"))
+                continue
+            urgent = self.at_risk(running.job, eta)
+            if urgent != running.urgent:
+                self.scheduler.set_urgent(running.limiter.flow, running.job["deadline"] if urgent else None)
+                running.urgent = urgent
+                logger.info("Job %d %s its deadline", job_id, "is at risk of missing" if urgent else "is back on",
+                            extra={"job_id": job_id})
+
+        throughput = sum(running.rate() or 0.0 for running in self.running.values())
+        if throughput > 0:
+            self.queue.set_throughput(throughput)
+        if not self._stopping.is_set():
+            requeued = self.queue.requeue_interrupted(self.lease)
+            if requeued:
+                logger.info("Requeued %d jobs whose worker stopped renewing its lease", requeued)
+            for job in self.admit():
+                self.start_job(job)
+
+    def run(self):
+        """
+        Serve the queue until interrupted (Ctrl-C or SIGTERM, when run on the
+        main thread) or `stop` is called
+        """
+        previous_handler = None
+        if threading.current_thread() is threading.main_thread():
+            previous_handler = signal.signal(signal.SIGTERM, self._terminate)
+        try:
+            while not self._stopping.is_set():
+                self.poll()
+                self._stopping.wait(self.poll_interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+            if previous_handler is not None:
+                signal.signal(signal.SIGTERM, previous_handler)
+
+    def _terminate(self, signum, frame):
+        logger.info("Received SIGTERM, returning running jobs to the queue")
+        self.stop()
+
+    def stop(self):
+        self._stopping.set()
+
+    def shutdown(self):
+        """
+        Stop running jobs between model calls and return them to the queue
+        """
+        self._stopping.set()
+        for running in self.running.values():
+            running.limiter.close(WorkerStopping("Worker is shutting down"))
+        for running in self.running.values():
+            running.thread.join()
+        self.running.clear()
+        self.scheduler.close()
+
+
+def parse_deadline(value: str) -> float:
+    """
+    A deadline given as minutes from now or as an ISO 8601 time
+    """
+    try:
+        return time.time() + 60 * float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def format_seconds(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "-"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+def print_jobs(jobs: List[Dict]):
+    print(f"{'id':>5} {'name':<24} {'state':<9} {'prio':>4} {'progress':>19} {'rows/s':>8} {'eta':>9} deadline")
+    for job in jobs:
+        total = job["total_rows"]
+        progress = f"{job['completed_rows']}/{total}" if total is not None else str(job["completed_rows"])
+        if total:
+            progress += f" {job['completed_rows'] / total:.0%}"
+        deadline = time.strftime("%Y-%m-%d %H:%M", time.localtime(job["deadline"])) if job["deadline"] else "-"
+        if job["deadline"] and job["state"] not in FINISHED and job["eta_seconds"] is not None \
+                and time.time() + job["eta_seconds"] > job["deadline"]:
+            deadline += " (at risk)"
+        state = job["state"] + ("*" if job["cancel_requested"] and job["state"] == RUNNING else "")
+        rate = f"{job['rows_per_second']:.1f}" if job["rows_per_second"] else "-"
+        print(f"{job['id']:>5} {job['name'][:24]:<24} {state:<9} {job['priority']:>4} {progress:>19} "
+              f"{rate:>8} {format_seconds(job['eta_seconds']):>9} {deadline}")
+        if job["error"]:
+            print(f"      {job['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue batch analysis jobs and run them with a shared budget")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="Queue database (default: $SENTIMENT_QUEUE_PATH)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    submit = subparsers.add_parser("submit", help="Queue a job")
+    submit.add_argument("--input", "-i", required=True, help="Input file path (CSV, JSONL or Parquet)")
+    submit.add_argument("--output", "-o", required=True, help="Output file path (CSV or Parquet)")
+    submit.add_argument("--name", default=None, help="Display name (default: the input file name)")
+    submit.add_argument("--owner", default=os.getenv("USER"))
+    submit.add_argument("--priority", type=int, default=0,
+                        help=f"Higher runs first; each level multiplies the job's share of the budget "
+                             f"by {PRIORITY_SHARE:g}")
+    submit.add_argument("--weight", type=float, default=1.0, help="Relative share of the budget at equal priority")
+    submit.add_argument("--deadline", type=parse_deadline, default=None,
+                        help="Minutes from now, or an ISO time; jobs at risk of missing it are served first")
+    submit.add_argument("--max-rpm", type=float, default=None, help="Cap on this job's own requests per minute")
+    submit.add_argument("--chunksize", type=int, default=None,
+                        help="Stream the input in chunks of this many rows with checkpointing, so an "
+                             "interrupted job resumes where it stopped")
+    submit.add_argument("--concurrency", "-c", type=int, default=DEFAULT_MAX_CONCURRENCY)
+    submit.add_argument("--pack-size", type=int, default=1)
+    submit.add_argument("--dedup", action="store_true")
+    submit.add_argument("--locate-evidence", action="store_true")
+
+    status = subparsers.add_parser("status", help="Show queued and running jobs with progress and ETA")
+    status.add_argument("job_id", type=int, nargs="?", default=None)
+    status.add_argument("--all", action="store_true", help="Include finished jobs")
+    status.add_argument("--json", action="store_true", help="Print jobs as JSON")
+
+    cancel = subparsers.add_parser("cancel", help="Cancel a pending or running job")
+    cancel.add_argument("job_id", type=int)
+
+    worker = subparsers.add_parser("worker", help="Run queued jobs until interrupted")
+    worker.add_argument("--rpm", type=float, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help="Requests-per-minute budget shared by all running jobs")
+    worker.add_argument("--max-jobs", type=int, default=DEFAULT_MAX_JOBS)
+    worker.add_argument("--backend", default=None,
+                        help="'gemini', 'simulated' or the URL of a served backend (default: $SENTIMENT_BACKEND or gemini)")
+    worker.add_argument("--no-cache", action="store_true", help="Bypass the on-disk result cache")
+    worker.add_argument("--poll", type=float, default=DEFAULT_POLL_INTERVAL, help="Seconds between queue passes")
+    worker.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS,
+                        help="Seconds without a heartbeat after which another worker takes over a running job")
+    worker.add_argument("--log-level", default="INFO")
+    worker.add_argument("--log-json", action="store_true")
+
+    args = parser.parse_args()
+    queue = JobQueue(args.queue)
+
+    if args.command == "submit":
+        options = dict(max_concurrency=args.concurrency, pack_size=args.pack_size, dedup=args.dedup,
+                       locate_evidence=args.locate_evidence)
+        if args.chunksize:
+            options["chunksize"] = args.chunksize
+        job_id = queue.submit(args.input, args.output, priority=args.priority, weight=args.weight,
+                              deadline=args.deadline, max_rpm=args.max_rpm, name=args.name, owner=args.owner,
+                              **options)
+        job = queue.get(job_id)
+        print(f"Queued job {job_id} ({job['total_rows']} rows)")
+    elif args.command == "status":
+        if args.job_id is not None:
+            jobs = [job for job in queue.jobs(include_finished=True) if job["id"] == args.job_id]
+            if not jobs:
+                parser.exit(1, f"No job {args.job_id}\n")
+        else:
+            jobs = queue.jobs(include_finished=args.all)
+        if args.json:
+            print(json.dumps(jobs, indent=2))
+        else:
+            print_jobs(jobs)
+    elif args.command == "cancel":
+        state = queue.cancel(args.job_id)
+        if state is None:
+            parser.exit(1, f"No job {args.job_id}\n")
+        print(f"Job {args.job_id}: " + ("cancelling after its current model calls" if state == RUNNING else state))
+    else:
+        from batch_eval import build_analyzer
+        configure_logging(args.log_level, json_format=args.log_json)
+        daemon = JobDaemon(queue, requests_per_minute=args.rpm, max_jobs=args.max_jobs,
+                           analyzer_factory=functools.partial(build_analyzer, backend=args.backend,
+                                                              use_cache=not args.no_cache),
+                           poll_interval=args.poll, lease=args.lease)
+        print(f"Worker serving {args.queue} at {args.rpm:g} requests/minute, up to {args.max_jobs} jobs at once")
+        daemon.run()
+
+
+if __name__ == "__main__":
+    main()
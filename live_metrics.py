@@ -0,0 +1,163 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+# Equal-width confidence bins in the running histogram
+DEFAULT_LIVE_BINS = 10
+
+# Minimum seconds between two writes of the sidecar file
+DEFAULT_PUBLISH_INTERVAL = 5.0
+
+ERROR_LABEL = "Error"
+
+logger = logging.getLogger(__name__)
+
+
+def _confidence(value) -> float:
+    """
+    A result's confidence as a float, or 0.0 (as on fallback results) when
+    it is not a finite number
+    """
+    try:
+        confidence = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return confidence if math.isfinite(confidence) else 0.0
+
+
+class LiveMetrics:
+    """
+    Running aggregates of a batch that is still in progress.
+
+    `record` folds one result into the label counts, a confidence
+    histogram, fallback and error counts and, when the row's true label is
+    known, a confusion matrix, at constant cost per row. With a `path`, the
+    snapshot (accuracy so far, label mix, error rate, throughput) is
+    rewritten there atomically at most every `interval` seconds, so a long
+    run can be watched and stopped early; `close` publishes the final
+    state. Instances filled in worker processes are folded into the
+    parent's with `merge`.
+    """
+    def __init__(self, path: Optional[str] = None, bins: int = DEFAULT_LIVE_BINS,
+                 interval: float = DEFAULT_PUBLISH_INTERVAL):
+        self.path = path
+        self.bins = bins
+        self.interval = interval
+        self.rows = 0
+        self.labels: Dict[str, int] = {}
+        self.fallbacks: Dict[str, int] = {}
+        self.confidence_histogram = [0] * bins
+        self.confidence_sum = 0.0
+        self.confusion: Dict[str, Dict[str, int]] = {}
+        self.evaluated = 0
+        self.correct = 0
+        self.started_at = time.time()
+        self._published_at = 0.0
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+
+    def record(self, result: Dict, true_label: Optional[str] = None):
+        # Called for every row of a running batch, so a malformed result is
+        # counted as best it can be rather than raised
+        label = str(result.get("label"))
+        confidence = _confidence(result.get("confidence"))
+        with self._lock:
+            self.rows += 1
+            self.labels[label] = self.labels.get(label, 0) + 1
+            reason = result.get("fallback_reason")
+            if reason:
+                self.fallbacks[reason] = self.fallbacks.get(reason, 0) + 1
+            self.confidence_histogram[min(max(int(confidence * self.bins), 0), self.bins - 1)] += 1
+            self.confidence_sum += confidence
+            if true_label:
+                row = self.confusion.setdefault(true_label, {})
+                row[label] = row.get(label, 0) + 1
+                self.evaluated += 1
+                self.correct += label == true_label
+        self.publish()
+
+    def merge(self, other: "LiveMetrics"):
+        """
+        Add the counts of another instance (e.g. one worker's shard)
+        """
+        with self._lock:
+            self.rows += other.rows
+            for label, count in other.labels.items():
+                self.labels[label] = self.labels.get(label, 0) + count
+            for reason, count in other.fallbacks.items():
+                self.fallbacks[reason] = self.fallbacks.get(reason, 0) + count
+            self.confidence_histogram = [a + b for a, b in zip(self.confidence_histogram,
+                                                               other.confidence_histogram)]
+            self.confidence_sum += other.confidence_sum
+            for true_label, predictions in other.confusion.items():
+                row = self.confusion.setdefault(true_label, {})
+                for label, count in predictions.items():
+                    row[label] = row.get(label, 0) + count
+            self.evaluated += other.evaluated
+            self.correct += other.correct
+        self.publish()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            elapsed = time.time() - self.started_at
+            fallback_rows = sum(self.fallbacks.values())
+            errors = self.labels.get(ERROR_LABEL, 0)
+            return {
+                "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "elapsed_seconds": round(elapsed, 1),
+                "rows": self.rows,
+                "rows_per_second": round(self.rows / elapsed, 2) if elapsed > 0 else 0.0,
+                "labels": dict(self.labels),
+                "label_share": {label: count / self.rows for label, count in self.labels.items()},
+                "error_rate": errors / self.rows if self.rows else 0.0,
+                "fallback_rate": fallback_rows / self.rows if self.rows else 0.0,
+                "fallback_reasons": dict(self.fallbacks),
+                "mean_confidence": self.confidence_sum / self.rows if self.rows else None,
+                "confidence_histogram": {
+                    "edges": [i / self.bins for i in range(self.bins + 1)],
+                    "counts": list(self.confidence_histogram)
+                },
+                "evaluated": self.evaluated,
+                "accuracy": self.correct / self.evaluated if self.evaluated else None,
+                "confusion_matrix": {true_label: dict(row) for true_label, row in self.confusion.items()}
+            }
+
+    def publish(self, force: bool = False):
+        """
+        Rewrite the sidecar file if `interval` seconds have passed since the
+        last write (or always, with `force`)
+        """
+        if self.path is None:
+            return
+        if not force and time.monotonic() - self._published_at < self.interval:
+            return
+        # A writer that finds another one busy skips this round
+        if not self._publish_lock.acquire(blocking=force):
+            return
+        try:
+            self._published_at = time.monotonic()
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporary, "w") as f:
+                json.dump(self.snapshot(), f, indent=2)
+            os.replace(temporary, self.path)
+        except OSError as e:
+            logger.warning("Could not publish live metrics to %s: %s", self.path, e)
+        finally:
+            self._publish_lock.release()
+
+    def close(self):
+        self.publish(force=True)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"], state["_publish_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
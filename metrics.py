@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DEFAULT_TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+class Counter:
+    """
+    Monotonically increasing value per label combination
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """
+    Value per label combination that can go up and down
+    """
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram:
+    """
+    Cumulative bucket counts plus sum and count per label combination
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+                 labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        # Per label key: [per-bucket counts..., +Inf count], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            total[0] += value
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    samples.append((self.name + "_bucket", dict(labels, le=le), cumulative))
+                samples.append((self.name + "_sum", labels, total[0]))
+                samples.append((self.name + "_count", labels, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Named collection of counters, gauges and histograms with pluggable export
+    sinks.
+
+    `counter`, `gauge` and `histogram` return the existing metric when the
+    name is already registered, so several analyzers can share one registry.
+    """
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._sinks: List[object] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        with self._lock:
+            return self._metrics.setdefault(name, Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+                  labelnames: Sequence[str] = ()) -> Histogram:
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help_text, buckets, labelnames))
+
+    def metrics(self) -> Iterable:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def snapshot(self) -> Dict[str, List[Dict]]:
+        """
+        Plain-dict view of every sample, keyed by metric name
+        """
+        return {
+            metric.name: [{"name": name, "labels": labels, "value": value}
+                          for name, labels, value in metric.samples()]
+            for metric in self.metrics()
+        }
+
+    def add_sink(self, sink):
+        self._sinks.append(sink)
+
+    def flush(self):
+        """
+        Push the current values to every registered sink
+        """
+        for sink in self._sinks:
+            sink.export(self)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class PrometheusExporter:
+    """
+    Renders the registry in the Prometheus text exposition format, optionally
+    writing it atomically to `path` (e.g. for the node_exporter textfile
+    collector)
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+
+    @staticmethod
+    def render(registry: MetricsRegistry) -> str:
+        lines = []
+        for metric in registry.metrics():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, registry: MetricsRegistry):
+        if self.path is None:
+            return
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(self.render(registry))
+        os.replace(temporary, self.path)
+
+
+class JsonLinesExporter:
+    """
+    Appends one timestamped JSON snapshot of the registry per export
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, registry: MetricsRegistry):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"timestamp": time.time(), "metrics": registry.snapshot()}) + "\n")
+
+
+class PipelineMetrics:
+    """
+    The sentiment pipeline's standard metrics, registered on `registry`
+    """
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self.call_latency = registry.histogram(
+            "sentiment_model_call_seconds", "Latency of model calls",
+            labelnames=("backend", "kind", "outcome"))
+        self.input_tokens = registry.counter(
+            "sentiment_input_tokens_total", "Prompt tokens reported by the backend", ("backend",))
+        self.output_tokens = registry.counter(
+            "sentiment_output_tokens_total", "Completion tokens reported by the backend", ("backend",))
+        self.tokens_per_call = registry.histogram(
+            "sentiment_tokens_per_call", "Prompt plus completion tokens per model call",
+            DEFAULT_TOKEN_BUCKETS, ("backend", "kind"))
+        self.parse_failures = registry.counter(
+            "sentiment_parse_failures_total", "Model answers that were not valid result JSON", ("kind",))
+        self.fallbacks = registry.counter(
+            "sentiment_fallback_results_total", "Placeholder results returned instead of a model answer",
+            ("reason",))
+        self.cache_lookups = registry.counter(
+            "sentiment_cache_lookups_total", "Result cache lookups", ("result",))
+        self.fast_path = registry.counter(
+            "sentiment_fast_path_total", "Fast-path classifier decisions", ("outcome",))
+        self.retries = registry.counter(
+            "sentiment_retries_total", "Reviews sent to the model again after a failed attempt", ("reason",))
+        self.routed_calls = registry.counter(
+            "sentiment_routed_calls_total", "Model call attempts per tier chosen by the router", ("model",))
+        self.hedged_calls = registry.counter(
+            "sentiment_hedged_calls_total", "Calls sent a second time to cut tail latency, by which copy won",
+            ("winner",))
+        self.concurrency_limit = registry.gauge(
+            "sentiment_concurrency_limit", "Current adaptive limit on in-flight model calls")
+
+
+class JsonLogFormatter(logging.Formatter):
+    """
+    One JSON object per log record, including any `extra=` fields
+    """
+    RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage()
+        }
+        payload.update({k: v for k, v in vars(record).items() if k not in self.RESERVED})
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+def configure_logging(level: str = "INFO", json_format: bool = False):
+    """
+    Route the pipeline's loggers to stderr as plain text or JSON lines
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonLogFormatter() if json_format else
+                         logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+
+
+# Process-wide registry shared by every SentimentAnalyzer unless one is passed in
+default_registry = MetricsRegistry()
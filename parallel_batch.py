@@ -0,0 +1,202 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from batch_io import ParquetResultWriter, PARQUET, file_format, iter_chunks, review_texts
+from live_metrics import LiveMetrics
+from profiling import Tracer
+from rate_limiter import SharedTokenBucket
+from sentiment_llm import (SentimentAnalyzer, DEFAULT_CHUNKSIZE, DEFAULT_REQUESTS_PER_MINUTE,
+                           add_result_columns, live_result_callback, open_checkpoint)
+
+logger = logging.getLogger(__name__)
+
+# Chunks submitted ahead per worker: enough to keep every worker busy while
+# the parent writes, few enough that memory stays bounded
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+# Seconds between aggregated progress reports
+PROGRESS_INTERVAL = 2.0
+
+# Per-process state set up by _init_worker
+_worker: Dict = {}
+
+
+def _init_worker(analyzer_factory: Callable[[], SentimentAnalyzer], limiter, progress):
+    _worker["analyzer"] = analyzer_factory()
+    _worker["limiter"] = limiter
+    _worker["progress"] = progress
+
+
+def _analyze_shard(row_ids: List[int], chunk: pd.DataFrame, batch_options: Dict, parquet: bool,
+                   live: bool, trace: bool = False):
+    """
+    Analyze one chunk in a worker. Returns (results DataFrame, None, error
+    count, live metrics, spans) for Parquet output, or the chunk rendered as
+    CSV (header, rows, error count, live metrics, spans). The chunk's
+    LiveMetrics is only collected when `live` is set, and its Tracer spans
+    only when `trace` is; both are None otherwise.
+    """
+    progress = _worker["progress"]
+    reported = 0
+
+    def report(completed: int, total: int):
+        nonlocal reported
+        with progress.get_lock():
+            progress.value += completed - reported
+        reported = completed
+
+    analyzer = _worker["analyzer"]
+    if trace and not isinstance(analyzer.stage_timer, Tracer):
+        analyzer.stage_timer = Tracer()
+    shard_metrics = LiveMetrics() if live else None
+    results = analyzer.batch_analyze(
+        review_texts(chunk),
+        # The shared bucket is the whole budget; no per-worker default
+        requests_per_minute=None,
+        limiter=_worker["limiter"],
+        progress_callback=report,
+        columnar=True,
+        result_callback=live_result_callback(shard_metrics, chunk),
+        **batch_options
+    )
+    with analyzer.stage("result_assembly"):
+        add_result_columns(chunk, results, evidence_as_list=parquet)
+        if 'dup_group' in chunk:
+            # Duplicate groups are chunk-relative; name them by absolute row ID
+            chunk['dup_group'] = [row_ids[group] for group in chunk['dup_group']]
+    errors = results.error_count()
+    if parquet:
+        return chunk, None, errors, shard_metrics, analyzer.stage_timer.drain() if trace else None
+    with analyzer.stage("csv_render"):
+        header, rows = chunk.head(0).to_csv(index=False), chunk.to_csv(index=False, header=False)
+    return header, rows, errors, shard_metrics, analyzer.stage_timer.drain() if trace else None
+
+
+def process_csv_file_parallel(input_csv: str, output_csv: str,
+                              workers: int,
+                              analyzer_factory: Callable[[], SentimentAnalyzer] = SentimentAnalyzer,
+                              chunksize: int = DEFAULT_CHUNKSIZE,
+                              checkpoint_path: Optional[str] = None,
+                              resume: bool = True,
+                              requests_per_minute: Optional[float] = DEFAULT_REQUESTS_PER_MINUTE,
+                              live_metrics: Optional[LiveMetrics] = None,
+                              tracer: Optional[Tracer] = None,
+                              **batch_options) -> Dict:
+    """
+    Multi-process version of process_csv_file_streaming.
+
+    The input is read in chunks of `chunksize` rows which are farmed out to
+    `workers` processes, each building its own analyzer with
+    `analyzer_factory` (a picklable callable, e.g. a module-level function
+    or functools.partial of one). All workers draw model calls from one
+    shared `requests_per_minute` budget; other batch options, including
+    `max_concurrency`, apply per worker. Finished chunks are appended to
+    the output strictly in input order and checkpointed, so the output
+    matches a single-process run and can be resumed the same way (except
+    Parquet output, which always starts over). Progress across all workers
+    is logged every PROGRESS_INTERVAL seconds, and each finished chunk's
+    aggregates are merged into `live_metrics`. With a `tracer`, workers
+    trace their stages too and send the spans back with each chunk, so the
+    trace shows the parent's reads and writes next to every worker's calls.
+    """
+    def stage(name: str):
+        return tracer.stage(name) if tracer is not None else nullcontext()
+
+    if file_format(output_csv) == PARQUET:
+        checkpoint, writer = None, ParquetResultWriter(output_csv)
+    else:
+        checkpoint, writer = open_checkpoint(output_csv, checkpoint_path, resume), None
+    context = multiprocessing.get_context("spawn")
+    limiter = SharedTokenBucket.per_minute(requests_per_minute, context=context) if requests_per_minute else None
+    progress = context.Value("q", 0)
+
+    processed, errors, skipped, submitted = 0, 0, 0, 0
+    start = time.monotonic()
+    stop = threading.Event()
+
+    def report_progress():
+        while not stop.wait(PROGRESS_INTERVAL):
+            done = progress.value
+            logger.info("Analyzed %d reviews across %d workers (%d queued, %.1f reviews/s)",
+                        done, workers, submitted - done, done / (time.monotonic() - start),
+                        extra={"completed": done, "submitted": submitted, "workers": workers})
+
+    monitor = threading.Thread(target=report_progress, daemon=True)
+    monitor.start()
+
+    in_flight = deque()
+
+    def write_next():
+        nonlocal processed, errors
+        row_ids, future = in_flight.popleft()
+        header_or_df, rows, chunk_errors, shard_metrics, spans = future.result()
+        processed += len(row_ids)
+        errors += chunk_errors
+        if shard_metrics is not None:
+            live_metrics.merge(shard_metrics)
+        if spans is not None:
+            tracer.merge(spans)
+        if writer is not None:
+            with stage("csv_write"):
+                writer.write(header_or_df)
+            return
+        # Append and fsync the rows before recording them as done
+        write_header = not os.path.exists(output_csv) or os.path.getsize(output_csv) == 0
+        with stage("csv_write"), open(output_csv, "a", encoding="utf-8", newline="") as f:
+            if write_header:
+                f.write(header_or_df)
+            f.write(rows)
+            f.flush()
+            os.fsync(f.fileno())
+            output_bytes = f.tell()
+        checkpoint.record(row_ids[0], row_ids[-1] + 1, output_bytes)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(analyzer_factory, limiter, progress)) as pool:
+            chunks = iter_chunks(input_csv, chunksize)
+            while True:
+                with stage("csv_read"):
+                    next_chunk = next(chunks, None)
+                if next_chunk is None:
+                    break
+                chunk_start, chunk = next_chunk
+                chunk_end = chunk_start + len(chunk)
+                if checkpoint:
+                    pending = checkpoint.pending_rows(chunk_start, chunk_end)
+                else:
+                    pending = list(range(chunk_start, chunk_end))
+                skipped += len(chunk) - len(pending)
+                if not pending:
+                    continue
+                chunk = chunk.iloc[[row_id - chunk_start for row_id in pending]]
+                in_flight.append((pending, pool.submit(_analyze_shard, pending, chunk, batch_options,
+                                                       writer is not None, live_metrics is not None,
+                                                       tracer is not None)))
+                submitted += len(pending)
+                while len(in_flight) >= workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                    write_next()
+            while in_flight:
+                write_next()
+    finally:
+        stop.set()
+        monitor.join()
+        if writer is not None:
+            writer.close()
+        if live_metrics:
+            live_metrics.close()
+
+    elapsed = time.monotonic() - start
+    print(f"Results saved to {output_csv}")
+    print(f"Processed {processed} reviews with {errors} errors ({skipped} already done) "
+          f"in {elapsed:.1f}s using {workers} workers")
+    return {"processed": processed, "errors": errors, "skipped": skipped}
@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+
+class StageTimer:
+    """
+    Thread-safe accumulator of wall-clock time per pipeline stage.
+
+    Stages are timed with `with timer.stage("model_call"): ...`; nested or
+    concurrent stages are each counted in full, so totals can exceed the
+    elapsed wall time when work overlaps.
+    """
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Total seconds, call count and mean milliseconds per stage
+        """
+        with self._lock:
+            return {
+                name: {
+                    "seconds": round(self.seconds[name], 6),
+                    "count": self.counts[name],
+                    "mean_ms": round(1000 * self.seconds[name] / self.counts[name], 4)
+                }
+                for name in self.seconds
+            }
+
+
+# Spans a Tracer keeps for the trace file; later stages are still counted
+# in the summary but not drawn
+DEFAULT_MAX_TRACE_EVENTS = 500_000
+
+
+class Tracer(StageTimer):
+    """
+    StageTimer that also keeps every stage as a span (stage, start,
+    duration, process, thread), for viewing a run as a Chrome trace
+    (chrome://tracing or https://ui.perfetto.dev).
+
+    A span costs two clock reads and a list append under the timer's lock,
+    so tracing can stay on for production runs; past `max_events` spans only
+    the totals are updated. Tracers filled in worker processes are handed
+    back with `drain` and folded into the parent's with `merge`. Timestamps
+    come from perf_counter_ns, which is system-wide on Linux and macOS, so
+    spans from different processes line up.
+    """
+    def __init__(self, max_events: int = DEFAULT_MAX_TRACE_EVENTS):
+        super().__init__()
+        self.max_events = max_events
+        self.events: List[Tuple[str, int, int, int, int]] = []  # (stage, start ns, duration ns, pid, tid)
+        self.thread_names: Dict[Tuple[int, int], str] = {}
+        self.dropped = 0
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record_span(name, start, time.perf_counter_ns() - start)
+
+    def record_span(self, name: str, start_ns: int, duration_ns: int):
+        thread = threading.current_thread()
+        key = (os.getpid(), thread.ident)
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + duration_ns / 1e9
+            self.counts[name] = self.counts.get(name, 0) + 1
+            if len(self.events) < self.max_events:
+                self.events.append((name, start_ns, duration_ns) + key)
+                if key not in self.thread_names:
+                    self.thread_names[key] = thread.name
+            else:
+                self.dropped += 1
+
+    def drain(self) -> "Tracer":
+        """
+        Move everything recorded so far into a new Tracer (e.g. to send one
+        chunk's spans from a worker to the parent) and start afresh
+        """
+        drained = Tracer(self.max_events)
+        with self._lock:
+            drained.seconds, self.seconds = self.seconds, {}
+            drained.counts, self.counts = self.counts, {}
+            drained.events, self.events = self.events, []
+            drained.thread_names = dict(self.thread_names)
+            drained.dropped, self.dropped = self.dropped, 0
+        return drained
+
+    def merge(self, other: "Tracer"):
+        with self._lock:
+            for name, seconds in other.seconds.items():
+                self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+                self.counts[name] = self.counts.get(name, 0) + other.counts[name]
+            room = max(0, self.max_events - len(self.events))
+            self.events += other.events[:room]
+            self.dropped += other.dropped + max(0, len(other.events) - room)
+            for key, name in other.thread_names.items():
+                self.thread_names.setdefault(key, name)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        StageTimer.summary plus the p50, p95 and maximum span per stage
+        (over the spans kept for the trace)
+        """
+        summary = super().summary()
+        with self._lock:
+            durations: Dict[str, List[int]] = {}
+            for name, _, duration, _, _ in self.events:
+                durations.setdefault(name, []).append(duration)
+        for name, values in durations.items():
+            values.sort()
+            summary[name].update({
+                "p50_ms": round(values[len(values) // 2] / 1e6, 4),
+                "p95_ms": round(values[min(len(values) - 1, int(0.95 * len(values)))] / 1e6, 4),
+                "max_ms": round(values[-1] / 1e6, 4)
+            })
+        return summary
+
+    def chrome_trace(self) -> Dict:
+        """
+        The spans in Chrome's trace-event format (complete "X" events in
+        microseconds), with the per-stage summary under "otherData"
+        """
+        with self._lock:
+            events = list(self.events)
+            thread_names = dict(self.thread_names)
+            dropped = self.dropped
+        origin = min((start for _, start, _, _, _ in events), default=0)
+        trace = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                  "args": {"name": "main" if pid == os.getpid() else f"worker {pid}"}}
+                 for pid in sorted({pid for pid, _ in thread_names})]
+        trace += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                  for (pid, tid), name in thread_names.items()]
+        trace += [{"name": name, "cat": "stage", "ph": "X", "ts": (start - origin) / 1000,
+                   "dur": duration / 1000, "pid": pid, "tid": tid}
+                  for name, start, duration, pid, tid in events]
+        return {"traceEvents": trace, "displayTimeUnit": "ms",
+                "otherData": {"stages": self.summary(), "dropped_spans": dropped}}
+
+    def write_chrome_trace(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def format_stage_summary(summary: Dict[str, Dict[str, float]]) -> str:
+    """
+    A per-stage summary as a text table, slowest stage first
+    """
+    lines = [f"{'stage':<18} {'count':>9} {'total s':>9} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9}"]
+    for name, stats in sorted(summary.items(), key=lambda item: -item[1]["seconds"]):
+        lines.append(f"{name:<18} {stats['count']:>9} {stats['seconds']:>9.3f} {stats['mean_ms']:>9.3f} "
+                     f"{stats.get('p95_ms', float('nan')):>9.3f} {stats.get('max_ms', float('nan')):>9.3f}")
+    return "\n".join(lines)
+
+
+@contextmanager
+def cpu_profile(path: Optional[str], top: int = 25):
+    """
+    Run the body under cProfile when `path` is given, then save the stats
+    there (readable with pstats or snakeviz) and print the `top` functions
+    by cumulative time. cProfile only sees the thread that enters this
+    block; model calls running in executor threads show up in the trace
+    instead.
+    """
+    if path is None:
+        yield None
+        return
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(top)
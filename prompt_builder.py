@@ -0,0 +1,211 @@
+import json
+import math
+import re
+from typing import Callable, Dict, List, Optional
+
+from backends import estimate_tokens
+
+# Reviews longer than this (estimated tokens) are split into chunks that are
+# analyzed separately and then combined
+DEFAULT_MAX_REVIEW_TOKENS = 1024
+
+# Output allowance: a fixed amount for the JSON skeleton and explanation plus
+# room for longer evidence phrases in longer reviews, capped so a single call
+# can never run away
+BASE_OUTPUT_TOKENS = 120
+MAX_SINGLE_OUTPUT_TOKENS = 512
+MAX_EVIDENCE_PHRASES = 3
+
+# Prompt wording; any change here must bump PROMPT_VERSION in sentiment_llm.py
+SINGLE_PROMPT_TEMPLATE = """
+        Analyze the sentiment of this movie review and provide:
+        1. Sentiment label: Positive, Negative, or Neutral
+        2. Confidence score between 0-1
+        3. Brief explanation (1-2 sentences)
+        4. 2-3 key evidence phrases from the text that support your analysis
+        
+        {few_shot_examples}
+        
+        Review: "{review_text}"
+        
+        Return ONLY a valid JSON object with this exact structure:
+        {{
+            "label": "Positive|Negative|Neutral",
+            "confidence": 0.00,
+            "explanation": "short reason",
+            "evidence_phrases": ["phrase1", "phrase2"]
+        }}
+        """
+
+PACKED_PROMPT_TEMPLATE = """
+        Analyze the sentiment of each of the following {count} movie reviews and provide, for each one:
+        1. Sentiment label: Positive, Negative, or Neutral
+        2. Confidence score between 0-1
+        3. Brief explanation (1-2 sentences)
+        4. 2-3 key evidence phrases from the text that support your analysis
+        
+        {few_shot_examples}
+        
+        Reviews:
+        {numbered}
+        
+        Return ONLY a valid JSON array with exactly one object per review, using this exact structure:
+        [
+            {{
+                "index": 0,
+                "label": "Positive|Negative|Neutral",
+                "confidence": 0.00,
+                "explanation": "short reason",
+                "evidence_phrases": ["phrase1", "phrase2"]
+            }}
+        ]
+        """
+
+# Marks where the review goes when the single-review template is split
+REVIEW_SLOT = "\x00REVIEW\x00"
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+class PromptBuilder:
+    """
+    Builds single-review and packed prompts around a precomputed static prefix.
+
+    The instruction text and few-shot block are rendered once at construction
+    and their token counts measured, so building a prompt is a concatenation
+    and its size is known without rendering it.
+    """
+    def __init__(self, few_shot_examples: str, max_review_tokens: int = DEFAULT_MAX_REVIEW_TOKENS,
+                 count_tokens: Callable[[str], int] = estimate_tokens):
+        self.few_shot_examples = few_shot_examples
+        self.max_review_tokens = max_review_tokens
+        self.count_tokens = count_tokens
+
+        self.prefix, self.suffix = SINGLE_PROMPT_TEMPLATE.format(
+            few_shot_examples=few_shot_examples, review_text=REVIEW_SLOT).split(REVIEW_SLOT)
+        self.static_tokens = self.count_tokens(self.prefix) + self.count_tokens(self.suffix)
+
+    def build(self, review_text: str) -> str:
+        """
+        Prompt for a single review
+        """
+        return self.prefix + review_text + self.suffix
+
+    def build_packed(self, reviews: List[str]) -> str:
+        """
+        One prompt asking for a JSON array covering several reviews.
+
+        Each review is JSON-encoded and tagged with its position so the model
+        can key its answers by index. The few-shot block is sent once per pack
+        instead of once per review.
+        """
+        numbered = "\n".join(f"[{i}] {json.dumps(review)}" for i, review in enumerate(reviews))
+        return PACKED_PROMPT_TEMPLATE.format(
+            count=len(reviews), few_shot_examples=self.few_shot_examples, numbered=numbered)
+
+    def prompt_tokens(self, review_text: str) -> int:
+        """
+        Estimated size of the single-review prompt for this review
+        """
+        return self.static_tokens + self.count_tokens(review_text)
+
+    def output_tokens(self, review_text: str) -> int:
+        """
+        Output allowance for one review, growing with its length
+        """
+        return min(MAX_SINGLE_OUTPUT_TOKENS, BASE_OUTPUT_TOKENS + self.count_tokens(review_text) // 8)
+
+    def needs_split(self, review_text: str) -> bool:
+        return self.count_tokens(review_text) > self.max_review_tokens
+
+    def split(self, review_text: str) -> List[str]:
+        """
+        Split a review into sentence-aligned chunks of at most
+        `max_review_tokens` each, sized evenly so no chunk is a short tail.
+        Sentences longer than the budget are broken at word boundaries.
+        """
+        pieces = []
+        for sentence in SENTENCE_END.split(review_text):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if self.count_tokens(sentence) <= self.max_review_tokens:
+                pieces.append(sentence)
+            else:
+                pieces.extend(self._split_words(sentence))
+
+        sizes = [self.count_tokens(piece) for piece in pieces]
+        remaining = sum(sizes)
+        planned = math.ceil(remaining / self.max_review_tokens)
+        target = math.ceil(remaining / planned)
+        largest = max(sizes, default=0)
+        chunks, current = [], []
+        for piece, piece_size in zip(pieces, sizes):
+            if current:
+                size = self.count_tokens(" ".join(current))
+                grown = self.count_tokens(" ".join(current + [piece]))
+                # Close the chunk at the budget, or when taking the piece would
+                # leave it further from the even target than stopping here and
+                # the rest still fits in the chunks planned after this one
+                if grown > self.max_review_tokens or (
+                        grown - target >= target - size
+                        and remaining <= (planned - len(chunks) - 1) * (self.max_review_tokens - largest)):
+                    chunks.append(" ".join(current))
+                    current = []
+            current.append(piece)
+            remaining -= piece_size
+        if current:
+            chunks.append(" ".join(current))
+        return chunks
+
+    def _split_words(self, sentence: str) -> List[str]:
+        parts, current = [], []
+        for word in sentence.split():
+            if current and self.count_tokens(" ".join(current + [word])) > self.max_review_tokens:
+                parts.append(" ".join(current))
+                current = []
+            current.append(word)
+        if current:
+            parts.append(" ".join(current))
+        return parts
+
+
+def reduce_chunk_results(results: List[Dict], weights: List[float]) -> Optional[Dict]:
+    """
+    Combine per-chunk answers into one result for the whole review.
+
+    Each chunk votes for its label with weight (chunk tokens x confidence).
+    The winning label's share of the total weight becomes the confidence, so
+    chunks that disagree pull it down. Evidence comes from the most confident
+    chunks that agree with the verdict. Chunks that produced no real answer
+    (those with a `fallback_reason`) are ignored; returns None if none did.
+    """
+    answered = [(result, weight) for result, weight in zip(results, weights)
+                if not result.get("fallback_reason")]
+    if not answered:
+        return None
+
+    total_weight = sum(weight for _, weight in answered)
+    scores: Dict[str, float] = {}
+    for result, weight in answered:
+        scores[result["label"]] = scores.get(result["label"], 0.0) + weight * float(result["confidence"])
+    label = max(scores, key=scores.get)
+
+    agreeing = sorted((result for result, _ in answered if result["label"] == label),
+                      key=lambda result: -float(result["confidence"]))
+    evidence = []
+    for result in agreeing:
+        for phrase in result["evidence_phrases"]:
+            if phrase not in evidence:
+                evidence.append(phrase)
+    counts = {}
+    for result, _ in answered:
+        counts[result["label"]] = counts.get(result["label"], 0) + 1
+    breakdown = ", ".join(f"{count} {name}" for name, count in sorted(counts.items(), key=lambda item: -item[1]))
+
+    return {
+        "label": label,
+        "confidence": round(scores[label] / total_weight, 2),
+        "explanation": f"Combined from {len(answered)} sections ({breakdown}). {agreeing[0]['explanation']}",
+        "evidence_phrases": evidence[:MAX_EVIDENCE_PHRASES]
+    }
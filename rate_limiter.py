@@ -0,0 +1,301 @@
+import asyncio
+import itertools
+import multiprocessing
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. Each
+    acquire reserves a token immediately (the balance may go negative) and
+    then waits outside the lock, so callers are served in arrival order
+    without busy-looping.
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests_per_minute: float, burst: float = None):
+        """
+        Build a bucket from a requests-per-minute quota
+        """
+        rate = requests_per_minute / 60.0
+        return cls(rate, capacity=burst if burst is not None else max(1.0, rate))
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        Take `tokens` from the bucket and return how long the caller must wait
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens: float = 1.0):
+        """
+        Block the calling thread until `tokens` are available
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1.0):
+        """
+        Asyncio variant of `acquire` that yields to the event loop while waiting
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    TokenBucket whose balance lives in shared memory, so worker processes
+    that inherit it draw from one budget.
+
+    Pass it to pool workers at creation (e.g. as a ProcessPoolExecutor
+    initializer argument) from the same multiprocessing `context`.
+    """
+    def __init__(self, rate: float, capacity: float = None, context=None):
+        # No super().__init__: its thread lock and local balance are replaced
+        # by the shared array (whose lock also makes the object picklable)
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        context = context or multiprocessing
+        # [tokens, last refill time]; time.monotonic is system-wide, so
+        # timestamps from different processes are comparable
+        self._state = context.Array("d", [self.capacity, time.monotonic()])
+
+    @classmethod
+    def per_minute(cls, requests_per_minute: float, burst: float = None, context=None):
+        rate = requests_per_minute / 60.0
+        return cls(rate, capacity=burst if burst is not None else max(1.0, rate), context=context)
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        with self._state.get_lock():
+            now = time.monotonic()
+            balance = min(self.capacity, self._state[0] + (now - self._state[1]) * self.rate) - tokens
+            self._state[0], self._state[1] = balance, now
+            if balance >= 0:
+                return 0.0
+            return -balance / self.rate
+
+
+class LimiterClosed(Exception):
+    """
+    Raised by a FairShareLimiter's acquire once it has been closed
+    """
+
+
+class WeightedFairScheduler:
+    """
+    Shares one TokenBucket between flows (e.g. batch jobs) in proportion to
+    their weights.
+
+    Requests are granted by start-time fair queuing: each gets a virtual
+    start tag max(V, previous finish of its flow) and advances its flow's
+    finish by tokens / weight, and the waiting request with the lowest tag
+    is served next, paced by the bucket. A flow that was idle does not bank
+    credit. Flows marked urgent (with a deadline) are served before all
+    others, earliest deadline first. A dispatcher thread does the pacing,
+    so flows may wait from different threads and event loops.
+    """
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.granted: Dict[str, float] = {}
+        self._weights: Dict[str, float] = {}
+        self._finish: Dict[str, float] = {}
+        self._urgent: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._waiting: List[list] = []  # [start tag, seq, flow, tokens, notify, live]
+        self._pacing: Optional[list] = None  # taken off the queue, waiting on the bucket
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def register(self, flow: str, weight: float = 1.0):
+        if weight <= 0:
+            raise ValueError("weight must be positive")
+        with self._cond:
+            self._weights[flow] = float(weight)
+            self._finish.setdefault(flow, self._virtual_time)
+            self.granted.setdefault(flow, 0.0)
+
+    def unregister(self, flow: str):
+        self.withdraw(flow, LimiterClosed(f"{flow} was unregistered"))
+        with self._cond:
+            for table in (self._weights, self._finish, self._urgent, self.granted):
+                table.pop(flow, None)
+
+    def set_urgent(self, flow: str, deadline: Optional[float]):
+        """
+        Serve `flow` ahead of the fair queue until called with None
+        """
+        with self._cond:
+            if deadline is None:
+                self._urgent.pop(flow, None)
+            else:
+                self._urgent[flow] = deadline
+
+    def enqueue(self, flow: str, tokens: float, notify: Callable[[Optional[Exception]], None]) -> list:
+        """
+        Queue a request; `notify(None)` is called from the dispatcher when it
+        is granted, or `notify(error)` if it is withdrawn. Returns the entry,
+        which `cancel` takes back.
+        """
+        with self._cond:
+            if self._closed:
+                raise LimiterClosed("Scheduler is closed")
+            start = max(self._virtual_time, self._finish[flow])
+            self._finish[flow] = start + tokens / self._weights[flow]
+            entry = [start, next(self._seq), flow, tokens, notify, True]
+            self._waiting.append(entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name="fair-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return entry
+
+    def cancel(self, entry: list):
+        with self._cond:
+            entry[5] = False
+
+    def withdraw(self, flow: str, error: Exception):
+        """
+        Fail every waiting request of `flow` with `error`
+        """
+        with self._cond:
+            withdrawn = [entry for entry in self._waiting + [self._pacing]
+                         if entry is not None and entry[2] == flow and entry[5]]
+            for entry in withdrawn:
+                entry[5] = False
+        for entry in withdrawn:
+            entry[4](error)
+
+    def _next(self) -> Optional[list]:
+        self._waiting = [entry for entry in self._waiting if entry[5]]
+        if not self._waiting:
+            return None
+        entry = min(self._waiting, key=lambda entry: (0, self._urgent[entry[2]], entry[1]) if entry[2] in self._urgent
+                    else (1, entry[0], entry[1]))
+        self._waiting.remove(entry)
+        self._virtual_time = max(self._virtual_time, entry[0])
+        return entry
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                entry = self._next()
+                while entry is None and not self._closed:
+                    self._cond.wait()
+                    entry = self._next()
+                if entry is None:
+                    return
+                self._pacing = entry
+            wait = self.bucket.reserve(entry[3])
+            if wait > 0:
+                time.sleep(wait)
+            with self._cond:
+                self._pacing = None
+                if not entry[5]:
+                    continue
+                entry[5] = False
+                if entry[2] in self.granted:
+                    self.granted[entry[2]] += entry[3]
+            entry[4](None)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            waiting = [entry for entry in self._waiting + [self._pacing] if entry is not None and entry[5]]
+            for entry in waiting:
+                entry[5] = False
+            self._waiting = []
+            self._cond.notify_all()
+        for entry in waiting:
+            entry[4](LimiterClosed("Scheduler is closed"))
+
+
+class FairShareLimiter:
+    """
+    One flow's handle on a WeightedFairScheduler, usable wherever a
+    TokenBucket is (e.g. as batch_analyze's `limiter`).
+
+    An optional `quota` bucket caps the flow's own rate before it competes
+    for the shared one. After `close(error)`, waiting and later acquires
+    raise `error` (LimiterClosed by default), which lets a running batch be
+    stopped between calls.
+    """
+    def __init__(self, scheduler: WeightedFairScheduler, flow: str, weight: float = 1.0,
+                 quota: Optional[TokenBucket] = None):
+        self.scheduler = scheduler
+        self.flow = flow
+        self.quota = quota
+        self._error: Optional[Exception] = None
+        scheduler.register(flow, weight)
+
+    def close(self, error: Optional[Exception] = None):
+        self._error = error or LimiterClosed(f"{self.flow} is closed")
+        self.scheduler.withdraw(self.flow, self._error)
+
+    def acquire(self, tokens: float = 1.0):
+        if self._error is not None:
+            raise self._error
+        if self.quota is not None:
+            self.quota.acquire(tokens)
+        granted = threading.Event()
+        outcome: List[Optional[Exception]] = []
+
+        def notify(error: Optional[Exception]):
+            outcome.append(error)
+            granted.set()
+
+        self.scheduler.enqueue(self.flow, tokens, notify)
+        granted.wait()
+        if outcome[0] is not None:
+            raise outcome[0]
+
+    async def acquire_async(self, tokens: float = 1.0):
+        if self._error is not None:
+            raise self._error
+        if self.quota is not None:
+            await self.quota.acquire_async(tokens)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def settle(error: Optional[Exception]):
+            if not future.done():
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+        def notify(error: Optional[Exception]):
+            try:
+                loop.call_soon_threadsafe(settle, error)
+            except RuntimeError:
+                pass  # the waiting event loop has already closed
+
+        entry = self.scheduler.enqueue(self.flow, tokens, notify)
+        try:
+            await future
+        except asyncio.CancelledError:
+            self.scheduler.cancel(entry)
+            raise
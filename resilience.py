@@ -0,0 +1,311 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Callable, List, Optional, TypeVar
+
+from backends import BackendError
+
+if TYPE_CHECKING:
+    import tenacity
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Error classes
+THROTTLED = "throttled"
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+# fallback_reason recorded on a result whose model call failed with each class
+FALLBACK_REASONS = {THROTTLED: "throttled", TRANSIENT: "unavailable", PERMANENT: "model_error"}
+
+# Fallback reasons worth sending to the model again later in a batch
+RETRYABLE_FALLBACKS = ("throttled", "unavailable")
+
+TRANSIENT_STATUS_CODES = (408, 500, 502, 503, 504)
+
+# How often callers re-check a half-open breaker whose probe call is in flight
+HALF_OPEN_POLL_SECONDS = 0.1
+
+# Longest a batch waits out one backend outage before failing fast
+DEFAULT_MAX_OUTAGE_WAIT = 120.0
+
+
+class CircuitOpenError(BackendError):
+    """
+    Raised instead of calling a backend whose circuit breaker is open
+    """
+    def __init__(self, retry_after: float):
+        super().__init__(f"Circuit open; retry in {retry_after:.1f}s", status_code=503)
+        self.retry_after = retry_after
+
+
+def status_code_of(error: Exception) -> Optional[int]:
+    """
+    HTTP-style status of a backend error: BackendError.status_code, or the
+    integer `code` carried by google.api_core exceptions
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(error, "code", None)
+    return status if isinstance(status, int) else None
+
+
+def classify_error(error: Exception) -> str:
+    """
+    THROTTLED for quota errors (429), TRANSIENT for server errors, timeouts
+    and connection failures, PERMANENT for everything else
+    """
+    status = status_code_of(error)
+    if status == 429:
+        return THROTTLED
+    if status in TRANSIENT_STATUS_CODES or isinstance(error, (TimeoutError, ConnectionError)):
+        return TRANSIENT
+    if isinstance(error, BackendError) and status is None:
+        # Connection-level failure before any response
+        return TRANSIENT
+    return PERMANENT
+
+
+def fallback_reason(error: Exception) -> str:
+    return FALLBACK_REASONS[classify_error(error)]
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    True if the same call may succeed if repeated after a backoff. An open
+    circuit fails fast instead.
+    """
+    return not isinstance(error, CircuitOpenError) and classify_error(error) != PERMANENT
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, bounded by `max_attempts` and by a
+    `deadline` (seconds) covering all attempts. Each attempt may take at most
+    `call_timeout` seconds, or whatever remains of the deadline.
+    """
+    def __init__(self, max_attempts: int = 5, initial_backoff: float = 0.5, max_backoff: float = 20.0,
+                 call_timeout: float = 60.0, deadline: float = 120.0):
+        self.max_attempts = max_attempts
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.call_timeout = call_timeout
+        self.deadline = deadline
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker.
+
+    After `failure_threshold` consecutive transient failures the circuit
+    opens and calls fail fast for `reset_timeout` seconds. The first call
+    after that is a probe (half-open): success closes the circuit, failure
+    opens it again. Throttling and client errors prove the backend is up, so
+    they count as successes here.
+    """
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        # When the circuit last left the closed state; None while closed
+        self.outage_started: Optional[float] = None
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Raise CircuitOpenError unless a call may go ahead now
+        """
+        with self._lock:
+            if self.state == "open":
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(remaining)
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._probe_in_flight:
+                    raise CircuitOpenError(HALF_OPEN_POLL_SECONDS)
+                self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info("Circuit closed")
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self.outage_started = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning("Circuit opened after %d consecutive failures", self.consecutive_failures,
+                                   extra={"reset_timeout": self.reset_timeout})
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                if self.outage_started is None:
+                    self.outage_started = self._opened_at
+            self._probe_in_flight = False
+
+    def retry_after(self) -> float:
+        """
+        Seconds until a call could be let through (0 if one can go now)
+        """
+        with self._lock:
+            if self.state == "open":
+                return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+            if self.state == "half_open" and self._probe_in_flight:
+                return HALF_OPEN_POLL_SECONDS
+            return 0.0
+
+
+class ResilientCaller:
+    """
+    Runs backend calls under a retry policy and a circuit breaker.
+
+    `call(fn)` invokes `fn(timeout)` until it succeeds, fails permanently or
+    the policy gives up, re-raising the last error. Listeners (such as an
+    AIMDController) are told about every successful and throttled attempt;
+    `on_retry(error_class)` is called before each backoff sleep.
+    """
+    def __init__(self, policy: Optional[RetryPolicy] = None, breaker: Optional[CircuitBreaker] = None,
+                 on_retry: Optional[Callable[[str], None]] = None,
+                 max_outage_wait: float = DEFAULT_MAX_OUTAGE_WAIT):
+        self.policy = policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.on_retry = on_retry
+        self.max_outage_wait = max_outage_wait
+        self.listeners: List = []
+
+    def call(self, fn: Callable[[float], T]) -> T:
+        # Imported on the first model call rather than at startup
+        import tenacity
+        policy = self.policy
+        deadline = time.monotonic() + policy.deadline
+        retrying = tenacity.Retrying(
+            stop=tenacity.stop_after_attempt(policy.max_attempts) | tenacity.stop_after_delay(policy.deadline),
+            wait=tenacity.wait_random_exponential(multiplier=policy.initial_backoff, max=policy.max_backoff),
+            retry=tenacity.retry_if_exception(is_retryable),
+            before_sleep=self._before_sleep,
+            reraise=True
+        )
+        return retrying(self._attempt, fn, deadline)
+
+    def _attempt(self, fn: Callable[[float], T], deadline: float) -> T:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise BackendError("Deadline exceeded before the call could be made", status_code=504)
+        self.breaker.before_call()
+        try:
+            result = fn(min(self.policy.call_timeout, remaining))
+        except Exception as e:
+            error_class = classify_error(e)
+            if error_class == TRANSIENT:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            if error_class == THROTTLED:
+                for listener in list(self.listeners):
+                    listener.on_throttle()
+            raise
+        self.breaker.record_success()
+        for listener in list(self.listeners):
+            listener.on_success()
+        return result
+
+    def _before_sleep(self, retry_state: "tenacity.RetryCallState"):
+        error = retry_state.outcome.exception()
+        error_class = classify_error(error)
+        logger.info("Retrying %s error (attempt %d) in %.2fs: %s", error_class, retry_state.attempt_number,
+                    retry_state.next_action.sleep, error,
+                    extra={"error_class": error_class, "attempt": retry_state.attempt_number})
+        if self.on_retry:
+            self.on_retry(error_class)
+
+    async def wait_until_available(self) -> bool:
+        """
+        Sleep while the circuit breaker would reject a call. An open circuit
+        is waited out only until the outage is `max_outage_wait` seconds old;
+        after that this returns False so callers can fail fast. A probe call
+        already in flight is always waited for.
+        """
+        delay = self.breaker.retry_after()
+        while delay > 0:
+            started = self.breaker.outage_started
+            if self.breaker.state == "open" and started is not None:
+                remaining = started + self.max_outage_wait - time.monotonic()
+                if remaining <= 0:
+                    return False
+                delay = min(delay, remaining)
+            await asyncio.sleep(delay)
+            delay = self.breaker.retry_after()
+        return True
+
+
+class AIMDController:
+    """
+    Additive-increase / multiplicative-decrease limit on in-flight calls.
+
+    Starts at `initial` (default a quarter of `maximum`) and, until the first
+    throttle, grows by one per success (slow start, doubling every round
+    trip). Afterwards each success adds 1/limit, about one slot per round
+    trip. A throttled call multiplies the limit by `decrease`, at most once
+    per `cooldown` seconds so one burst of 429s from calls already in flight
+    only counts once. Thread-safe; `slot()` is used from the event loop.
+    """
+    def __init__(self, maximum: int, minimum: int = 1, initial: Optional[int] = None,
+                 decrease: float = 0.5, cooldown: float = 1.0):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.limit = float(initial if initial is not None else max(minimum, maximum // 4))
+        self.slow_start = True
+        self.throttles = 0
+        self._last_decrease = 0.0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._condition = asyncio.Condition()
+
+    @property
+    def concurrency(self) -> int:
+        return max(self.minimum, int(self.limit))
+
+    def on_success(self):
+        with self._lock:
+            self.limit = min(self.maximum, self.limit + (1.0 if self.slow_start else 1.0 / self.limit))
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttles += 1
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self.slow_start = False
+            self.limit = max(self.minimum, self.limit * self.decrease)
+            logger.info("Throttled; concurrency limit cut to %d", self.concurrency,
+                        extra={"concurrency_limit": self.concurrency})
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold one of the `concurrency` in-flight slots
+        """
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.concurrency)
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
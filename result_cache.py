@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Optional
+
+# Shared by the CLI and the Streamlit app unless SENTIMENT_CACHE_PATH overrides it
+DEFAULT_CACHE_PATH = os.getenv(
+    "SENTIMENT_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".sentiment_cache.sqlite")
+)
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 3600
+
+# Run eviction once every this many inserts rather than on every write
+EVICT_EVERY = 500
+
+_default_caches: Dict[str, "ResultCache"] = {}
+_default_lock = threading.Lock()
+
+
+def normalize_review(review_text: str) -> str:
+    """
+    Canonical form of a review for cache keys: NFC unicode, collapsed
+    whitespace, stripped. Case is preserved since it can carry sentiment.
+    """
+    return " ".join(unicodedata.normalize("NFC", review_text).split())
+
+
+class ResultCache:
+    """
+    Persistent content-addressed cache of sentiment results backed by SQLite.
+
+    Keys hash the normalized review together with everything that can change
+    the model's answer (model name, temperature, prompt version). Entries are
+    evicted least-recently-used once `max_entries` is exceeded, and dropped
+    outright once older than `max_age_seconds`. The database runs in WAL mode
+    so several processes can share one file.
+    """
+    def __init__(self, path: str = DEFAULT_CACHE_PATH,
+                 max_entries: Optional[int] = DEFAULT_MAX_ENTRIES,
+                 max_age_seconds: Optional[float] = DEFAULT_MAX_AGE_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._inserts = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_accessed ON results(accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(review_text: str, model_name: str, temperature: float, prompt_version: str) -> str:
+        """
+        Content address for one (review, model configuration) pair
+        """
+        payload = "\x1f".join([prompt_version, model_name, repr(float(temperature)), normalize_review(review_text)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Return the cached result for `key`, or None on a miss or expired entry
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT result, created_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.max_age_seconds is not None and now - row[1] > self.max_age_seconds):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, result: Dict):
+        """
+        Store a result, periodically evicting stale and least-recently-used entries
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, result, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(result), now, now)
+            )
+            self._conn.commit()
+            self._inserts += 1
+            if self._inserts % EVICT_EVERY == 0:
+                self._evict(now)
+
+    def evict(self):
+        """
+        Drop expired entries and trim the cache down to `max_entries`
+        """
+        with self._lock:
+            self._evict(time.time())
+
+    def _evict(self, now: float):
+        if self.max_age_seconds is not None:
+            self._conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.max_age_seconds,))
+        if self.max_entries is not None:
+            self._conn.execute("""
+                DELETE FROM results WHERE key IN (
+                    SELECT key FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+        self._conn.commit()
+
+    def clear(self):
+        """
+        Remove every cached result
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def stats(self) -> Dict:
+        """
+        Hit/miss counters for this process plus the current entry count
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+            "path": self.path
+        }
+
+
+def get_default_cache(path: str = DEFAULT_CACHE_PATH) -> ResultCache:
+    """
+    Process-wide cache instance for `path`, created on first use
+    """
+    with _default_lock:
+        if path not in _default_caches:
+            _default_caches[path] = ResultCache(path)
+        return _default_caches[path]
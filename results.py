@@ -0,0 +1,256 @@
+"""
+Typed and columnar representations of analysis results.
+
+SentimentAnalyzer answers single reviews with plain dicts (they are what the
+cache stores and the service returns as JSON). Batch jobs collect their
+answers in a ResultBuffer instead: preallocated NumPy columns that are turned
+into DataFrame columns or an Arrow table in one step, rather than a Python
+dict per row.
+
+Evidence spans (see evidence.py) are only present when a batch was asked to
+locate its evidence phrases: one (start, end) character span per phrase, or
+None for a phrase that does not occur in the review.
+"""
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+class Label(str, Enum):
+    POSITIVE = "Positive"
+    NEGATIVE = "Negative"
+    NEUTRAL = "Neutral"
+    ERROR = "Error"
+
+
+@dataclass(slots=True)
+class SentimentResult:
+    """
+    One analysis result. `fallback_reason` is empty for genuine answers and
+    `dup_group` is only set on results copied from a duplicate's representative.
+    `evidence_spans` is None unless the evidence phrases were located.
+    """
+    label: Label
+    confidence: float
+    explanation: str
+    evidence_phrases: Tuple[str, ...] = ()
+    fallback_reason: str = ""
+    dup_group: Optional[int] = None
+    evidence_spans: Optional[Tuple[Optional[Tuple[int, int]], ...]] = None
+
+    @classmethod
+    def from_dict(cls, result: Dict) -> "SentimentResult":
+        return cls(
+            label=Label(result["label"]),
+            confidence=float(result["confidence"]),
+            explanation=result["explanation"],
+            evidence_phrases=tuple(result["evidence_phrases"]),
+            fallback_reason=result.get("fallback_reason", ""),
+            dup_group=result.get("dup_group"),
+            evidence_spans=result.get("evidence_spans")
+        )
+
+    def to_dict(self) -> Dict:
+        """
+        The result in the analyzer's dict format
+        """
+        result = {
+            "label": self.label.value,
+            "confidence": self.confidence,
+            "explanation": self.explanation,
+            "evidence_phrases": list(self.evidence_phrases)
+        }
+        if self.fallback_reason:
+            result["fallback_reason"] = self.fallback_reason
+        if self.dup_group is not None:
+            result["dup_group"] = self.dup_group
+        if self.evidence_spans is not None:
+            result["evidence_spans"] = self.evidence_spans
+        return result
+
+
+class _Codes:
+    """
+    Small-integer codes for the few distinct values of a column
+    """
+    def __init__(self, values: Iterable[str]):
+        self.values: List[str] = list(values)
+        self._codes = {value: code for code, value in enumerate(self.values)}
+
+    def code(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return np.array(self.values, dtype=object)[codes]
+
+
+class ResultBuffer:
+    """
+    Columnar storage for `size` results, filled by position in any order.
+
+    Labels and fallback reasons are kept as int8 codes, confidence and
+    duplicate groups as NumPy arrays, and explanations and evidence phrases
+    as object arrays, so a million results cost tens of megabytes less than
+    the same number of dicts and become DataFrame columns without a Python
+    loop per column. Rows are set from analyzer dicts or SentimentResults
+    and read back as SentimentResults. `located` tells whether evidence
+    spans were filled in.
+    """
+    def __init__(self, size: int):
+        self.label_codes = np.zeros(size, dtype=np.int8)
+        self.confidence = np.zeros(size, dtype=np.float64)
+        self.explanation = np.full(size, "", dtype=object)
+        self.evidence_phrases = np.empty(size, dtype=object)
+        self.fallback_codes = np.zeros(size, dtype=np.int8)
+        self.dup_group = np.full(size, -1, dtype=np.int64)
+        self.evidence_spans = np.empty(size, dtype=object)
+        self.located = False
+        self._labels = _Codes(label.value for label in Label)
+        self._fallback_reasons = _Codes([""])
+
+    @classmethod
+    def from_results(cls, results: Sequence[Union[Dict, SentimentResult]]) -> "ResultBuffer":
+        buffer = cls(len(results))
+        for i, result in enumerate(results):
+            buffer[i] = result
+        return buffer
+
+    def __len__(self) -> int:
+        return len(self.confidence)
+
+    def __setitem__(self, index: int, result: Union[Dict, SentimentResult]):
+        if isinstance(result, SentimentResult):
+            result = result.to_dict()
+        self.label_codes[index] = self._labels.code(result["label"])
+        self.confidence[index] = result["confidence"]
+        self.explanation[index] = result["explanation"]
+        self.evidence_phrases[index] = tuple(result["evidence_phrases"])
+        self.fallback_codes[index] = self._fallback_reasons.code(result.get("fallback_reason", ""))
+        dup_group = result.get("dup_group")
+        self.dup_group[index] = -1 if dup_group is None else dup_group
+        spans = result.get("evidence_spans")
+        if spans is not None:
+            self.evidence_spans[index] = tuple(spans)
+            self.located = True
+
+    def __getitem__(self, index: int) -> SentimentResult:
+        dup_group = int(self.dup_group[index])
+        return SentimentResult(
+            label=Label(self._labels.values[self.label_codes[index]]),
+            confidence=float(self.confidence[index]),
+            explanation=self.explanation[index],
+            evidence_phrases=self.evidence_phrases[index] or (),
+            fallback_reason=self._fallback_reasons.values[self.fallback_codes[index]],
+            dup_group=dup_group if dup_group >= 0 else None,
+            evidence_spans=self.evidence_spans[index] if self.located else None
+        )
+
+    @property
+    def has_dup_groups(self) -> bool:
+        return bool(len(self) and self.dup_group.max() >= 0)
+
+    def labels(self) -> np.ndarray:
+        return self._labels.decode(self.label_codes)
+
+    def error_count(self) -> int:
+        return int((self.label_codes == self._labels.code(Label.ERROR.value)).sum())
+
+    def set_evidence_spans(self, spans: Sequence[Tuple[Optional[Tuple[int, int]], ...]]):
+        """
+        Store the located evidence spans of every row (see evidence.locate_batch)
+        """
+        for index, row_spans in enumerate(spans):
+            self.evidence_spans[index] = row_spans
+        self.located = True
+
+    def unsupported_evidence(self) -> np.ndarray:
+        """
+        Per row, how many evidence phrases were not found in the review
+        """
+        return np.fromiter((sum(span is None for span in spans or ()) for spans in self.evidence_spans),
+                           dtype=np.int32, count=len(self))
+
+    def take(self, indices: Sequence[int]) -> "ResultBuffer":
+        """
+        A new buffer holding the rows at `indices` (which may repeat)
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        taken = ResultBuffer(0)
+        for name in ("label_codes", "confidence", "explanation", "evidence_phrases", "fallback_codes",
+                     "dup_group", "evidence_spans"):
+            setattr(taken, name, getattr(self, name)[indices])
+        taken._labels, taken._fallback_reasons = self._labels, self._fallback_reasons
+        taken.located = self.located
+        return taken
+
+    def columns(self, evidence_as_list: bool = False) -> Dict[str, Union[np.ndarray, List]]:
+        """
+        The output columns of a results file. Evidence phrases are joined
+        with ', ' for CSV unless `evidence_as_list` (used for Parquet), and
+        so are evidence spans (see evidence.format_spans); `dup_group` is only
+        included when some row has one, `evidence_spans` and
+        `unsupported_evidence` only when the evidence was located.
+        """
+        if evidence_as_list:
+            evidence = [list(phrases or ()) for phrases in self.evidence_phrases]
+        else:
+            evidence = [', '.join(phrases or ()) for phrases in self.evidence_phrases]
+        columns = {
+            'predicted_label': self.labels(),
+            'confidence_score': self.confidence,
+            'explanation': self.explanation,
+            'evidence_phrases': evidence,
+            'fallback_reason': self._fallback_reasons.decode(self.fallback_codes)
+        }
+        if self.has_dup_groups:
+            columns['dup_group'] = self.dup_group
+        if self.located:
+            if evidence_as_list:
+                columns['evidence_spans'] = [[list(span) if span else None for span in spans or ()]
+                                             for spans in self.evidence_spans]
+            else:
+                from evidence import format_spans
+                columns['evidence_spans'] = [format_spans(spans) for spans in self.evidence_spans]
+            columns['unsupported_evidence'] = self.unsupported_evidence()
+        return columns
+
+    def assign_to(self, df: pd.DataFrame, evidence_as_list: bool = False) -> pd.DataFrame:
+        """
+        Attach the results to the rows of `df` (same length, same order)
+        """
+        for name, values in self.columns(evidence_as_list).items():
+            df[name] = values
+        return df
+
+    def to_arrow(self):
+        """
+        The result columns as an Arrow table with their Parquet types; labels
+        and fallback reasons keep their codes as dictionary indices
+        """
+        import pyarrow as pa
+        from batch_io import RESULT_TYPES
+
+        columns = {
+            'predicted_label': pa.DictionaryArray.from_arrays(self.label_codes, self._labels.values),
+            'confidence_score': pa.array(self.confidence, type=RESULT_TYPES['confidence_score']),
+            'explanation': pa.array(self.explanation, type=pa.string()),
+            'evidence_phrases': pa.array([list(phrases or ()) for phrases in self.evidence_phrases],
+                                         type=RESULT_TYPES['evidence_phrases']),
+            'fallback_reason': pa.DictionaryArray.from_arrays(self.fallback_codes, self._fallback_reasons.values)
+        }
+        if self.has_dup_groups:
+            columns['dup_group'] = pa.array(self.dup_group)
+        if self.located:
+            columns['evidence_spans'] = pa.array(
+                [[list(span) if span else None for span in spans or ()] for spans in self.evidence_spans],
+                type=RESULT_TYPES['evidence_spans'])
+            columns['unsupported_evidence'] = pa.array(self.unsupported_evidence(),
+                                                       type=RESULT_TYPES['unsupported_evidence'])
+        return pa.table(columns)
@@ -0,0 +1,226 @@
+"""
+Per-review model routing across Gemini tiers.
+
+A ModelRouter holds an ordered list of tiers, cheapest and fastest first.
+Each review goes to the first tier whose limits it fits (estimated length
+and, when an ambiguity scorer is available, local ambiguity). A tier whose
+observed p95 latency or error rate has degraded is skipped in favour of the
+next stronger tier, or a weaker one when nothing stronger is healthy.
+Latency and outcomes are tracked online over a sliding window of recent
+calls per tier. Samples older than `max_age` seconds expire, so a degraded
+tier that stopped receiving traffic soon counts as healthy again and is
+retried.
+
+The policy can be loaded from JSON (see `ModelRouter.from_config`):
+
+    {
+      "tiers": [
+        {"model": "gemini-2.0-flash-lite", "max_review_tokens": 150, "max_ambiguity": 0.4},
+        {"model": "gemini-2.0-flash", "max_review_tokens": 1500},
+        {"model": "gemini-2.5-flash"}
+      ],
+      "latency_slo": 4.0,
+      "max_error_rate": 0.2
+    }
+
+Each tier's "backend" defaults to "gemini"; "simulated" or a served
+backend's URL work as for make_backend. Simulated tiers take SimulatedBackend
+arguments from an optional "simulator" object, for trying out a policy
+offline.
+"""
+import json
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from backends import ModelBackend, SimulatedBackend, estimate_tokens, make_backend
+
+# Observed p95 (seconds) above which a tier counts as degraded
+DEFAULT_LATENCY_SLO = 5.0
+
+# Share of recent calls failing with throttling or transient errors above
+# which a tier counts as degraded
+DEFAULT_MAX_ERROR_RATE = 0.25
+
+# Recent calls per tier that the latency and error statistics cover
+DEFAULT_WINDOW = 200
+
+# Calls a tier must have seen before its statistics are trusted
+DEFAULT_MIN_SAMPLES = 20
+
+# Seconds after which a call no longer counts towards a tier's statistics
+DEFAULT_MAX_AGE = 60.0
+
+
+class TierStats:
+    """
+    Latency and failures of a tier's most recent `window` calls made within
+    the last `max_age` seconds. The p95 is recomputed only after the window
+    changed.
+    """
+    def __init__(self, window: int = DEFAULT_WINDOW, max_age: float = DEFAULT_MAX_AGE):
+        self.max_age = max_age
+        self.calls = 0
+        self._samples = deque(maxlen=window)  # (monotonic time, seconds, failed)
+        self._failures = 0
+        self._p95: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, failed: bool):
+        with self._lock:
+            if len(self._samples) == self._samples.maxlen:
+                self._failures -= self._samples[0][2]
+            self._samples.append((time.monotonic(), seconds, failed))
+            self._failures += failed
+            self.calls += 1
+            self._p95 = None
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.max_age
+        while self._samples and self._samples[0][0] < cutoff:
+            self._failures -= self._samples.popleft()[2]
+            self._p95 = None
+
+    def _percentile(self) -> Optional[float]:
+        if self._p95 is None and self._samples:
+            ordered = sorted(seconds for _, seconds, _ in self._samples)
+            self._p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        return self._p95
+
+    def _error_rate(self) -> float:
+        return self._failures / len(self._samples) if self._samples else 0.0
+
+    def samples(self) -> int:
+        with self._lock:
+            self._expire()
+            return len(self._samples)
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            self._expire()
+            return self._percentile()
+
+    def error_rate(self) -> float:
+        with self._lock:
+            self._expire()
+            return self._error_rate()
+
+    def snapshot(self) -> Tuple[int, float, Optional[float]]:
+        """
+        Sample count, error rate and p95 over one and the same window, so
+        samples expiring between separate reads cannot make them disagree
+        """
+        with self._lock:
+            self._expire()
+            return len(self._samples), self._error_rate(), self._percentile()
+
+
+class Tier:
+    """
+    One model the router can send reviews to, with the largest review (in
+    estimated tokens) and the highest ambiguity it should be trusted with;
+    None means no limit. `name` defaults to the backend's model_id.
+    """
+    def __init__(self, backend: ModelBackend, max_review_tokens: Optional[int] = None,
+                 max_ambiguity: Optional[float] = None, window: int = DEFAULT_WINDOW,
+                 max_age: float = DEFAULT_MAX_AGE, name: Optional[str] = None):
+        self.backend = backend
+        self.max_review_tokens = max_review_tokens
+        self.max_ambiguity = max_ambiguity
+        self.name = name or backend.model_id
+        self.stats = TierStats(window, max_age)
+
+    def fits(self, tokens: int, ambiguity: float) -> bool:
+        return (self.max_review_tokens is None or tokens <= self.max_review_tokens) and \
+            (self.max_ambiguity is None or ambiguity <= self.max_ambiguity)
+
+
+class ModelRouter:
+    """
+    Chooses a tier per model call; see the module docstring for the policy.
+
+    `ambiguity` scores a review between 0 (clear-cut) and 1 (ambiguous)
+    locally; SentimentAnalyzer supplies one from its fast-path classifier
+    when the router has none. Without a scorer, tiers are chosen by length
+    alone. Tiers with fewer than `min_samples` recent calls count as
+    healthy.
+    """
+    def __init__(self, tiers: Sequence[Tier], latency_slo: float = DEFAULT_LATENCY_SLO,
+                 max_error_rate: float = DEFAULT_MAX_ERROR_RATE, min_samples: int = DEFAULT_MIN_SAMPLES,
+                 ambiguity: Optional[Callable[[str], float]] = None):
+        if not tiers:
+            raise ValueError("A router needs at least one tier")
+        self.tiers = list(tiers)
+        self.latency_slo = latency_slo
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.ambiguity = ambiguity
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "ModelRouter":
+        tiers = []
+        for tier in config["tiers"]:
+            spec = tier.get("backend", "gemini")
+            backend = SimulatedBackend(**tier.get("simulator", {})) if spec == "simulated" \
+                else make_backend(spec, model_name=tier["model"])
+            tiers.append(Tier(backend,
+                              max_review_tokens=tier.get("max_review_tokens"),
+                              max_ambiguity=tier.get("max_ambiguity"),
+                              window=config.get("window", DEFAULT_WINDOW),
+                              max_age=config.get("max_age", DEFAULT_MAX_AGE),
+                              name=tier["model"]))
+        return cls(tiers,
+                   latency_slo=config.get("latency_slo", DEFAULT_LATENCY_SLO),
+                   max_error_rate=config.get("max_error_rate", DEFAULT_MAX_ERROR_RATE),
+                   min_samples=config.get("min_samples", DEFAULT_MIN_SAMPLES))
+
+    @classmethod
+    def load(cls, path: str) -> "ModelRouter":
+        with open(path) as f:
+            return cls.from_config(json.load(f))
+
+    @property
+    def model_id(self) -> str:
+        return "router:" + "|".join(tier.name for tier in self.tiers)
+
+    def healthy(self, tier: Tier) -> bool:
+        samples, error_rate, p95 = tier.stats.snapshot()
+        if samples == 0 or samples < self.min_samples:
+            return True
+        return error_rate <= self.max_error_rate and p95 <= self.latency_slo
+
+    def choose(self, reviews: Sequence[str]) -> Tier:
+        """
+        The tier for one call covering `reviews` (one review, or a pack whose
+        longest and most ambiguous members decide)
+        """
+        tokens = max(estimate_tokens(review) for review in reviews)
+        ambiguity = 0.0
+        if self.ambiguity is not None and any(tier.max_ambiguity is not None for tier in self.tiers):
+            ambiguity = max(self.ambiguity(review) for review in reviews)
+        preferred = next((i for i, tier in enumerate(self.tiers) if tier.fits(tokens, ambiguity)),
+                         len(self.tiers) - 1)
+        # Fail over to stronger tiers first, then weaker ones
+        candidates = self.tiers[preferred:] + self.tiers[preferred - 1::-1] if preferred else self.tiers
+        for tier in candidates:
+            if self.healthy(tier):
+                return tier
+        # Everything is degraded: take the tier that is currently fastest
+        return min(candidates, key=lambda tier: tier.stats.p95() or 0.0)
+
+    def record(self, tier: Tier, seconds: float, failed: bool):
+        tier.stats.record(seconds, failed)
+
+    def summary(self) -> List[Dict]:
+        summary = []
+        for tier in self.tiers:
+            _, error_rate, p95 = tier.stats.snapshot()
+            summary.append({
+                "model": tier.name,
+                "calls": tier.stats.calls,
+                "p95_ms": round(1000 * p95, 1) if p95 is not None else None,
+                "error_rate": round(error_rate, 4),
+                "healthy": self.healthy(tier)
+            })
+        return summary
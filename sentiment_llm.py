@@ -1,24 +1,182 @@
-import google.generativeai as genai
 import os
-from dotenv import load_dotenv
+import re
 import json
 import time
-import pandas as pd
-from typing import Dict, List
+import asyncio
+import logging
+import numbers
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from rate_limiter import TokenBucket
+from result_cache import ResultCache, get_default_cache
+from checkpoint import Checkpoint
+from backends import BackendResponse, ModelBackend, make_backend, estimate_tokens, DEFAULT_MODEL_NAME
+from profiling import StageTimer
+from metrics import MetricsRegistry, PipelineMetrics, default_registry
+from prompt_builder import PromptBuilder, reduce_chunk_results, DEFAULT_MAX_REVIEW_TOKENS
+from resilience import (AIMDController, ResilientCaller, RETRYABLE_FALLBACKS, THROTTLED, TRANSIENT,
+                        classify_error, fallback_reason)
+
+# pandas/pyarrow (batch_io), numpy (fast_classifier, dedup), tenacity
+# (resilience) and the Gemini SDK are imported where they are first needed,
+# so a single-review caller such as the Streamlit app does not pay for them
+# at startup
+if TYPE_CHECKING:
+    import pandas as pd
+    from fast_classifier import FastClassifier
+    from hedging import Hedger
+    from live_metrics import LiveMetrics
+    from results import ResultBuffer
+    from routing import ModelRouter, Tier
+
+logger = logging.getLogger(__name__)
+
+# Defaults for the concurrent batch engine. The requests-per-minute budget
+# should be raised to match the project's Gemini quota.
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_REQUESTS_PER_MINUTE = 60
+
+# Rows read, analyzed and flushed together in streaming mode
+DEFAULT_CHUNKSIZE = 1000
+
+# The model's hard output cap, which bounds packed calls
+MAX_OUTPUT_TOKENS_LIMIT = 8192
+
+# Chunks of one long review analyzed at the same time
+DEFAULT_CHUNK_CONCURRENCY = 4
+
+# Times a batch sends a review back to the model after its retries ran out
+# on throttling or an unavailable backend
+MAX_REQUEUES = 3
+
+RESULT_KEYS = ["label", "confidence", "explanation", "evidence_phrases"]
+
+# Labels a model answer may carry (results.Label adds "Error" for failed rows)
+MODEL_LABELS = ("Positive", "Negative", "Neutral")
+RESULT_LABELS = MODEL_LABELS + ("Error",)
+
+# Fields that can be read out of a partially streamed answer
+PARTIAL_LABEL = re.compile(r'"label"\s*:\s*"(Positive|Negative|Neutral)"')
+PARTIAL_CONFIDENCE = re.compile(r'"confidence"\s*:\s*(-?[0-9.]+)\s*[,}\n]')
+PARTIAL_EXPLANATION = re.compile(r'"explanation"\s*:\s*"((?:[^"\\]|\\.)*)')
+PARTIAL_EVIDENCE = re.compile(r'"evidence_phrases"\s*:\s*\[([^\]]*)')
+JSON_STRING = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+# Bump whenever the prompt wording or few-shot examples change so cached
+# results produced by the old prompt are no longer served
+PROMPT_VERSION = "v1"
+
+# Appended to the prompt version in the cache keys of answers taken from
+# packed prompts, so they never stand in for single-review answers (or the
+# other way round)
+PACKED_PROMPT_VARIANT = "packed"
+
+class InvalidResultError(ValueError):
+    """
+    A model answer that is valid JSON but does not follow the result schema
+    """
+
+class CascadeStats:
+    """
+    Thread-safe counters for the fast-path / LLM cascade
+    """
+    def __init__(self):
+        self.fast_answered = 0
+        self.escalated = 0
+        self.llm_calls = 0
+        self.fast_seconds = 0.0
+        self.llm_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_fast(self, seconds: float, accepted: bool):
+        with self._lock:
+            self.fast_seconds += seconds
+            if accepted:
+                self.fast_answered += 1
+            else:
+                self.escalated += 1
+
+    def record_llm(self, seconds: float):
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_seconds += seconds
+
+    def summary(self) -> Dict:
+        """
+        Escalation rate and mean latency per tier
+        """
+        fast_total = self.fast_answered + self.escalated
+        return {
+            "fast_path_answered": self.fast_answered,
+            "escalated_to_llm": self.escalated,
+            "escalation_rate": self.escalated / fast_total if fast_total else 0.0,
+            "fast_path_avg_ms": 1000 * self.fast_seconds / fast_total if fast_total else 0.0,
+            "llm_calls": self.llm_calls,
+            "llm_avg_ms": 1000 * self.llm_seconds / self.llm_calls if self.llm_calls else 0.0
+        }
 
 class SentimentAnalyzer:
-    def __init__(self, model_name: str = "gemini-2.0-flash", temperature: float = 0.1):
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, temperature: float = 0.1,
+                 backend: Optional[ModelBackend] = None,
+                 cache: Optional[ResultCache] = None, use_cache: bool = True,
+                 fast_path: Optional["FastClassifier"] = None,
+                 fast_path_threshold: Optional[float] = None,
+                 metrics: Optional[MetricsRegistry] = None,
+                 max_review_tokens: int = DEFAULT_MAX_REVIEW_TOKENS,
+                 chunk_concurrency: int = DEFAULT_CHUNK_CONCURRENCY,
+                 resilience: Optional[ResilientCaller] = None,
+                 router: Optional["ModelRouter"] = None,
+                 hedger: Optional["Hedger"] = None):
         """
-        Initialize the Gemini model for sentiment analysis
+        Initialize the Gemini model for sentiment analysis.
+
+        `backend` defaults to the one named by $SENTIMENT_BACKEND (Gemini
+        unless set); pass a SimulatedBackend to run offline. Results are
+        persisted in `cache`, defaulting to the process-wide on-disk cache
+        shared with the Streamlit app; pass `use_cache=False` to disable it.
+        When a `fast_path` classifier is given, reviews it labels with at
+        least `fast_path_threshold` confidence (default
+        fast_classifier.DEFAULT_THRESHOLD) never reach the LLM. Latency,
+        token, cache and failure metrics go to `metrics`, defaulting to the
+        process-wide registry in metrics.py. Reviews longer than
+        `max_review_tokens` are split into sentence-aligned chunks, up to
+        `chunk_concurrency` of which are analyzed at once before the answers
+        are combined. Model calls go through `resilience` (see resilience.py),
+        which retries throttled and transient failures with backoff behind a
+        circuit breaker. With a `router` (see routing.py), every call
+        attempt goes to the model tier it picks for the review instead of
+        `backend`; its ambiguity score defaults to the fast-path classifier's
+        uncertainty. With a `hedger` (see hedging.py), single-review calls
+        and stream openings that run past its latency percentile are sent a
+        second time and the first valid answer is used.
         """
-        load_dotenv()
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
-        
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model_name)
+        self.router = router
+        if router is not None:
+            backend = backend or router.tiers[0].backend
+            if router.ambiguity is None and fast_path is not None:
+                router.ambiguity = lambda text: 1.0 - float(fast_path.predict_proba(text).max())
+        self.backend = backend or make_backend(model_name=model_name)
+        self.model_name = model_name
         self.temperature = temperature
+        self.cache = (cache if cache is not None else get_default_cache()) if use_cache else None
+        self.fast_path = fast_path
+        if fast_path is not None and fast_path_threshold is None:
+            from fast_classifier import DEFAULT_THRESHOLD as fast_path_threshold
+        self.fast_path_threshold = fast_path_threshold
+        self.cascade_stats = CascadeStats()
+        self.metrics = metrics or default_registry
+        self.pipeline_metrics = PipelineMetrics(self.metrics)
+        self.resilience = resilience or ResilientCaller()
+        if self.resilience.on_retry is None:
+            self.resilience.on_retry = lambda error_class: self.pipeline_metrics.retries.inc(reason=error_class)
+        self.hedger = hedger
+        if hedger is not None and hedger.on_hedge is None:
+            hedger.on_hedge = lambda winner: self.pipeline_metrics.hedged_calls.inc(winner=winner)
+        # Optional StageTimer (see profiling.py) used by the benchmarks, or a
+        # Tracer when batch_eval.py runs with --profile
+        self.stage_timer: Optional[StageTimer] = None
         
         # Few-shot examples for better performance
         self.few_shot_examples = """
@@ -36,166 +194,1038 @@ class SentimentAnalyzer:
         Sentiment: Neutral
         Evidence: "okay", "nothing special", "not bad", "decent cinematography"
         """
+        self.prompt_builder = PromptBuilder(self.few_shot_examples, max_review_tokens)
+        self.chunk_concurrency = chunk_concurrency
     
-    def analyze_sentiment(self, review_text: str) -> Dict:
+    def stage(self, name: str):
+        """
+        Context manager timing a pipeline stage when a stage timer is attached
         """
-        Analyze sentiment of a movie review using Gemini LLM
+        return self.stage_timer.stage(name) if self.stage_timer is not None else nullcontext()
+    
+    def _generate(self, prompt: str, max_output_tokens: int, kind: str = "single",
+                  reviews: Sequence[str] = ()) -> str:
+        """
+        Send a prompt about `reviews` to the backend and return the raw
+        response text. Failed attempts are retried according to
+        `self.resilience`, each routed afresh when a router is set; the
+        latency of every attempt and the token usage the backend reports are
+        recorded. Single-review calls are hedged when a hedger is set.
+        """
+        def attempt(timeout: float) -> Tuple[BackendResponse, str]:
+            backend, tier = self._route(reviews)
+            outcome = "ok"
+            start = time.perf_counter()
+            try:
+                with self.stage("model_call"):
+                    call = lambda: backend.generate(prompt, self.temperature, max_output_tokens, timeout)
+                    if self.hedger is not None and kind == "single":
+                        return self.hedger.call(call, kind, accept=lambda response: is_result_text(response.text)), \
+                            backend.model_id
+                    return call(), backend.model_id
+            except Exception as e:
+                outcome = classify_error(e)
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                self.pipeline_metrics.call_latency.observe(elapsed, backend=backend.model_id, kind=kind,
+                                                           outcome=outcome)
+                self._record_route(tier, elapsed, outcome)
+        
+        response, backend_id = self.resilience.call(attempt)
+        self._record_usage(response, kind, backend_id)
+        return response.text
+    
+    def _route(self, reviews: Sequence[str]) -> Tuple[ModelBackend, Optional["Tier"]]:
+        """
+        The backend for one call about `reviews`, and the router tier it
+        belongs to (None when not routing)
+        """
+        if self.router is None or not reviews:
+            return self.backend, None
+        tier = self.router.choose(reviews)
+        self.pipeline_metrics.routed_calls.inc(model=tier.name)
+        return tier.backend, tier
+    
+    def _record_route(self, tier: Optional["Tier"], seconds: float, outcome: str):
+        if tier is not None:
+            self.router.record(tier, seconds, failed=outcome in (THROTTLED, TRANSIENT))
+    
+    def _record_usage(self, response: BackendResponse, kind: str, backend_id: Optional[str] = None):
+        backend_id = backend_id or self.backend.model_id
+        self.pipeline_metrics.input_tokens.inc(response.input_tokens, backend=backend_id)
+        self.pipeline_metrics.output_tokens.inc(response.output_tokens, backend=backend_id)
+        self.pipeline_metrics.tokens_per_call.observe(
+            response.input_tokens + response.output_tokens, backend=backend_id, kind=kind)
+    
+    def cached_result(self, review_text: str, packed: bool = False) -> Optional[Dict]:
+        """
+        Look up a previous result for this review without calling the model,
+        among answers to packed prompts if `packed`
+        """
+        if self.cache is None or not is_valid_review(review_text):
+            return None
+        with self.stage("cache_lookup"):
+            result = self.cache.get(self._cache_key(review_text, packed))
+        if result is not None and not is_valid_result(result):
+            # Written before answers were fully validated; ask the model again
+            result = None
+        self.pipeline_metrics.cache_lookups.inc(result="miss" if result is None else "hit")
+        return result
+    
+    def _cache_key(self, review_text: str, packed: bool = False) -> str:
+        model_id = self.router.model_id if self.router is not None else self.backend.model_id
+        prompt_version = f"{PROMPT_VERSION}/{PACKED_PROMPT_VARIANT}" if packed else PROMPT_VERSION
+        return ResultCache.make_key(review_text, model_id, self.temperature, prompt_version)
+    
+    def _store(self, review_text: str, result: Dict, packed: bool = False):
+        """
+        Remember a successful model answer; fallback results are never cached
+        """
+        if self.cache is not None:
+            with self.stage("cache_store"):
+                self.cache.put(self._cache_key(review_text, packed), result)
+    
+    def fast_path_result(self, review_text: str) -> Optional[Dict]:
+        """
+        Answer locally when the fast-path classifier is confident enough
+        """
+        if self.fast_path is None or not is_valid_review(review_text):
+            return None
+        start = time.perf_counter()
+        with self.stage("fast_path"):
+            result = self.fast_path.predict(review_text)
+        accepted = result["confidence"] >= self.fast_path_threshold
+        self.cascade_stats.record_fast(time.perf_counter() - start, accepted)
+        self.pipeline_metrics.fast_path.inc(outcome="answered" if accepted else "escalated")
+        return result if accepted else None
+    
+    def local_result(self, review_text: str, packed: bool = False) -> Optional[Dict]:
+        """
+        Cached (from a packed prompt if `packed`) or fast-path answer for a
+        review, or None if the LLM is needed
+        """
+        result = self.cached_result(review_text, packed)
+        if result is None:
+            result = self.fast_path_result(review_text)
+        return result
+    
+    def analyze_sentiment(self, review_text: str, bypass_cache: bool = False) -> Dict:
+        """
+        Analyze sentiment of a movie review using Gemini LLM.
+
+        Cached results and confident fast-path answers are returned without a
+        model call. `bypass_cache` skips both and forces a model call; the
+        fresh answer still replaces any cached entry.
         """
         # Input validation
-        if not review_text or not isinstance(review_text, str) or review_text.strip() == "":
-            return {
-                "label": "Neutral",
-                "confidence": 0.0,
-                "explanation": "Invalid input: empty or non-string review",
-                "evidence_phrases": []
-            }
-        
-        prompt = f"""
-        Analyze the sentiment of this movie review and provide:
-        1. Sentiment label: Positive, Negative, or Neutral
-        2. Confidence score between 0-1
-        3. Brief explanation (1-2 sentences)
-        4. 2-3 key evidence phrases from the text that support your analysis
-        
-        {self.few_shot_examples}
-        
-        Review: "{review_text}"
-        
-        Return ONLY a valid JSON object with this exact structure:
-        {{
-            "label": "Positive|Negative|Neutral",
-            "confidence": 0.00,
-            "explanation": "short reason",
-            "evidence_phrases": ["phrase1", "phrase2"]
-        }}
+        if not is_valid_review(review_text):
+            return self.fallback_result("Invalid input: empty or non-string review", "invalid_input")
+        
+        if not bypass_cache:
+            local = self.local_result(review_text)
+            if local is not None:
+                return local
+        
+        return self._call_model(review_text)
+    
+    def analyze_sentiment_stream(self, review_text: str, bypass_cache: bool = False) -> Iterator[Dict]:
+        """
+        Streaming variant of analyze_sentiment for interactive use.
+
+        Yields partial results while the model's answer arrives, each holding
+        the fields that can already be read from it (see
+        parse_partial_result), and finally the complete result, which is
+        what analyze_sentiment would have returned. Cached, fast-path and
+        long (map-reduced) reviews yield only the final result.
+        """
+        if not is_valid_review(review_text):
+            yield self.fallback_result("Invalid input: empty or non-string review", "invalid_input")
+            return
+        if not bypass_cache:
+            local = self.local_result(review_text)
+            if local is not None:
+                yield local
+                return
+        if self.prompt_builder.needs_split(review_text):
+            yield self._call_model_chunked(review_text)
+            return
+        yield from self._stream_model(review_text)
+    
+    def _stream_model(self, review_text: str) -> Iterator[Dict]:
         """
+        _call_model over the backend's streaming API. Failures before the
+        first fragment are retried like any call; a stream that breaks off
+        later ends in a fallback result.
+        """
+        with self.stage("prompt_build"):
+            prompt = self.build_prompt(review_text)
+        max_output_tokens = self.prompt_builder.output_tokens(review_text)
+        route = [self.backend, None]  # backend and router tier of the attempt that got a first fragment
+        
+        def open_stream(backend: ModelBackend, timeout: float):
+            stream = backend.generate_stream(prompt, self.temperature, max_output_tokens, timeout)
+            return stream, next(stream, None)
+        
+        def attempt(timeout: float):
+            backend, tier = self._route([review_text])
+            start = time.perf_counter()
+            try:
+                if self.hedger is not None:
+                    # Hedge on the first fragment; a losing stream is closed
+                    stream, fragment = self.hedger.call(lambda: open_stream(backend, timeout), "stream",
+                                                        accept=lambda opened: opened[1] is not None,
+                                                        discard=lambda opened: opened[0].close())
+                else:
+                    stream, fragment = open_stream(backend, timeout)
+            except Exception as e:
+                elapsed = time.perf_counter() - start
+                outcome = classify_error(e)
+                self.pipeline_metrics.call_latency.observe(elapsed, backend=backend.model_id, kind="stream",
+                                                           outcome=outcome)
+                self._record_route(tier, elapsed, outcome)
+                raise
+            route[:] = [backend, tier]
+            return stream, fragment
         
+        result_text, usage, partial = "", None, None
+        start = time.perf_counter()
+        outcome = "ok"
         try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=self.temperature,
-                    max_output_tokens=200
-                )
-            )
-            
-            # Extract JSON from response
-            result_text = response.text.strip()
+            stream, fragment = self.resilience.call(attempt)
+            while fragment is not None:
+                result_text += fragment.text
+                if fragment.input_tokens or fragment.output_tokens:
+                    usage = fragment
+                update = parse_partial_result(result_text)
+                if update and update != partial:
+                    partial = update
+                    yield partial
+                fragment = next(stream, None)
             
-            # Clean the response
-            if result_text.startswith('```json'):
-                result_text = result_text[7:-3]  # Remove ```json and ```
-            elif result_text.startswith('```'):
-                result_text = result_text[3:-3]  # Remove ``` and ```
-            
-            result = json.loads(result_text)
+            result = json.loads(strip_code_fence(result_text))
+            if not is_valid_result(result):
+                raise InvalidResultError("Invalid response format from LLM")
+        except (json.JSONDecodeError, InvalidResultError) as e:
+            self.pipeline_metrics.parse_failures.inc(kind="stream")
+            logger.warning("JSON parsing error: %s", e, extra={"raw_response": result_text})
+            result = self.fallback_result("JSON parsing error in analysis", "parse_error")
+        except Exception as e:
+            outcome = classify_error(e)
+            logger.warning("Error analyzing sentiment: %s", e, extra={"error_type": type(e).__name__})
+            result = self.fallback_result("Error in analysis", fallback_reason(e))
+        else:
+            self._store(review_text, result)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.cascade_stats.record_llm(elapsed)
+            if result_text:
+                self.pipeline_metrics.call_latency.observe(elapsed, backend=route[0].model_id, kind="stream",
+                                                           outcome=outcome)
+                self._record_route(route[1], elapsed, outcome)
+        if usage is not None:
+            self._record_usage(usage, "stream", route[0].model_id)
+        yield result
+    
+    def build_prompt(self, review_text: str) -> str:
+        """
+        Build the single-review prompt
+        """
+        return self.prompt_builder.build(review_text)
+    
+    def model_calls_needed(self, review_text: str) -> int:
+        """
+        Number of model calls a review costs: one per chunk if it is split
+        """
+        if is_valid_review(review_text) and self.prompt_builder.needs_split(review_text):
+            return len(self.prompt_builder.split(review_text))
+        return 1
+    
+    def _call_model(self, review_text: str, store: bool = True) -> Dict:
+        """
+        Classify one review with the LLM, caching the answer if it is valid
+        (and `store` is set). Reviews over the prompt builder's token budget
+        are map-reduced.
+        """
+        if self.prompt_builder.needs_split(review_text):
+            return self._call_model_chunked(review_text)
+        
+        with self.stage("prompt_build"):
+            prompt = self.build_prompt(review_text)
+        
+        result_text = None
+        start = time.perf_counter()
+        try:
+            result_text = self._generate(prompt, max_output_tokens=self.prompt_builder.output_tokens(review_text),
+                                         reviews=[review_text])
+            with self.stage("parse"):
+                result = json.loads(strip_code_fence(result_text))
             
             # Validate the response structure
-            required_keys = ["label", "confidence", "explanation", "evidence_phrases"]
-            if not all(key in result for key in required_keys):
-                raise ValueError("Invalid response format from LLM")
-                
+            if not is_valid_result(result):
+                raise InvalidResultError("Invalid response format from LLM")
+            
+            if store:
+                self._store(review_text, result)
             return result
             
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {e}")
-            print(f"Raw response: {response.text if 'response' in locals() else 'No response'}")
-            return {
-                "label": "Neutral",
-                "confidence": 0.0,
-                "explanation": "JSON parsing error in analysis",
-                "evidence_phrases": []
-            }
+        except (json.JSONDecodeError, InvalidResultError) as e:
+            self.pipeline_metrics.parse_failures.inc(kind="single")
+            logger.warning("JSON parsing error: %s", e, extra={"raw_response": result_text})
+            return self.fallback_result("JSON parsing error in analysis", "parse_error")
         except Exception as e:
-            print(f"Error analyzing sentiment: {e}")
-            return {
-                "label": "Neutral",
-                "confidence": 0.0,
-                "explanation": "Error in analysis",
-                "evidence_phrases": []
-            }
+            logger.warning("Error analyzing sentiment: %s", e, extra={"error_type": type(e).__name__})
+            return self.fallback_result("Error in analysis", fallback_reason(e))
+        finally:
+            self.cascade_stats.record_llm(time.perf_counter() - start)
+    
+    def _call_model_chunked(self, review_text: str) -> Dict:
+        """
+        Analyze a long review as sentence-aligned chunks in parallel and
+        combine the chunk answers into one result. Only the combined result is
+        cached; a chunk is not a review of its own.
+        """
+        with self.stage("prompt_build"):
+            chunks = self.prompt_builder.split(review_text)
+        with ThreadPoolExecutor(max_workers=min(len(chunks), self.chunk_concurrency)) as executor:
+            chunk_results = list(executor.map(lambda chunk: self._call_model(chunk, store=False), chunks))
+        
+        try:
+            result = reduce_chunk_results(chunk_results,
+                                          [self.prompt_builder.count_tokens(chunk) for chunk in chunks])
+        except Exception as e:
+            # e.g. a chunk answer whose confidence is not a number
+            logger.warning("Error combining section results: %s", e, extra={"error_type": type(e).__name__})
+            return self.fallback_result("Error in analysis", fallback_reason(e))
+        if result is None:
+            return self.fallback_result("Error in analysis of every section", chunk_results[0]["fallback_reason"])
+        self._store(review_text, result)
+        return result
+    
+    def fallback_result(self, explanation: str, reason: str) -> Dict:
+        """
+        Neutral placeholder returned when no real answer could be produced.
+        `fallback_reason` tells it apart from a genuine Neutral verdict.
+        """
+        self.pipeline_metrics.fallbacks.inc(reason=reason)
+        return {
+            "label": "Neutral",
+            "confidence": 0.0,
+            "explanation": explanation,
+            "evidence_phrases": [],
+            "fallback_reason": reason
+        }
     
-    def batch_analyze(self, reviews: List[str]) -> List[Dict]:
+    def build_packed_prompt(self, reviews: List[str]) -> str:
         """
-        Analyze multiple reviews in sequence
+        Build one prompt that asks for a JSON array covering several reviews
         """
-        results = []
+        return self.prompt_builder.build_packed(reviews)
+    
+    def analyze_packed(self, reviews: List[str], fallback: bool = True,
+                       bypass_cache: bool = False) -> List[Optional[Dict]]:
+        """
+        Classify several reviews with a single model call.
+
+        Items that are missing or malformed in the model's answer are re-run
+        through `analyze_sentiment` when `fallback` is True; otherwise they are
+        returned as None so the caller can schedule the retries itself. Reviews
+        long enough to need splitting are never packed and are handled the
+        same way. Packed answers are cached apart from single-review ones
+        (see PACKED_PROMPT_VARIANT).
+        """
+        results: List[Optional[Dict]] = [None] * len(reviews)
+        valid = []
         for i, review in enumerate(reviews):
-            print(f"Analyzing review {i+1}/{len(reviews)}")
-            result = self.analyze_sentiment(review)
-            results.append(result)
-            time.sleep(1)  # Rate limiting
-            
+            if is_valid_review(review):
+                packable = not self.prompt_builder.needs_split(review)
+                if not bypass_cache:
+                    results[i] = self.local_result(review, packed=packable)
+                if results[i] is None and packable:
+                    valid.append(i)
+        
+        if len(valid) > 1:
+            packed = [reviews[i] for i in valid]
+            start = time.perf_counter()
+            try:
+                with self.stage("prompt_build"):
+                    prompt = self.build_packed_prompt(packed)
+                result_text = self._generate(
+                    prompt,
+                    max_output_tokens=min(sum(map(self.prompt_builder.output_tokens, packed)),
+                                          MAX_OUTPUT_TOKENS_LIMIT),
+                    kind="packed",
+                    reviews=packed
+                )
+                with self.stage("parse"):
+                    try:
+                        items = json.loads(strip_code_fence(result_text))
+                    except json.JSONDecodeError:
+                        self.pipeline_metrics.parse_failures.inc(kind="packed")
+                        raise
+                if not isinstance(items, list):
+                    self.pipeline_metrics.parse_failures.inc(kind="packed")
+                    raise ValueError("Packed response is not a JSON array")
+                
+                for item in items:
+                    if not isinstance(item, dict):
+                        continue
+                    index = item.get("index")
+                    if isinstance(index, int) and 0 <= index < len(packed) and is_valid_result(item):
+                        results[valid[index]] = {key: item[key] for key in RESULT_KEYS}
+                        self._store(packed[index], results[valid[index]], packed=True)
+            except Exception as e:
+                logger.warning("Packed analysis failed for %d reviews, falling back: %s", len(packed), e,
+                               extra={"pack_size": len(packed), "error_type": type(e).__name__})
+            finally:
+                self.cascade_stats.record_llm(time.perf_counter() - start)
+        
+        if fallback:
+            for i, result in enumerate(results):
+                if result is None:
+                    if is_valid_review(reviews[i]):
+                        self.pipeline_metrics.retries.inc(reason="packed_item_missing")
+                    results[i] = self.analyze_sentiment(reviews[i], bypass_cache=True)
         return results
+    
+    async def batch_analyze_async(self, reviews: List[str],
+                                  max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                                  requests_per_minute: Optional[float] = DEFAULT_REQUESTS_PER_MINUTE,
+                                  progress_callback: Optional[Callable[[int, int], None]] = None,
+                                  pack_size: int = 1,
+                                  pack_token_budget: Optional[int] = None,
+                                  dedup: bool = False,
+                                  dedup_threshold: Optional[float] = None,
+                                  adaptive_concurrency: bool = True,
+                                  limiter: Optional[TokenBucket] = None,
+                                  columnar: bool = False,
+                                  result_callback: Optional[Callable[[int, Dict], None]] = None,
+                                  locate_evidence: bool = False
+                                  ) -> Union[List[Dict], "ResultBuffer"]:
+        """
+        Analyze multiple reviews concurrently, returning results in input order.
+
+        A fixed pool of `max_concurrency` workers pulls work units off a shared
+        iterator and runs the blocking model call in a thread pool. Calls are
+        paced by a token bucket sized from `requests_per_minute` (None disables
+        pacing), or by `limiter` instead when one is shared with other
+        batches. Exceptions, and answers too malformed to store, are captured
+        per review as 'Error' results so one bad row never aborts the batch.
 
-def process_csv_file(input_csv: str, output_csv: str):
+        With `pack_size` > 1, up to that many reviews (further limited by
+        `pack_token_budget` estimated input tokens) share one prompt. Reviews
+        the packed answer misses are retried individually, each paying for its
+        own rate-limit token.
+
+        With `dedup`, exact and near-duplicate reviews (MinHash similarity of
+        at least `dedup_threshold`, default dedup.DEFAULT_THRESHOLD) are
+        collapsed first: only one representative per group is analyzed and
+        every member receives a copy of its result with `dup_group` set to
+        the representative's index.
+
+        With `adaptive_concurrency`, an AIMD controller keeps the number of
+        in-flight calls between 1 and `max_concurrency`, growing it while
+        calls succeed and halving it when the backend throttles. Reviews
+        whose retries ran out on throttling or an unavailable backend are
+        requeued up to MAX_REQUEUES times, waiting for an open circuit
+        breaker to close first (within the caller's outage budget).
+
+        With `columnar`, answers are moved into a ResultBuffer (see
+        results.py) as each work unit finishes and the buffer is returned
+        instead of a list of dicts; the CSV paths use this for large files.
+
+        `result_callback(index, result)` is called from the event loop as
+        each review's final answer lands (duplicates included), e.g. to keep
+        live aggregates with LiveMetrics.
+
+        With `locate_evidence`, every result's evidence phrases are looked up
+        in its review once the batch is done (see evidence.py) and their
+        character spans attached as `evidence_spans`, None marking phrases
+        the review does not contain.
+        """
+        if columnar:
+            from results import ResultBuffer
+        if locate_evidence:
+            results = await self.batch_analyze_async(
+                reviews,
+                max_concurrency=max_concurrency,
+                requests_per_minute=requests_per_minute,
+                progress_callback=progress_callback,
+                pack_size=pack_size,
+                pack_token_budget=pack_token_budget,
+                dedup=dedup,
+                dedup_threshold=dedup_threshold,
+                adaptive_concurrency=adaptive_concurrency,
+                limiter=limiter,
+                columnar=columnar,
+                result_callback=result_callback
+            )
+            with self.stage("evidence"):
+                return attach_evidence_spans(reviews, results)
+        if dedup:
+            from dedup import DEFAULT_THRESHOLD, collapse
+            threshold = DEFAULT_THRESHOLD if dedup_threshold is None else dedup_threshold
+            representatives, group_of = collapse(reviews, threshold=threshold)
+            position = {representative: n for n, representative in enumerate(representatives)}
+            members: Dict[int, List[int]] = {}
+            for i, group in enumerate(group_of):
+                members.setdefault(position[group], []).append(i)
+
+            def member_callback(n: int, result: Dict):
+                for i in members[n]:
+                    result_callback(i, dict(result, dup_group=group_of[i]))
+
+            unique_results = await self.batch_analyze_async(
+                [reviews[i] for i in representatives],
+                max_concurrency=max_concurrency,
+                requests_per_minute=requests_per_minute,
+                progress_callback=progress_callback,
+                pack_size=pack_size,
+                pack_token_budget=pack_token_budget,
+                adaptive_concurrency=adaptive_concurrency,
+                limiter=limiter,
+                columnar=columnar,
+                result_callback=member_callback if result_callback else None
+            )
+            if columnar:
+                expanded = unique_results.take([position[group] for group in group_of])
+                expanded.dup_group[:] = group_of
+                return expanded
+            by_representative = dict(zip(representatives, unique_results))
+            return [dict(by_representative[group], dup_group=group) for group in group_of]
+        
+        total = len(reviews)
+        results: List[Optional[Dict]] = [None] * total
+        buffer = ResultBuffer(total) if columnar else None
+        if total == 0:
+            return buffer if columnar else []
+
+        if limiter is None and requests_per_minute:
+            limiter = TokenBucket.per_minute(requests_per_minute)
+        units = plan_packs(reviews, pack_size, pack_token_budget, self.prompt_builder.max_review_tokens)
+        pending = iter(units)
+        completed = 0
+        loop = asyncio.get_running_loop()
+        controller = AIMDController(max_concurrency) if adaptive_concurrency else None
+        if controller:
+            self.resilience.listeners.append(controller)
+
+        def slot():
+            return controller.slot() if controller else nullcontext()
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            async def analyze_one(i):
+                for attempt in range(MAX_REQUEUES + 1):
+                    available = await self.resilience.wait_until_available()
+                    if limiter:
+                        # Long reviews are split and cost one rate token per chunk
+                        await limiter.acquire_async(self.model_calls_needed(reviews[i]))
+                    try:
+                        async with slot():
+                            results[i] = await loop.run_in_executor(
+                                executor, self.analyze_sentiment, reviews[i], True)
+                    except Exception as e:
+                        results[i] = error_result(e)
+                    if results[i].get("fallback_reason") not in RETRYABLE_FALLBACKS or not available \
+                            or attempt == MAX_REQUEUES:
+                        break
+                    self.pipeline_metrics.retries.inc(reason="requeued")
+
+            async def worker():
+                nonlocal completed
+                for unit in pending:
+                    # Serve cached and fast-path answers first; they cost neither a call nor a rate token
+                    for i in unit:
+                        results[i] = self.local_result(reviews[i], packed=len(unit) > 1)
+                    unit_misses = [i for i in unit if results[i] is None]
+                    
+                    if len(unit_misses) == 1:
+                        await analyze_one(unit_misses[0])
+                    elif unit_misses:
+                        await self.resilience.wait_until_available()
+                        if limiter:
+                            await limiter.acquire_async()
+                        try:
+                            async with slot():
+                                packed = await loop.run_in_executor(
+                                    executor, self.analyze_packed, [reviews[i] for i in unit_misses], False, True
+                                )
+                        except Exception:
+                            packed = [None] * len(unit_misses)
+                        for i, result in zip(unit_misses, packed):
+                            if result is None:
+                                self.pipeline_metrics.retries.inc(reason="packed_item_missing")
+                                await analyze_one(i)
+                            else:
+                                results[i] = result
+                    for i in unit:
+                        # A row the buffer cannot store fails alone rather than the whole batch
+                        if not _has_result_fields(results[i], RESULT_LABELS):
+                            results[i] = error_result(InvalidResultError(f"Malformed result: {results[i]!r}"))
+                    if result_callback:
+                        for i in unit:
+                            result_callback(i, results[i])
+                    if buffer is not None:
+                        # Only answers still in flight are held as dicts
+                        for i in unit:
+                            buffer[i] = results[i]
+                            results[i] = None
+                    completed += len(unit)
+                    if controller:
+                        self.pipeline_metrics.concurrency_limit.set(controller.concurrency)
+                    if progress_callback:
+                        progress_callback(completed, total)
+
+            try:
+                await asyncio.gather(*(worker() for _ in range(min(max_concurrency, len(units)))))
+            finally:
+                if controller:
+                    self.resilience.listeners.remove(controller)
+                    logger.info("Adaptive concurrency finished at %d (%d throttled calls)",
+                                controller.concurrency, controller.throttles,
+                                extra={"concurrency_limit": controller.concurrency,
+                                       "throttles": controller.throttles})
+
+        return buffer if columnar else results
+
+    def batch_analyze(self, reviews: List[str],
+                      max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                      requests_per_minute: Optional[float] = DEFAULT_REQUESTS_PER_MINUTE,
+                      progress_callback: Optional[Callable[[int, int], None]] = None,
+                      pack_size: int = 1,
+                      pack_token_budget: Optional[int] = None,
+                      dedup: bool = False,
+                      dedup_threshold: Optional[float] = None,
+                      adaptive_concurrency: bool = True,
+                      limiter: Optional[TokenBucket] = None,
+                      columnar: bool = False,
+                      result_callback: Optional[Callable[[int, Dict], None]] = None,
+                      locate_evidence: bool = False
+                      ) -> Union[List[Dict], "ResultBuffer"]:
+        """
+        Analyze multiple reviews concurrently (synchronous wrapper).
+        The metrics registry is flushed to its sinks when the batch is done.
+        """
+        if progress_callback is None:
+            progress_callback = ProgressLogger()
+        try:
+            return asyncio.run(self.batch_analyze_async(
+                reviews,
+                max_concurrency=max_concurrency,
+                requests_per_minute=requests_per_minute,
+                progress_callback=progress_callback,
+                pack_size=pack_size,
+                pack_token_budget=pack_token_budget,
+                dedup=dedup,
+                dedup_threshold=dedup_threshold,
+                adaptive_concurrency=adaptive_concurrency,
+                limiter=limiter,
+                columnar=columnar,
+                result_callback=result_callback,
+                locate_evidence=locate_evidence
+            ))
+        finally:
+            self.metrics.flush()
+
+def is_valid_review(review_text) -> bool:
     """
-    Process a CSV file with reviews and save results - FIXED VERSION
+    True if the review is a non-empty string worth sending to the model
     """
-    analyzer = SentimentAnalyzer()
+    return isinstance(review_text, str) and review_text.strip() != ""
+
+def is_valid_result(result) -> bool:
+    """
+    True if a parsed model answer has every field of the result schema with
+    the right type: one of the three sentiment labels, a confidence between
+    0 and 1, an explanation string and a list of evidence phrase strings
+    """
+    return _has_result_fields(result, MODEL_LABELS)
+
+def _has_result_fields(result, labels: Sequence[str]) -> bool:
+    """
+    True if `result` is a result dict with one of `labels` and well-typed
+    confidence, explanation and evidence phrases
+    """
+    if not isinstance(result, dict) or not all(key in result for key in RESULT_KEYS):
+        return False
+    confidence, phrases = result["confidence"], result["evidence_phrases"]
+    return isinstance(result["label"], str) and result["label"] in labels \
+        and isinstance(confidence, numbers.Real) and not isinstance(confidence, bool) and 0 <= confidence <= 1 \
+        and isinstance(result["explanation"], str) \
+        and isinstance(phrases, list) and all(isinstance(phrase, str) for phrase in phrases)
+
+def is_result_text(text: str) -> bool:
+    """
+    Whether a raw model answer parses into a valid result
+    """
+    try:
+        return is_valid_result(json.loads(strip_code_fence(text)))
+    except json.JSONDecodeError:
+        return False
+
+def strip_code_fence(text: str) -> str:
+    """
+    Remove a surrounding ```json ... ``` markdown fence from a model response
+    """
+    text = text.strip()
+    if text.startswith('```json'):
+        text = text[7:]
+    elif text.startswith('```'):
+        text = text[3:]
+    else:
+        return text
+    if text.rstrip().endswith('```'):
+        text = text.rstrip()[:-3]
+    return text.strip()
+
+def parse_partial_result(text: str) -> Dict:
+    """
+    Fields readable from an incomplete JSON answer: the label and confidence
+    once their values are complete, the explanation so far, and the
+    evidence phrases whose strings have closed
+    """
+    partial = {}
+    match = PARTIAL_LABEL.search(text)
+    if match:
+        partial["label"] = match.group(1)
+    match = PARTIAL_CONFIDENCE.search(text)
+    if match:
+        try:
+            partial["confidence"] = float(match.group(1))
+        except ValueError:
+            pass
+    match = PARTIAL_EXPLANATION.search(text)
+    if match:
+        # Drop a trailing half escape sequence before decoding
+        partial["explanation"] = _decode_json_string(re.sub(r'\\u?[0-9a-fA-F]{0,3}$', '', match.group(1)))
+    match = PARTIAL_EVIDENCE.search(text)
+    if match:
+        partial["evidence_phrases"] = [_decode_json_string(phrase) for phrase in JSON_STRING.findall(match.group(1))]
+    return partial
+
+def _decode_json_string(body: str) -> str:
+    try:
+        return json.loads(f'"{body}"')
+    except json.JSONDecodeError:
+        return body
+
+def plan_packs(reviews: List[str], pack_size: int = 1, token_budget: Optional[int] = None,
+               max_review_tokens: Optional[int] = None) -> List[List[int]]:
+    """
+    Group review indices into packs of at most `pack_size` reviews.
+
+    When `token_budget` is given a pack is also closed before its estimated
+    review tokens would exceed the budget. Invalid reviews, and reviews over
+    `max_review_tokens` that will be split into chunks, always travel alone.
+    """
+    if pack_size <= 1:
+        return [[i] for i in range(len(reviews))]
+    
+    packs = []
+    current, current_tokens = [], 0
+    for i, review in enumerate(reviews):
+        if not is_valid_review(review):
+            packs.append([i])
+            continue
+        tokens = estimate_tokens(review)
+        if max_review_tokens is not None and tokens > max_review_tokens:
+            packs.append([i])
+            continue
+        if current and (len(current) >= pack_size or
+                        (token_budget is not None and current_tokens + tokens > token_budget)):
+            packs.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        packs.append(current)
+    return packs
+
+def error_result(error: Exception) -> Dict:
+    """
+    Result recorded for a review whose processing raised an exception
+    """
+    return {
+        "label": "Error",
+        "confidence": 0.0,
+        "explanation": f"Error: {str(error)}",
+        "evidence_phrases": [],
+        "fallback_reason": "exception"
+    }
+
+def attach_evidence_spans(reviews: List[str], results: Union[List[Dict], "ResultBuffer"]
+                          ) -> Union[List[Dict], "ResultBuffer"]:
+    """
+    Locate each result's evidence phrases in its review and attach the spans
+    (in place for a ResultBuffer, as copies of the dicts otherwise)
+    """
+    from evidence import locate_batch
+    if isinstance(results, list):
+        spans = locate_batch(reviews, [result["evidence_phrases"] for result in results])
+        return [dict(result, evidence_spans=row_spans) for result, row_spans in zip(results, spans)]
+    results.set_evidence_spans(locate_batch(reviews, results.evidence_phrases))
+    return results
+
+def add_result_columns(df: "pd.DataFrame", results: Union[List[Dict], "ResultBuffer"],
+                       evidence_as_list: bool = False) -> "pd.DataFrame":
+    """
+    Attach analysis results (a list of dicts or a ResultBuffer) to a
+    DataFrame as the output columns. Evidence phrases are joined with ', '
+    for CSV unless `evidence_as_list` (used for Parquet output).
+    `fallback_reason` is empty for genuine answers.
+    """
+    from results import ResultBuffer
+
+    if not isinstance(results, ResultBuffer):
+        results = ResultBuffer.from_results(results)
+    return results.assign_to(df, evidence_as_list)
+
+def live_result_callback(live_metrics: Optional["LiveMetrics"],
+                         df: "pd.DataFrame") -> Optional[Callable[[int, Dict], None]]:
+    """
+    batch_analyze result callback recording each result for the rows of `df`
+    in `live_metrics`, with the row's true_sentiment when the input has one
+    """
+    if live_metrics is None:
+        return None
+    from batch_io import true_labels
+
+    truth = true_labels(df)
+    return lambda i, result: live_metrics.record(result, truth[i] if truth else None)
+
+def print_cascade_summary(analyzer: SentimentAnalyzer):
+    """
+    Report how much traffic the fast path absorbed, if one is configured
+    """
+    if analyzer.fast_path is None:
+        return
+    summary = analyzer.cascade_stats.summary()
+    print(f"Fast path answered {summary['fast_path_answered']} reviews "
+          f"({summary['escalation_rate']:.1%} escalated to the LLM); "
+          f"avg latency {summary['fast_path_avg_ms']:.2f} ms local vs {summary['llm_avg_ms']:.0f} ms LLM")
+
+def print_evidence_summary(results: "ResultBuffer"):
+    """
+    Report reviews whose evidence phrases were not all found in the text
+    """
+    if results.located:
+        print(f"{int((results.unsupported_evidence() > 0).sum())} reviews cite evidence phrases "
+              f"they do not contain")
+
+def print_routing_summary(analyzer: SentimentAnalyzer):
+    """
+    Report calls, p95 latency and error rate per model tier, if routing
+    """
+    if analyzer.router is None:
+        return
+    for tier in analyzer.router.summary():
+        p95 = f"{tier['p95_ms']:.0f} ms" if tier["p95_ms"] is not None else "n/a"
+        print(f"Routed {tier['calls']} calls to {tier['model']} (p95 {p95}, "
+              f"{tier['error_rate']:.1%} errors{'' if tier['healthy'] else ', degraded'})")
+
+class ProgressLogger:
+    """
+    Default progress callback for batch runs; logs every `fraction` of the
+    batch instead of once per review
+    """
+    def __init__(self, fraction: float = 0.05):
+        self.fraction = fraction
+        self.next_report = 0
+
+    def __call__(self, completed: int, total: int):
+        if completed >= self.next_report or completed == total:
+            logger.info("Analyzed review %d/%d", completed, total, extra={"completed": completed, "total": total})
+            self.next_report = completed + max(1, int(total * self.fraction))
+
+def process_csv_file(input_csv: str, output_csv: str,
+                     use_cache: bool = True,
+                     analyzer: Optional[SentimentAnalyzer] = None,
+                     live_metrics: Optional["LiveMetrics"] = None,
+                     **batch_options):
+    """
+    Process a CSV file with reviews and save results - FIXED VERSION.
+    The input may also be JSONL or Parquet, and a .parquet output gets typed
+    columns (see batch_io.py). Results are folded into `live_metrics` as
+    they land. Extra keyword arguments are passed to
+    SentimentAnalyzer.batch_analyze.
+    """
+    return _process_file(input_csv, output_csv, use_cache, analyzer, live_metrics, batch_options,
+                         lambda rows, results: f"Successfully processed {rows} reviews")
+
+# Alternative batch processing function with better error handling
+def process_csv_file_robust(input_csv: str, output_csv: str,
+                            use_cache: bool = True,
+                            analyzer: Optional[SentimentAnalyzer] = None,
+                            live_metrics: Optional["LiveMetrics"] = None,
+                            **batch_options):
+    """
+    More robust version with individual error handling per review.
+    Accepts the same input and output formats (and `live_metrics`) as
+    process_csv_file. For inputs too large to hold in memory use
+    process_csv_file_streaming.
+    """
+    return _process_file(input_csv, output_csv, use_cache, analyzer, live_metrics, batch_options,
+                         lambda rows, results: f"Processed {rows} reviews with {results.error_count()} errors")
+
+def _process_file(input_csv: str, output_csv: str, use_cache: bool,
+                  analyzer: Optional[SentimentAnalyzer], live_metrics: Optional["LiveMetrics"],
+                  batch_options: Dict, describe: Callable[[int, "ResultBuffer"], str]):
+    """
+    Shared body of process_csv_file and process_csv_file_robust, which only
+    differ in the summary line `describe(rows, results)` prints
+    """
+    from batch_io import PARQUET, file_format, read_reviews, review_texts, write_results
+    analyzer = analyzer or SentimentAnalyzer(use_cache=use_cache)
     
     # Read input CSV
-    df = pd.read_csv(input_csv)
+    with analyzer.stage("csv_read"):
+        df = read_reviews(input_csv)
     
-    # Analyze each review
-    results = analyzer.batch_analyze(df['review_text'].tolist())
+    # Analyze reviews concurrently; failures come back as 'Error' rows
+    results = analyzer.batch_analyze(
+        review_texts(df),
+        columnar=True,
+        result_callback=live_result_callback(live_metrics, df),
+        **batch_options
+    )
+    if live_metrics:
+        live_metrics.close()
     
-    # Create new columns for the results - FIXED APPROACH
-    df['predicted_label'] = [result['label'] for result in results]
-    df['confidence_score'] = [result['confidence'] for result in results]
-    df['explanation'] = [result['explanation'] for result in results]
-    df['evidence_phrases'] = [', '.join(result['evidence_phrases']) for result in results]
+    # Add results to dataframe
+    with analyzer.stage("result_assembly"):
+        add_result_columns(df, results, evidence_as_list=file_format(output_csv) == PARQUET)
     
     # Save results
-    df.to_csv(output_csv, index=False)
+    with analyzer.stage("csv_write"):
+        write_results(df, output_csv)
     print(f"Results saved to {output_csv}")
-    print(f"Successfully processed {len(df)} reviews")
+    print(describe(len(df), results))
+    print_evidence_summary(results)
+    print_cascade_summary(analyzer)
+    print_routing_summary(analyzer)
     
     return df
 
-# Alternative batch processing function with better error handling
-def process_csv_file_robust(input_csv: str, output_csv: str):
+def process_csv_file_streaming(input_csv: str, output_csv: str,
+                               chunksize: int = DEFAULT_CHUNKSIZE,
+                               checkpoint_path: Optional[str] = None,
+                               resume: bool = True,
+                               use_cache: bool = True,
+                               analyzer: Optional[SentimentAnalyzer] = None,
+                               live_metrics: Optional["LiveMetrics"] = None,
+                               **batch_options) -> Dict:
     """
-    More robust version with individual error handling per review
+    Streaming, resumable version of process_csv_file_robust.
+
+    The input (CSV, JSONL or Parquet) is read `chunksize` rows at a time;
+    each chunk is analyzed, appended to the output and recorded in the
+    checkpoint (default: `<output_csv>.checkpoint`) before the next one is
+    read, so memory stays bounded by the chunk size. When a checkpoint exists
+    and `resume` is True, completed rows are skipped and the output is
+    continued; otherwise the run starts from scratch. A .parquet output is
+    written as one row group per chunk; it only becomes readable when the
+    run finishes, so Parquet runs always start from scratch. Results of
+    this run (not resumed rows) are folded into `live_metrics` as they
+    land. Extra keyword arguments are passed to
+    SentimentAnalyzer.batch_analyze. Returns a summary of the run.
     """
-    analyzer = SentimentAnalyzer()
-    
-    # Read input CSV
-    df = pd.read_csv(input_csv)
-    
-    # Initialize new columns
-    df['predicted_label'] = 'Pending'
-    df['confidence_score'] = 0.0
-    df['explanation'] = ''
-    df['evidence_phrases'] = ''
+    from batch_io import ParquetResultWriter, PARQUET, file_format, iter_chunks, review_texts
+    analyzer = analyzer or SentimentAnalyzer(use_cache=use_cache)
+    if file_format(output_csv) == PARQUET:
+        checkpoint, writer = None, ParquetResultWriter(output_csv)
+    else:
+        checkpoint, writer = open_checkpoint(output_csv, checkpoint_path, resume), None
     
-    # Analyze each review individually with error handling
-    for i, review_text in enumerate(df['review_text']):
-        try:
-            print(f"Analyzing review {i+1}/{len(df)}: {review_text[:50]}...")
-            result = analyzer.analyze_sentiment(str(review_text))
+    processed, errors, skipped, unsupported = 0, 0, 0, 0
+    chunks = iter_chunks(input_csv, chunksize)
+    try:
+        while True:
+            with analyzer.stage("csv_read"):
+                next_chunk = next(chunks, None)
+            if next_chunk is None:
+                break
+            chunk_start, chunk = next_chunk
+            chunk_end = chunk_start + len(chunk)
+            if checkpoint:
+                pending = checkpoint.pending_rows(chunk_start, chunk_end)
+            else:
+                pending = list(range(chunk_start, chunk_end))
+            skipped += len(chunk) - len(pending)
+            if not pending:
+                continue
             
-            # Add results to dataframe
-            df.at[i, 'predicted_label'] = result['label']
-            df.at[i, 'confidence_score'] = result['confidence']
-            df.at[i, 'explanation'] = result['explanation']
-            df.at[i, 'evidence_phrases'] = ', '.join(result['evidence_phrases'])
+            chunk = chunk.iloc[[row_id - chunk_start for row_id in pending]].copy()
+            results = analyzer.batch_analyze(
+                review_texts(chunk),
+                columnar=True,
+                result_callback=live_result_callback(live_metrics, chunk),
+                **{"progress_callback": lambda done, total: None, **batch_options}
+            )
+            with analyzer.stage("result_assembly"):
+                add_result_columns(chunk, results, evidence_as_list=writer is not None)
+            if 'dup_group' in chunk:
+                # Duplicate groups are chunk-relative; name them by absolute row ID
+                chunk['dup_group'] = [pending[group] for group in chunk['dup_group']]
             
-            time.sleep(1)  # Rate limiting
+            if writer is not None:
+                with analyzer.stage("csv_write"):
+                    writer.write(chunk)
+            else:
+                # Append and fsync the rows before recording them as done
+                write_header = not os.path.exists(output_csv) or os.path.getsize(output_csv) == 0
+                with analyzer.stage("csv_write"), open(output_csv, "a", encoding="utf-8", newline="") as f:
+                    chunk.to_csv(f, header=write_header, index=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    output_bytes = f.tell()
+                checkpoint.record(pending[0], pending[-1] + 1, output_bytes)
             
-        except Exception as e:
-            print(f"Error processing review {i+1}: {e}")
-            df.at[i, 'predicted_label'] = 'Error'
-            df.at[i, 'confidence_score'] = 0.0
-            df.at[i, 'explanation'] = f'Error: {str(e)}'
-            df.at[i, 'evidence_phrases'] = ''
+            processed += len(chunk)
+            errors += results.error_count()
+            if results.located:
+                unsupported += int((results.unsupported_evidence() > 0).sum())
+            logger.info("Wrote rows %d-%d (%d this run, %d errors)", pending[0] + 1, pending[-1] + 1, processed,
+                        errors, extra={"processed": processed, "errors": errors})
+    finally:
+        if writer is not None:
+            writer.close()
+        if live_metrics:
+            live_metrics.close()
     
-    # Save results
-    df.to_csv(output_csv, index=False)
     print(f"Results saved to {output_csv}")
-    print(f"Processed {len(df)} reviews with {len(df[df['predicted_label'] == 'Error'])} errors")
+    print(f"Processed {processed} reviews with {errors} errors ({skipped} already done)")
+    if batch_options.get("locate_evidence"):
+        print(f"{unsupported} reviews cite evidence phrases they do not contain")
+    print_cascade_summary(analyzer)
+    print_routing_summary(analyzer)
+    return {"processed": processed, "errors": errors, "skipped": skipped}
+
+def open_checkpoint(output_csv: str, checkpoint_path: Optional[str] = None, resume: bool = True) -> Checkpoint:
+    """
+    Load the checkpoint for `output_csv` (default: `<output_csv>.checkpoint`)
+    and trim the output back to its last recorded size, or clear both when
+    not resuming or when the output no longer matches the checkpoint
+    """
+    checkpoint = Checkpoint(checkpoint_path or output_csv + ".checkpoint")
     
-    return df
+    if resume and checkpoint.exists and output_size(output_csv) < checkpoint.output_bytes:
+        print(f"Checkpoint does not match {output_csv} (missing or truncated); starting over")
+        resume = False
+    
+    if resume and checkpoint.exists:
+        checkpoint.truncate_output(output_csv)
+        print(f"Resuming: {checkpoint.completed_rows} rows already written to {output_csv}")
+    else:
+        checkpoint.reset()
+        if os.path.exists(output_csv):
+            os.remove(output_csv)
+    return checkpoint
+
+def output_size(path: str) -> int:
+    """
+    Size of a file in bytes, or -1 if it does not exist
+    """
+    return os.path.getsize(path) if os.path.exists(path) else -1
 
 if __name__ == "__main__":
     # Test the analyzer
@@ -0,0 +1,376 @@
+"""
+Headless HTTP inference service around SentimentAnalyzer.
+
+Endpoints:
+    POST /v1/analyze       {"review_text": "..."}      -> result object
+    POST /v1/analyze/bulk  {"reviews": ["...", ...]}   -> {"results": [...]}
+    GET  /healthz                                      -> queue and in-flight counts
+    GET  /metrics                                      -> Prometheus text format
+
+Usage:
+    python service.py --backend simulated --port 8080
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from backends import make_backend
+from metrics import PrometheusExporter, configure_logging
+from sentiment_llm import SentimentAnalyzer, DEFAULT_MAX_CONCURRENCY, is_valid_review
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SERVICE_PORT = 8080
+
+# Reviews gathered into one packed prompt, and how long the first one waits for company
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_BATCH_WINDOW = 0.01
+
+# Reviews waiting for a model call beyond which new work is refused with a 429
+DEFAULT_MAX_QUEUE = 1000
+
+MAX_BULK_REVIEWS = 1000
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+class ServiceOverloaded(Exception):
+    """
+    Raised when accepting more work would overflow the service's queue
+    """
+
+
+class BodyTooLarge(ValueError):
+    """
+    Raised for a request whose Content-Length exceeds MAX_BODY_BYTES
+    """
+
+
+class InferenceService:
+    """
+    Request coalescing and micro-batching in front of a SentimentAnalyzer.
+
+    Cached and fast-path answers are served straight away. Other reviews
+    join a queue, and a batcher sends them as packed prompts on
+    `max_concurrency` upstream slots. Queued reviews are spread over the
+    idle slots, so under light load every review gets its own call; only
+    while every slot is busy does the queue fill and batches grow, up to
+    `max_batch_size`, with the batcher holding the last free slot waiting
+    at most `batch_window` seconds after the first review for more.
+    A request for a review that is already queued or in flight waits for
+    that call's answer instead of making its own. Once `max_queue` reviews
+    are waiting, new work is refused with ServiceOverloaded.
+    """
+    def __init__(self, analyzer: SentimentAnalyzer,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 batch_window: float = DEFAULT_BATCH_WINDOW,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 max_queue: int = DEFAULT_MAX_QUEUE):
+        self.analyzer = analyzer
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self._busy_slots = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency + 1, thread_name_prefix="inference")
+        self._batcher: Optional[asyncio.Task] = None
+        self._dispatches = set()
+
+        registry = analyzer.metrics
+        self.requests = registry.counter(
+            "sentiment_service_requests_total", "HTTP requests handled", ("endpoint", "status"))
+        self.coalesced = registry.counter(
+            "sentiment_service_coalesced_total", "Reviews answered by another request's in-flight call")
+        self.rejected = registry.counter(
+            "sentiment_service_rejected_total", "Reviews refused because the queue was full")
+        self.batch_size = registry.histogram(
+            "sentiment_service_batch_size", "Reviews per upstream call", BATCH_SIZE_BUCKETS)
+        self.queue_depth = registry.gauge(
+            "sentiment_service_queue_depth", "Reviews waiting for an upstream slot")
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._batcher = asyncio.create_task(self._run_batcher())
+
+    async def stop(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def analyze(self, review_text: str) -> Dict:
+        return (await self.analyze_many([review_text]))[0]
+
+    async def analyze_many(self, reviews: List[str]) -> List[Dict]:
+        """
+        Analyze reviews through the shared queue, in input order. All of
+        them are admitted or, if the queue cannot take the new ones, none.
+        """
+        loop = asyncio.get_running_loop()
+        local = await loop.run_in_executor(self._executor, self._local_results, reviews)
+
+        waits: List[Optional[asyncio.Future]] = [None] * len(reviews)
+        new = {review for review, result in zip(reviews, local)
+               if result is None and review not in self._pending}
+        if self.queued + len(new) > self.max_queue:
+            self.rejected.inc(len(new))
+            raise ServiceOverloaded(f"{self.queued} reviews queued")
+
+        for i, (review, result) in enumerate(zip(reviews, local)):
+            if result is not None:
+                continue
+            future = self._pending.get(review)
+            if future is None:
+                future = loop.create_future()
+                self._pending[review] = future
+                self._queue.put_nowait((review, future))
+            elif review not in new:
+                self.coalesced.inc()
+            waits[i] = future
+        self.queue_depth.set(self.queued)
+
+        results = list(local)
+        for i, future in enumerate(waits):
+            if future is not None:
+                # Shielded so one cancelled caller does not cancel a shared call
+                results[i] = dict(await asyncio.shield(future))
+        return results
+
+    def _local_results(self, reviews: List[str]) -> List[Optional[Dict]]:
+        """
+        Answers needing no model call: fallbacks for invalid input, then
+        cached or fast-path results
+        """
+        return [self.analyzer.analyze_sentiment(review) if not is_valid_review(review)
+                else self.analyzer.local_result(review) for review in reviews]
+
+    async def _run_batcher(self):
+        while True:
+            await self._slots.acquire()
+            self._busy_slots += 1
+            batch = [await self._queue.get()]
+            # Share what is queued with the other idle slots instead of
+            # packing it into one slower call; wait for more only when no
+            # other slot is free and a backlog is already building
+            idle = self.max_concurrency - self._busy_slots
+            backlog = self._queue.qsize()
+            size = min(self.max_batch_size, -(-(1 + backlog) // (idle + 1)))
+            saturated = idle == 0 and backlog > 0
+            deadline = time.monotonic() + (self.batch_window if saturated else 0.0)
+            while len(batch) < size or saturated and len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            self.queue_depth.set(self.queued)
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]):
+        reviews = [review for review, _ in batch]
+        self.batch_size.observe(len(batch))
+        self.in_flight += len(batch)
+        try:
+            if len(reviews) == 1:
+                results = [await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self.analyzer.analyze_sentiment, reviews[0], True)]
+            else:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self.analyzer.analyze_packed, reviews, True, True)
+            for (review, future), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            logger.exception("Upstream batch of %d failed", len(batch))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            for review, _ in batch:
+                self._pending.pop(review, None)
+            self.in_flight -= len(batch)
+            self._busy_slots -= 1
+            self._slots.release()
+
+
+async def read_http_message(reader: asyncio.StreamReader) -> Optional[Tuple[str, Dict[str, str], bytes]]:
+    """
+    Read one HTTP/1.1 message: (start line, lower-cased headers, body), or
+    None at end of stream. Bodies must carry a Content-Length; a malformed
+    one raises ValueError, one over MAX_BODY_BYTES BodyTooLarge.
+    """
+    start_line = await reader.readline()
+    if not start_line:
+        return None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length < 0:
+        raise ValueError("negative Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise BodyTooLarge("body too large")
+    body = await reader.readexactly(length) if length else b""
+    return start_line.decode("latin-1").strip(), headers, body
+
+
+def http_response(status: int, payload, content_type: str = "application/json",
+                  extra_headers: Optional[Dict[str, str]] = None) -> bytes:
+    body = payload.encode("utf-8") if isinstance(payload, str) else json.dumps(payload).encode("utf-8")
+    headers = {"Content-Type": content_type, "Content-Length": str(len(body)), **(extra_headers or {})}
+    head = f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n" + \
+        "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+    return head.encode("latin-1") + b"\r\n" + body
+
+
+class HTTPFrontend:
+    """
+    Minimal keep-alive HTTP/1.1 server exposing an InferenceService
+    """
+    def __init__(self, service: InferenceService):
+        self.service = service
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    message = await read_http_message(reader)
+                except BodyTooLarge:
+                    writer.write(http_response(413, {"error": "request body too large"},
+                                               extra_headers={"Connection": "close"}))
+                    break
+                except ValueError:
+                    writer.write(http_response(400, {"error": "malformed Content-Length"},
+                                               extra_headers={"Connection": "close"}))
+                    break
+                if message is None:
+                    break
+                start_line, headers, body = message
+                method, path = (start_line.split() + ["", ""])[:2]
+                status, payload, extra = await self.route(method, path, body)
+                writer.write(http_response(status, payload,
+                                           "text/plain; version=0.0.4" if isinstance(payload, str)
+                                           else "application/json", extra))
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method: str, path: str, body: bytes):
+        endpoint = path.split("?")[0]
+        status, payload, extra = 404, {"error": f"no route for {endpoint}"}, None
+        if endpoint in ("/v1/analyze", "/v1/analyze/bulk") and method != "POST":
+            status, payload = 405, {"error": "use POST"}
+        elif endpoint == "/v1/analyze":
+            status, payload, extra = await self._analyze(body, bulk=False)
+        elif endpoint == "/v1/analyze/bulk":
+            status, payload, extra = await self._analyze(body, bulk=True)
+        elif endpoint == "/healthz":
+            status, payload = 200, {"status": "ok", "queued": self.service.queued,
+                                    "in_flight": self.service.in_flight}
+        elif endpoint == "/metrics":
+            status, payload = 200, PrometheusExporter.render(self.service.analyzer.metrics)
+        self.service.requests.inc(endpoint=endpoint if status != 404 else "unknown", status=status)
+        return status, payload, extra
+
+    async def _analyze(self, body: bytes, bulk: bool):
+        try:
+            request = json.loads(body or b"{}")
+            reviews = request["reviews"] if bulk else [request["review_text"]]
+            if not isinstance(reviews, list) or not all(isinstance(review, str) for review in reviews):
+                raise ValueError
+        except (ValueError, KeyError, TypeError):
+            field = '"reviews" (a list of strings)' if bulk else '"review_text" (a string)'
+            return 400, {"error": f"expected a JSON object with {field}"}, None
+        if len(reviews) > MAX_BULK_REVIEWS:
+            return 413, {"error": f"at most {MAX_BULK_REVIEWS} reviews per request"}, None
+        try:
+            results = await self.service.analyze_many(reviews)
+        except ServiceOverloaded as e:
+            return 429, {"error": f"service overloaded ({e}); retry later"}, {"Retry-After": "1"}
+        except Exception as e:
+            logger.exception("Analysis failed")
+            return 500, {"error": str(e)}, None
+        return 200, {"results": results} if bulk else results[0], None
+
+
+async def start_service(service: InferenceService, host: str = "127.0.0.1",
+                        port: int = DEFAULT_SERVICE_PORT) -> asyncio.AbstractServer:
+    """
+    Start the service's batcher and listen for HTTP on host:port (0 picks a free port)
+    """
+    service.start()
+    return await asyncio.start_server(HTTPFrontend(service).handle_connection, host, port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve sentiment analysis over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_SERVICE_PORT)
+    parser.add_argument("--backend", default=None,
+                        help="'gemini', 'simulated' or the URL of a served backend (default: $SENTIMENT_BACKEND or gemini)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE,
+                        help="Most reviews sent in one packed prompt (1 disables micro-batching)")
+    parser.add_argument("--batch-window-ms", type=float, default=DEFAULT_BATCH_WINDOW * 1000,
+                        help="How long a queued review waits for others to share its call")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="Maximum number of in-flight upstream calls")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE,
+                        help="Queued reviews beyond which requests get a 429")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the on-disk result cache")
+    parser.add_argument("--log-level", default="INFO")
+    parser.add_argument("--log-json", action="store_true")
+    args = parser.parse_args()
+
+    configure_logging(args.log_level, args.log_json)
+    analyzer = SentimentAnalyzer(backend=make_backend(args.backend), use_cache=not args.no_cache)
+    service = InferenceService(analyzer, max_batch_size=args.batch_size,
+                               batch_window=args.batch_window_ms / 1000,
+                               max_concurrency=args.concurrency, max_queue=args.max_queue)
+
+    async def serve():
+        server = await start_service(service, args.host, args.port)
+        logger.info("Listening on http://%s:%d", args.host, args.port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await service.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
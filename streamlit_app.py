@@ -1,9 +1,12 @@
 import streamlit as st
+import html
 import json
-from sentiment_llm import SentimentAnalyzer
+from sentiment_llm import SentimentAnalyzer, DEFAULT_MAX_CONCURRENCY
+from batch_io import CSV, PARQUET, file_format, read_reviews
+from batch_job import BatchJob, CANCELLED, FAILED
+from hedging import Hedger
+from evidence import locate, merge_spans
 import time
-import plotly.graph_objects as go
-import plotly.express as px
 
 # Page configuration
 st.set_page_config(
@@ -118,6 +121,28 @@ st.markdown("""
         box-shadow: 0 4px 8px rgba(102, 126, 234, 0.4);
     }
     
+    .evidence-chip.unsupported {
+        background: #e2e8f0;
+        color: #64748b;
+        text-decoration: line-through;
+        box-shadow: none;
+    }
+    
+    .evidence-mark {
+        background: #fde68a;
+        border-radius: 4px;
+        padding: 0 2px;
+    }
+    
+    .review-highlight {
+        background: #f8fafc;
+        border: 1px solid #e2e8f0;
+        border-radius: 12px;
+        padding: 16px 20px;
+        line-height: 1.7;
+        white-space: pre-wrap;
+    }
+    
     /* Sidebar Styles */
     .sidebar-card {
         background: #f8fafc;
@@ -252,15 +277,27 @@ st.markdown("""
 # Initialize session state
 if 'analysis_history' not in st.session_state:
     st.session_state.analysis_history = []
+if 'batch_job' not in st.session_state:
+    st.session_state.batch_job = None
+
+# Seconds between refreshes of a running batch job's progress
+BATCH_POLL_SECONDS = 1.0
 
 # Initialize analyzer
 @st.cache_resource
 def get_analyzer():
-    """Initialize and cache the sentiment analyzer"""
+    """Initialize and cache the sentiment analyzer (results go to the on-disk cache shared with batch_eval.py)"""
     return SentimentAnalyzer()
 
+@st.cache_resource
+def get_interactive_analyzer():
+    """Analyzer for single reviews: a reply slower than most recent ones is raced by a second request"""
+    return SentimentAnalyzer(hedger=Hedger())
+
 def create_confidence_chart(confidence, label):
-    """Create a beautiful confidence visualization"""
+    """Create a beautiful confidence visualization (plotly is imported on first use to keep startup fast)"""
+    import plotly.graph_objects as go
+
     colors = {
         "Positive": "#10b981",
         "Negative": "#ef4444", 
@@ -296,6 +333,23 @@ def create_confidence_chart(confidence, label):
     
     return fig
 
+# Colour and icon per sentiment
+SENTIMENT_CONFIG = {
+    "Positive": {"color": "#10b981", "icon": "✅"},
+    "Negative": {"color": "#ef4444", "icon": "❌"},
+    "Neutral": {"color": "#f59e0b", "icon": "⚪"}
+}
+
+def highlight_evidence(text, spans):
+    """Review text as HTML with the located evidence spans marked"""
+    parts, position = [], 0
+    for start, end in merge_spans(spans):
+        parts.append(html.escape(text[position:start]))
+        parts.append(f'<mark class="evidence-mark">{html.escape(text[start:end])}</mark>')
+        position = end
+    parts.append(html.escape(text[position:]))
+    return "".join(parts)
+
 def display_sentiment_result(result):
     """Display sentiment analysis results with enhanced visualization"""
     label = result["label"]
@@ -303,14 +357,7 @@ def display_sentiment_result(result):
     explanation = result["explanation"]
     evidence_phrases = result.get("evidence_phrases", [])
     
-    # Define sentiment configurations
-    sentiment_config = {
-        "Positive": {"color": "#10b981", "icon": "✅"},
-        "Negative": {"color": "#ef4444", "icon": "❌"},
-        "Neutral": {"color": "#f59e0b", "icon": "⚪"}
-    }
-    
-    config = sentiment_config.get(label, sentiment_config["Neutral"])
+    config = SENTIMENT_CONFIG.get(label, SENTIMENT_CONFIG["Neutral"])
     
     # Main results container
     with st.container():
@@ -334,7 +381,9 @@ def display_sentiment_result(result):
             st.progress(confidence)
             
             # Color-coded message based on sentiment
-            if label == "Positive":
+            if result.get("fallback_reason"):
+                st.warning(f"⚠️ No model answer ({result['fallback_reason']}); showing a placeholder result.")
+            elif label == "Positive":
                 st.success(f"✨ Strong positive sentiment detected with {confidence:.1%} confidence!")
             elif label == "Negative":
                 st.error(f"⚠️ Strong negative sentiment detected with {confidence:.1%} confidence!")
@@ -358,10 +407,15 @@ def display_sentiment_result(result):
         st.markdown("### 🔍 Key Evidence Phrases")
         st.markdown("*The following phrases were identified as strong sentiment indicators:*")
         
+        # Find each phrase in the review; phrases it does not contain are struck through
+        review_text = result.get("original_text")
+        spans = locate(review_text, evidence_phrases) if review_text else [True] * len(evidence_phrases)
+        
         # Display evidence chips
         evidence_html = "".join([
-            f'<span class="evidence-chip">📌 {phrase}</span>'
-            for phrase in evidence_phrases
+            f'<span class="evidence-chip">📌 {html.escape(phrase)}</span>' if span else
+            f'<span class="evidence-chip unsupported" title="Not found in the review">📌 {html.escape(phrase)}</span>'
+            for phrase, span in zip(evidence_phrases, spans)
         ])
         
         st.markdown(f"""
@@ -369,6 +423,14 @@ def display_sentiment_result(result):
             {evidence_html}
         </div>
         """, unsafe_allow_html=True)
+        
+        if review_text:
+            unsupported = sum(span is None for span in spans)
+            if unsupported:
+                st.caption(f"⚠️ {unsupported} of {len(spans)} evidence phrases do not appear in the review.")
+            st.markdown("#### 🖍️ Evidence in Context")
+            st.markdown(f'<div class="review-highlight">{highlight_evidence(review_text, spans)}</div>',
+                        unsafe_allow_html=True)
     
     # Metrics row
     col1, col2, col3 = st.columns(3)
@@ -402,6 +464,28 @@ def display_sentiment_result(result):
     with st.expander("📊 Raw JSON Output", expanded=False):
         st.json(result)
 
+def display_partial_result(partial):
+    """Render the fields of a result that is still streaming in"""
+    label = partial.get("label")
+    confidence = partial.get("confidence")
+    
+    if label:
+        config = SENTIMENT_CONFIG.get(label, SENTIMENT_CONFIG["Neutral"])
+        confidence_text = f" · {confidence:.1%} confidence" if confidence is not None else ""
+        st.markdown(f"## {config['icon']} {label} Sentiment{confidence_text}")
+    else:
+        st.markdown("## 🔍 Reading the review...")
+    
+    if "explanation" in partial:
+        st.markdown("### 📝 Analysis Explanation")
+        st.info(f"💡 {html.escape(partial['explanation'])}▌")
+    
+    if partial.get("evidence_phrases"):
+        evidence_html = "".join(
+            f'<span class="evidence-chip">📌 {html.escape(phrase)}</span>' for phrase in partial["evidence_phrases"]
+        )
+        st.markdown(f'<div style="margin: 20px 0;">{evidence_html}</div>', unsafe_allow_html=True)
+
 def display_analysis_history():
     """Display recent analysis history"""
     if st.session_state.analysis_history:
@@ -437,7 +521,7 @@ def main():
             <div class="sidebar-title">ℹ️ How It Works</div>
             <div class="sidebar-content">
                 <ol>
-                    <li>Enter your movie review text</li>
+                    <li>Enter your movie review text (or upload a file of reviews in the Batch Upload tab)</li>
                     <li>Click 'Analyze Sentiment'</li>
                     <li>Get comprehensive analysis with:
                         <ul>
@@ -481,6 +565,26 @@ def main():
     st.markdown('<h1 class="main-header">🎬 Movie Review Sentiment Analyzer</h1>', unsafe_allow_html=True)
     st.markdown('<p class="sub-header">Powered by Advanced AI • Get instant, detailed sentiment analysis for movie reviews</p>', unsafe_allow_html=True)
     
+    single_tab, batch_tab = st.tabs(["📝 Single Review", "📂 Batch Upload"])
+    with single_tab:
+        render_single_review()
+    with batch_tab:
+        render_batch_upload()
+    
+    # Footer
+    st.markdown("---")
+    st.markdown("""
+    <div class="footer">
+        <div style="margin-bottom: 16px;">
+            <strong>🎬 Movie Review Sentiment Analyzer</strong>
+        </div>
+        <p>Built with ❤️ using Streamlit and Google Gemini AI</p>
+        
+    </div>
+    """, unsafe_allow_html=True)
+
+def render_single_review():
+    """Review input, analysis and result display for a single review"""
     # Input section
     st.markdown("### 📝 Enter Your Movie Review")
     
@@ -536,57 +640,155 @@ def main():
     
     # Analysis logic
     if analyze_clicked and review_text.strip():
-        with st.spinner("🔍 Analyzing your review... This may take a few seconds"):
-            try:
-                analyzer = get_analyzer()
-                
-                # Add original text to result for metrics
-                result = analyzer.analyze_sentiment(review_text)
-                result["original_text"] = review_text
-                
-                # Store in history
-                st.session_state.analysis_history.append({
-                    'text': review_text,
-                    'result': result,
-                    'timestamp': time.time()
-                })
-                
-                # Add a small delay for better UX
-                time.sleep(0.5)
-                
-                # Display results
-                st.markdown("---")
-                st.markdown("## 📊 Analysis Results")
-                display_sentiment_result(result)
-                
-                # Success message
-                st.success("✅ Analysis completed successfully!")
-                
-            except Exception as e:
-                st.error(f"❌ Error analyzing sentiment: {str(e)}")
-                st.info("💡 Please try again or check your API configuration. If the problem persists, try with a different review text.")
-                
-                # Show error details in expander
-                with st.expander("🔧 Error Details", expanded=False):
-                    st.code(str(e))
+        st.markdown("---")
+        st.markdown("## 📊 Analysis Results")
+        live = st.empty()
+        with live.container():
+            st.info("🔍 Analyzing your review...")
+        try:
+            analyzer = get_interactive_analyzer()
+            
+            # Show fields as soon as the model has produced them; the last update is the final result
+            for result in analyzer.analyze_sentiment_stream(review_text):
+                with live.container():
+                    display_partial_result(result)
+            live.empty()
+            
+            # Add original text to result for metrics
+            result = dict(result, original_text=review_text)
+            
+            # Store in history
+            st.session_state.analysis_history.append({
+                'text': review_text,
+                'result': result,
+                'timestamp': time.time()
+            })
+            
+            # Display results
+            display_sentiment_result(result)
+            
+            # Success message
+            st.success("✅ Analysis completed successfully!")
+            
+        except Exception as e:
+            live.empty()
+            st.error(f"❌ Error analyzing sentiment: {str(e)}")
+            st.info("💡 Please try again or check your API configuration. If the problem persists, try with a different review text.")
+            
+            # Show error details in expander
+            with st.expander("🔧 Error Details", expanded=False):
+                st.code(str(e))
     
     elif not review_text.strip() and analyze_clicked:
         st.warning("⚠️ Please enter a movie review to analyze")
     
     elif char_count < 10 and char_count > 0:
         st.warning("⚠️ Please enter a longer review (at least 10 characters)")
+
+def render_batch_upload():
+    """Upload a file of reviews and analyze it on a background worker"""
+    st.markdown("### 📂 Analyze a File of Reviews")
+    
+    uploaded = st.file_uploader(
+        "Upload reviews",
+        type=["csv", "jsonl", "parquet"],
+        help="A CSV, JSONL or Parquet file with a review_text column. Other columns are kept in the results."
+    )
+    concurrency = st.slider("Concurrent model calls", min_value=1, max_value=32, value=DEFAULT_MAX_CONCURRENCY)
     
-    # Footer
-    st.markdown("---")
-    st.markdown("""
-    <div class="footer">
-        <div style="margin-bottom: 16px;">
-            <strong>🎬 Movie Review Sentiment Analyzer</strong>
-        </div>
-        <p>Built with ❤️ using Streamlit and Google Gemini AI</p>
-        
-    </div>
-    """, unsafe_allow_html=True)
+    job = st.session_state.batch_job
+    running = job is not None and not job.finished
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        start_clicked = st.button(
+            "🚀 Start Batch Analysis",
+            type="primary",
+            use_container_width=True,
+            disabled=uploaded is None or running
+        )
+    with col2:
+        if st.button("⏹️ Stop", use_container_width=True, disabled=not running):
+            job.cancel()
+    
+    if start_clicked and uploaded is not None:
+        try:
+            df = read_reviews(uploaded, file_format(uploaded.name))
+        except ValueError as e:
+            st.error(f"❌ Could not read {uploaded.name}: {e}")
+            return
+        if 'review_text' not in df.columns:
+            st.error("❌ The file needs a review_text column")
+            return
+        job = BatchJob(get_analyzer(), df, max_concurrency=concurrency).start()
+        st.session_state.batch_job = job
+        running = True
+    
+    if job is None:
+        st.info("💡 Upload a file to analyze many reviews at once")
+    elif running:
+        display_batch_progress()
+    else:
+        display_batch_results(job)
+
+def display_batch_summary(job):
+    """Progress bar, counters and the table of rows finished so far"""
+    done = job.progress()
+    st.progress(done / job.total if job.total else 1.0, text=f"{done}/{job.total} reviews analyzed")
+    
+    results = job.frame()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Analyzed", done)
+    with col2:
+        st.metric("Errors", int((results['predicted_label'] == 'Error').sum()))
+    with col3:
+        elapsed = job.elapsed()
+        st.metric("Reviews / second", f"{done / elapsed:.1f}" if elapsed > 0 else "-")
+    
+    st.dataframe(
+        results[['review_text', 'predicted_label', 'confidence_score', 'explanation']],
+        use_container_width=True,
+        hide_index=True
+    )
+
+@st.fragment(run_every=BATCH_POLL_SECONDS)
+def display_batch_progress():
+    """Redraws itself every BATCH_POLL_SECONDS while the job runs; other widgets stay usable"""
+    job = st.session_state.batch_job
+    if job.finished:
+        # Leave polling mode and draw the final results with the full page
+        st.rerun()
+    display_batch_summary(job)
+
+def display_batch_results(job):
+    """Final summary and downloads for a finished, stopped or failed job"""
+    if job.state == FAILED:
+        st.error(f"❌ Batch analysis failed: {job.error}")
+    elif job.state == CANCELLED:
+        st.warning(f"⏹️ Stopped after {job.progress()} of {job.total} reviews")
+    else:
+        st.success(f"✅ Analyzed {job.total} reviews in {job.elapsed():.1f}s")
+    
+    display_batch_summary(job)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            "⬇️ Download CSV",
+            data=job.export(CSV),
+            file_name="sentiment_results.csv",
+            mime="text/csv",
+            use_container_width=True
+        )
+    with col2:
+        st.download_button(
+            "⬇️ Download Parquet",
+            data=job.export(PARQUET),
+            file_name="sentiment_results.parquet",
+            mime="application/octet-stream",
+            use_container_width=True
+        )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
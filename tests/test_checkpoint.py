@@ -0,0 +1,88 @@
+import json
+import logging
+
+import pandas as pd
+
+from backends import SimulatedBackend
+from checkpoint import Checkpoint, checkpointed_rows
+from metrics import MetricsRegistry
+from sentiment_llm import SentimentAnalyzer, open_checkpoint, process_csv_file_streaming
+
+
+def make_analyzer():
+    return SentimentAnalyzer(backend=SimulatedBackend(latency="constant", latency_ms=0, seed=1), use_cache=False,
+                             metrics=MetricsRegistry())
+
+
+def test_ranges_survive_reload_and_merge(tmp_path):
+    path = str(tmp_path / "out.csv.checkpoint")
+    checkpoint = Checkpoint(path)
+    checkpoint.record(0, 10, 100)
+    checkpoint.record(10, 20, 200)
+    checkpoint.record(30, 40, 300)
+
+    reloaded = Checkpoint(path)
+    assert reloaded.ranges == [(0, 20), (30, 40)]
+    assert reloaded.output_bytes == 300
+    assert reloaded.completed_rows == 30
+    assert reloaded.pending_rows(15, 35) == list(range(20, 30))
+
+
+def test_torn_last_line_is_dropped(tmp_path):
+    path = tmp_path / "out.csv.checkpoint"
+    path.write_text(json.dumps({"start": 0, "end": 5, "output_bytes": 50}) + "\n" + '{"start": 5, "en')
+
+    # Watching a checkpoint never repairs it
+    assert checkpointed_rows(str(path)) == 5
+    assert path.read_text().endswith('"en')
+
+    checkpoint = Checkpoint(str(path))
+    assert checkpoint.ranges == [(0, 5)]
+    checkpoint.record(5, 8, 80)
+    assert [json.loads(line)["end"] for line in path.read_text().splitlines()] == [5, 8]
+
+
+def test_open_checkpoint_truncates_rows_written_after_the_last_record(tmp_path):
+    output = tmp_path / "out.csv"
+    output.write_bytes(b"header\nrow1\nrow2\npartial")
+    Checkpoint(str(output) + ".checkpoint").record(0, 2, len(b"header\nrow1\nrow2\n"))
+
+    checkpoint = open_checkpoint(str(output))
+    assert checkpoint.completed_rows == 2
+    assert output.read_bytes() == b"header\nrow1\nrow2\n"
+
+
+def test_open_checkpoint_starts_over_when_output_is_shorter(tmp_path):
+    output = tmp_path / "out.csv"
+    output.write_bytes(b"header\n")
+    Checkpoint(str(output) + ".checkpoint").record(0, 2, 100)
+
+    checkpoint = open_checkpoint(str(output))
+    assert not checkpoint.exists
+    assert not output.exists()
+
+
+def test_interrupted_run_resumes_to_the_same_output(tmp_path):
+    logging.disable(logging.CRITICAL)
+    try:
+        source = tmp_path / "in.csv"
+        pd.DataFrame({"review_text": [f"review number {i} was {'great' if i % 2 else 'awful'}"
+                                      for i in range(23)]}).to_csv(source, index=False)
+        complete, resumed = tmp_path / "complete.csv", tmp_path / "resumed.csv"
+        options = dict(chunksize=5, requests_per_minute=None)
+        process_csv_file_streaming(str(source), str(complete), analyzer=make_analyzer(), **options)
+        process_csv_file_streaming(str(source), str(resumed), analyzer=make_analyzer(), **options)
+
+        # Keep two chunks, and leave half a chunk written past the checkpoint as a crash would
+        checkpoint_path = tmp_path / "resumed.csv.checkpoint"
+        records = checkpoint_path.read_text().splitlines()[:2]
+        checkpoint_path.write_text("\n".join(records) + "\n")
+        with open(resumed, "r+b") as f:
+            f.truncate(json.loads(records[-1])["output_bytes"] + 40)
+
+        summary = process_csv_file_streaming(str(source), str(resumed), analyzer=make_analyzer(), **options)
+        assert summary["skipped"] == 10
+        assert resumed.read_bytes() == complete.read_bytes()
+        assert checkpointed_rows(str(checkpoint_path)) == 23
+    finally:
+        logging.disable(logging.NOTSET)
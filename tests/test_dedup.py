@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from dedup import collapse, find_duplicate_groups, normalize_for_dedup
+
+BASE = ("The cinematography was stunning and the lead actor carried every scene, although the second act "
+        "dragged a little before a genuinely moving finale that left the whole audience in tears.")
+
+
+def test_normalization_ignores_case_punctuation_and_spacing():
+    assert normalize_for_dedup("  Great   MOVIE!!! ") == normalize_for_dedup("great movie")
+
+
+def test_exact_and_near_duplicates_share_the_first_occurrence():
+    texts = [
+        BASE,
+        "A completely different review about a dull comedy with no laughs at all.",
+        BASE.upper(),
+        BASE.replace("genuinely", "truly"),
+        "Short and sweet: loved it.",
+    ]
+    assert find_duplicate_groups(texts) == [0, 1, 0, 0, 4]
+
+
+def test_dissimilar_reviews_stay_apart():
+    rng = random.Random(0)
+    texts = [" ".join(f"word{rng.randrange(1000)}" for _ in range(30)) for _ in range(50)]
+    assert find_duplicate_groups(texts) == list(range(50))
+
+
+def test_groups_are_transitive():
+    # Each edit is close to its neighbour; all end up with the first text's group
+    words = BASE.split()
+    chain = [" ".join(words[:len(words) - k] + ["extra"] * k) for k in range(3)]
+    groups = find_duplicate_groups(chain, threshold=0.7)
+    assert len(set(groups)) == 1 and groups[0] == 0
+
+
+def test_collapse_returns_representatives_in_input_order():
+    representatives, group_of = collapse(["b review", BASE, "b review", BASE + " ", "c review"])
+    assert representatives == [0, 1, 4]
+    assert group_of == [0, 1, 0, 1, 4]
+
+
+def test_bands_must_divide_permutations():
+    with pytest.raises(ValueError):
+        find_duplicate_groups(["a", "b"], num_perm=64, bands=10)
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from evaluation import Evaluator, confusion_scores
+
+
+def test_perfect_classifier_has_tight_bootstrap_intervals():
+    # Few rows per class, so many replicates drop a class entirely
+    labels = ["Positive"] * 3 + ["Negative"] * 3 + ["Neutral"] * 2
+    evaluator = Evaluator()
+    evaluator.update(labels, labels, [0.9] * len(labels))
+    intervals = evaluator.bootstrap_intervals(2000, seed=0)
+
+    assert intervals["accuracy"] == [1.0, 1.0]
+    assert intervals["macro_f1"] == [1.0, 1.0]
+    for scores in intervals["classes"].values():
+        for bounds in scores.values():
+            assert bounds == [1.0, 1.0]
+
+
+def test_undefined_ratios():
+    # Neutral is never predicted and Negative never occurs
+    confusion = np.array([[2, 0, 0, 1],
+                          [0, 0, 0, 0],
+                          [1, 0, 0, 0]])
+    zeros = confusion_scores(confusion)
+    assert zeros["precision"][2] == 0.0
+    assert zeros["f1"][1] == 0.0
+
+    scores = confusion_scores(confusion, undefined=np.nan)
+    assert np.isnan(scores["precision"][2])
+    assert np.isnan(scores["recall"][1])
+    assert np.isnan(scores["f1"][1])
+    # Defined ratios and the averages are the same either way
+    assert scores["f1"][2] == 0.0
+    assert scores["precision"][0] == pytest.approx(2 / 3)
+    assert scores["macro_f1"] == zeros["macro_f1"]
+
+
+def test_class_never_seen_has_no_interval():
+    evaluator = Evaluator()
+    evaluator.update(["Positive", "Negative"] * 5, ["Positive", "Negative"] * 5, [0.8] * 10)
+    assert evaluator.bootstrap_intervals(200, seed=1)["classes"]["Neutral"]["f1"] == [None, None]
@@ -0,0 +1,81 @@
+import random
+
+from evidence import PhraseAutomaton, format_spans, locate, locate_batch, merge_spans, tokenize
+
+
+def occurrences(patterns, tokens):
+    """
+    Every (pattern id, end) found by comparing each pattern at each position
+    """
+    return sorted((pattern, end) for pattern, tokens_ in enumerate(patterns)
+                  for end in range(len(tokens_), len(tokens) + 1)
+                  if tuple(tokens[end - len(tokens_):end]) == tokens_)
+
+
+def test_tokenize_gives_lowercase_words_and_their_offsets():
+    text = "Don't MISS it -- truly great!"
+    tokens, spans = tokenize(text)
+    assert tokens == ["don't", "miss", "it", "truly", "great"]
+    assert [text[start:end].lower() for start, end in spans] == tokens
+
+
+def test_tokenize_keeps_offsets_when_lowercasing_changes_length():
+    # 'İ' lowercases to two characters
+    text = "İstanbul was GREAT"
+    tokens, spans = tokenize(text)
+    assert tokens[1:] == ["was", "great"]
+    assert [text[start:end] for start, end in spans] == ["İstanbul", "was", "GREAT"]
+
+
+def test_automaton_finds_overlapping_and_nested_patterns():
+    patterns = [("a", "b", "c"), ("b",), ("b", "c", "d"), ("c",), ("a", "b", "c")]
+    automaton = PhraseAutomaton()
+    ids = [automaton.add(pattern) for pattern in patterns]
+    automaton.build()
+    assert ids == [0, 1, 2, 3, 0]
+    assert automaton.lengths == [3, 1, 3, 1]
+    assert sorted(automaton.scan("x a b c d b".split())) == [(0, 4), (1, 3), (1, 6), (2, 5), (3, 4)]
+
+
+def test_automaton_matches_brute_force():
+    rng = random.Random(0)
+    for _ in range(50):
+        patterns = list({tuple(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(6)})
+        tokens = [rng.choice("abc") for _ in range(30)]
+        automaton = PhraseAutomaton()
+        for pattern in patterns:
+            automaton.add(pattern)
+        automaton.build()
+        assert sorted(automaton.scan(tokens)) == occurrences(patterns, tokens)
+
+
+def test_locate_ignores_case_spacing_and_punctuation():
+    text = "The plot was weak, but the acting... truly SUPERB!"
+    spans = locate(text, ["plot was weak", "Truly  superb", "weak but"])
+    assert [text[start:end] for start, end in spans] == ["plot was weak", "truly SUPERB", "weak, but"]
+
+
+def test_locate_falls_back_to_fuzzy_matching():
+    text = "An unforgettable performance from the lead."
+    (span,) = locate(text, ["unforgetable performance"])
+    assert text[span[0]:span[1]] == "unforgettable performance"
+    assert locate(text, ["unforgetable performance"], fuzzy_threshold=None) == (None,)
+
+
+def test_made_up_and_empty_phrases_are_not_located():
+    assert locate("A dull, lifeless film.", ["breathtaking visuals", "", "!!"]) == (None, None, None)
+
+
+def test_locate_batch_is_the_same_across_blocks():
+    texts = ["great film", "terrible plot, great cast", "nothing to see", ""]
+    phrases = [["great film"], ["great cast", "terrible"], None, ["missing"]]
+    expected = [locate(text, row or []) for text, row in zip(texts, phrases)]
+    assert locate_batch(texts, phrases, block_rows=3) == expected
+    assert expected == [((0, 10),), ((15, 25), (0, 8)), (), (None,)]
+
+
+def test_format_and_merge_spans():
+    spans = [(10, 15), None, (0, 4), (3, 8), (15, 20)]
+    assert format_spans(spans) == "10:15, -, 0:4, 3:8, 15:20"
+    assert format_spans(None) == ""
+    assert merge_spans(spans) == [(0, 8), (10, 20)]
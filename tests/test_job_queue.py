@@ -0,0 +1,74 @@
+import pytest
+
+import job_queue
+from job_queue import CANCELLED, DONE, PENDING, RUNNING, JobDaemon, JobQueue
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+
+def submit(queue: JobQueue) -> int:
+    return queue.submit("in.csv", "out.csv", total_rows=10)
+
+
+def test_only_one_worker_claims_a_pending_job(path):
+    first, second = JobQueue(path), JobQueue(path)
+    job_id = submit(first)
+    assert first.claim(job_id, "a")
+    assert not second.claim(job_id, "b")
+    job = second.get(job_id)
+    assert job["state"] == RUNNING and job["worker"] == "a"
+
+
+def test_cancelled_job_cannot_be_claimed(path):
+    queue = JobQueue(path)
+    job_id = submit(queue)
+    queue.cancel(job_id)
+    assert not queue.claim(job_id, "a")
+    assert queue.get(job_id)["state"] == CANCELLED
+
+
+def test_only_jobs_with_an_expired_lease_are_requeued(path, monkeypatch):
+    queue = JobQueue(path)
+    live, dead = submit(queue), submit(queue)
+    now = 1000.0
+    monkeypatch.setattr(job_queue.time, "time", lambda: now)
+    queue.claim(live, "a")
+    queue.claim(dead, "b")
+    now = 1020.0
+    assert queue.progress(live, 3, 0, 1.0, worker="a")
+    now = 1040.0
+    assert queue.requeue_interrupted(lease_seconds=30) == 1
+    assert queue.get(live)["state"] == RUNNING
+    job = queue.get(dead)
+    assert job["state"] == PENDING and job["worker"] is None
+
+
+def test_worker_that_lost_its_job_cannot_update_it(path):
+    queue = JobQueue(path)
+    job_id = submit(queue)
+    queue.claim(job_id, "a")
+    queue.finish(job_id, PENDING, worker="a")
+    assert queue.claim(job_id, "b")
+    assert not queue.progress(job_id, 5, 0, 1.0, worker="a")
+    queue.finish(job_id, DONE, worker="a")
+    job = queue.get(job_id)
+    assert job["state"] == RUNNING and job["worker"] == "b" and job["completed_rows"] == 0
+
+
+def test_starting_a_second_daemon_leaves_live_jobs_running(path):
+    queue = JobQueue(path)
+    job_id = submit(queue)
+    assert queue.claim(job_id, "a")
+    daemon = JobDaemon(JobQueue(path), poll_interval=0.1)
+    daemon.poll()
+    daemon.shutdown()
+    assert not daemon.running
+    assert queue.get(job_id)["state"] == RUNNING
+
+
+def test_lease_must_outlast_the_poll_interval(path):
+    with pytest.raises(ValueError):
+        JobDaemon(JobQueue(path), poll_interval=5, lease=5)
@@ -0,0 +1,50 @@
+import json
+
+from live_metrics import LiveMetrics
+
+
+def result(label="Positive", confidence=0.9, **extra):
+    return dict(label=label, confidence=confidence, explanation="", evidence_phrases=[], **extra)
+
+
+def test_running_aggregates():
+    live = LiveMetrics(bins=4)
+    live.record(result(confidence=0.9), "Positive")
+    live.record(result("Negative", 0.3), "Positive")
+    live.record(result("Error", 0.0, fallback_reason="exception"))
+    snapshot = live.snapshot()
+    assert snapshot["rows"] == 3
+    assert snapshot["labels"] == {"Positive": 1, "Negative": 1, "Error": 1}
+    assert snapshot["error_rate"] == 1 / 3
+    assert snapshot["fallback_reasons"] == {"exception": 1}
+    assert snapshot["confidence_histogram"]["counts"] == [1, 1, 0, 1]
+    assert snapshot["accuracy"] == 0.5
+    assert snapshot["confusion_matrix"] == {"Positive": {"Positive": 1, "Negative": 1}}
+
+
+def test_malformed_results_are_counted_without_raising():
+    live = LiveMetrics(bins=4)
+    for confidence in ("high", None, float("nan"), float("inf"), [0.5]):
+        live.record(result(confidence=confidence))
+    live.record({"explanation": "no label or confidence"})
+    snapshot = live.snapshot()
+    assert snapshot["rows"] == 6
+    assert snapshot["mean_confidence"] == 0.0
+    assert snapshot["confidence_histogram"]["counts"] == [6, 0, 0, 0]
+
+
+def test_merge_and_publish(tmp_path):
+    path = tmp_path / "live.json"
+    live, shard = LiveMetrics(str(path), interval=3600), LiveMetrics()
+    live.record(result())
+    shard.record(result("Negative", 0.5))
+    live.merge(shard)
+    live.close()
+    assert json.loads(path.read_text())["labels"] == {"Positive": 1, "Negative": 1}
+
+
+def test_unwritable_sidecar_does_not_raise(tmp_path):
+    live = LiveMetrics(str(tmp_path / "missing" / "live.json"))
+    live.record(result())
+    live.close()
+    assert live.snapshot()["rows"] == 1
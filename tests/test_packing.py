@@ -0,0 +1,89 @@
+import json
+
+from backends import SimulatedBackend
+from metrics import MetricsRegistry
+from result_cache import ResultCache
+from sentiment_llm import SentimentAnalyzer, plan_packs
+
+
+def answer(index, label="Positive", **overrides):
+    item = {"index": index, "label": label, "confidence": 0.9, "explanation": "ok", "evidence_phrases": ["good"]}
+    item.update(overrides)
+    return item
+
+
+def packed_analyzer(response: str, max_review_tokens: int = 1024) -> SentimentAnalyzer:
+    analyzer = SentimentAnalyzer(backend=SimulatedBackend(), use_cache=False, metrics=MetricsRegistry(),
+                                 max_review_tokens=max_review_tokens)
+    analyzer.prompts = []
+
+    def generate(prompt, **kwargs):
+        analyzer.prompts.append(prompt)
+        return response
+    analyzer._generate = generate
+    return analyzer
+
+
+def test_plan_packs_respects_size():
+    assert plan_packs(["a review"] * 5, pack_size=1) == [[0], [1], [2], [3], [4]]
+    assert plan_packs(["a review"] * 5, pack_size=2) == [[0, 1], [2, 3], [4]]
+
+
+def test_plan_packs_closes_a_pack_at_the_token_budget():
+    reviews = ["x" * 40, "x" * 40, "x" * 40, "x" * 4]  # 11, 11, 11 and 2 estimated tokens
+    assert plan_packs(reviews, pack_size=10, token_budget=25) == [[0, 1], [2, 3]]
+    # A review over the budget on its own still gets a pack
+    assert plan_packs(["x" * 400, "short"], pack_size=10, token_budget=25) == [[0], [1]]
+
+
+def test_plan_packs_sends_invalid_and_long_reviews_alone():
+    reviews = ["fine", "", "also fine", "x" * 400, "last one"]
+    assert plan_packs(reviews, pack_size=4, max_review_tokens=50) == [[1], [3], [0, 2, 4]]
+
+
+def test_packed_answer_is_matched_by_index():
+    response = "```json\n" + json.dumps([answer(1, "Negative"), answer(0)]) + "\n```"
+    analyzer = packed_analyzer(response)
+    results = analyzer.analyze_packed(["loved it", "hated it"], fallback=False)
+    assert [result["label"] for result in results] == ["Positive", "Negative"]
+    assert "index" not in results[0]
+    assert len(analyzer.prompts) == 1
+
+
+def test_missing_and_malformed_items_are_left_for_retry():
+    response = json.dumps([
+        answer(0),
+        answer(1, label="Mixed"),         # not a sentiment label
+        {"index": 2, "label": "Positive"},  # fields missing
+        answer(3, confidence="high"),     # wrongly typed
+        answer(7),                        # out of range
+        "not an object",
+    ])
+    results = packed_analyzer(response).analyze_packed(["one", "two", "three", "four"], fallback=False)
+    assert results[0]["label"] == "Positive"
+    assert results[1:] == [None, None, None]
+
+
+def test_unparseable_answer_leaves_every_item_for_retry():
+    for response in ("not json", json.dumps({"index": 0})):
+        assert packed_analyzer(response).analyze_packed(["one", "two"], fallback=False) == [None, None]
+
+
+def test_long_and_empty_reviews_are_never_packed():
+    analyzer = packed_analyzer(json.dumps([answer(0), answer(1)]), max_review_tokens=20)
+    results = analyzer.analyze_packed(["short one", "", "word " * 100, "short two"], fallback=False)
+    assert results[0] is not None and results[3] is not None
+    assert results[1] is None and results[2] is None
+    assert "word word" not in analyzer.prompts[0]
+
+
+def test_packed_answers_are_cached_apart_from_single_ones(tmp_path):
+    analyzer = packed_analyzer(json.dumps([answer(0), answer(1, "Negative")]))
+    analyzer.cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    analyzer.analyze_packed(["loved it", "hated it"], fallback=False)
+    assert analyzer.cached_result("hated it") is None
+    assert analyzer.cached_result("hated it", packed=True)["label"] == "Negative"
+    # A repeated packed call is served from the cache
+    assert [result["label"] for result in analyzer.analyze_packed(["loved it", "hated it"], fallback=False)] \
+        == ["Positive", "Negative"]
+    assert len(analyzer.prompts) == 1
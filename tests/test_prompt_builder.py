@@ -0,0 +1,103 @@
+import json
+
+from backends import SimulatedBackend
+from metrics import MetricsRegistry
+from prompt_builder import MAX_EVIDENCE_PHRASES, PromptBuilder, reduce_chunk_results
+from result_cache import ResultCache
+from sentiment_llm import SentimentAnalyzer
+
+
+def answer(label="Positive", confidence=0.9, evidence=("good",), **overrides):
+    return dict({"label": label, "confidence": confidence, "explanation": f"{label} part",
+                 "evidence_phrases": list(evidence)}, **overrides)
+
+
+def chunked_analyzer(answer_for, max_review_tokens: int = 20) -> SentimentAnalyzer:
+    """
+    An analyzer whose model answers each chunk with `answer_for(chunk)`
+    """
+    analyzer = SentimentAnalyzer(backend=SimulatedBackend(), use_cache=False, metrics=MetricsRegistry(),
+                                 max_review_tokens=max_review_tokens)
+    analyzer.chunks = []
+
+    def generate(prompt, reviews, **kwargs):
+        analyzer.chunks.append(reviews[0])
+        return json.dumps(answer_for(reviews[0]))
+    analyzer._generate = generate
+    return analyzer
+
+
+def test_split_keeps_chunks_within_budget_and_sentences_whole():
+    builder = PromptBuilder("", max_review_tokens=20)
+    sentences = [f"Sentence number {i} is about the film." for i in range(10)]
+    review = " ".join(sentences)
+    assert builder.needs_split(review)
+    chunks = builder.split(review)
+    assert len(chunks) > 1
+    assert all(builder.count_tokens(chunk) <= 20 for chunk in chunks)
+    assert " ".join(chunks) == review
+    assert all(chunk.endswith(".") for chunk in chunks)
+
+
+def test_split_sizes_chunks_evenly():
+    builder = PromptBuilder("", max_review_tokens=20)
+    # Nine 5-token sentences: greedy filling would leave a one-sentence tail
+    sentence = "x" * 15 + "."
+    chunks = builder.split(" ".join([sentence] * 9))
+    assert [chunk.count(".") for chunk in chunks] == [3, 3, 3]
+
+
+def test_split_breaks_overlong_sentences_at_words():
+    builder = PromptBuilder("", max_review_tokens=10)
+    review = " ".join(["word"] * 40)
+    chunks = builder.split(review)
+    assert all(builder.count_tokens(chunk) <= 10 for chunk in chunks)
+    assert " ".join(chunks).split() == review.split()
+
+
+def test_reduce_weighs_votes_by_length_and_confidence():
+    results = [answer("Positive", 0.9, ["great"]), answer("Negative", 0.8, ["dull"]),
+               answer("Positive", 0.5, ["great", "fun"])]
+    combined = reduce_chunk_results(results, [10, 10, 10])
+    assert combined["label"] == "Positive"
+    assert combined["confidence"] == round(14 / 30, 2)
+    assert combined["evidence_phrases"] == ["great", "fun"]
+    assert combined["explanation"].startswith("Combined from 3 sections (2 Positive, 1 Negative).")
+    # A long enough dissenting chunk wins
+    assert reduce_chunk_results(results, [10, 40, 10])["label"] == "Negative"
+
+
+def test_reduce_ignores_failed_chunks_and_caps_evidence():
+    failed = answer("Neutral", 0.0, [], fallback_reason="parse_error")
+    results = [failed, answer(evidence=["a", "b"]), answer(confidence=0.95, evidence=["c", "d", "a"])]
+    combined = reduce_chunk_results(results, [100, 1, 1])
+    assert combined["label"] == "Positive"
+    assert combined["evidence_phrases"] == ["c", "d", "a"][:MAX_EVIDENCE_PHRASES]
+    assert reduce_chunk_results([failed, failed], [1, 1]) is None
+
+
+def test_long_review_is_map_reduced_and_only_the_whole_is_cached(tmp_path):
+    def answer_for(chunk):
+        return answer("Negative", 0.9, ["awful"]) if "awful" in chunk else answer("Positive", 0.6)
+
+    analyzer = chunked_analyzer(answer_for)
+    analyzer.cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    review = "The start was good and quite fun. " * 3 + "The ending was awful and far too long. " * 3
+    result = analyzer.analyze_sentiment(review)
+    assert len(analyzer.chunks) == len(analyzer.prompt_builder.split(review)) > 1
+    assert result["label"] in ("Positive", "Negative")
+    assert result["explanation"].startswith(f"Combined from {len(analyzer.chunks)} sections")
+    assert analyzer.model_calls_needed(review) == len(analyzer.chunks)
+    assert len(analyzer.cache) == 1
+    assert analyzer.cached_result(review) == result
+
+
+def test_bad_chunk_answers_are_left_out_and_all_bad_falls_back():
+    review = "A good start to the film. " * 4 + "A bad end to the film. " * 4
+    analyzer = chunked_analyzer(lambda chunk: answer(confidence="high") if "bad" in chunk else answer())
+    result = analyzer.analyze_sentiment(review)
+    assert result["label"] == "Positive" and "fallback_reason" not in result
+
+    analyzer = chunked_analyzer(lambda chunk: answer(evidence_phrases=None))
+    result = analyzer.analyze_sentiment(review)
+    assert result["fallback_reason"] == "parse_error"
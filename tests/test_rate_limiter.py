@@ -0,0 +1,95 @@
+import asyncio
+import threading
+
+import pytest
+
+from rate_limiter import FairShareLimiter, LimiterClosed, TokenBucket, WeightedFairScheduler
+
+
+def grant_order(scheduler: WeightedFairScheduler, requests):
+    """
+    Queue every (flow, tokens) request before the dispatcher may grant any,
+    then return the flows in the order they were granted
+    """
+    granted, done = [], threading.Event()
+
+    def notify(flow):
+        def on_grant(error):
+            granted.append(flow)
+            if len(granted) == len(requests):
+                done.set()
+        return on_grant
+
+    # The condition's lock is reentrant, so holding it keeps the dispatcher waiting
+    with scheduler._cond:
+        for flow, tokens in requests:
+            scheduler.enqueue(flow, tokens, notify(flow))
+    assert done.wait(5)
+    scheduler.close()
+    return granted
+
+
+def fast_scheduler(**weights) -> WeightedFairScheduler:
+    scheduler = WeightedFairScheduler(TokenBucket(1e6, capacity=1e6))
+    for flow, weight in weights.items():
+        scheduler.register(flow, weight)
+    return scheduler
+
+
+def test_tokens_are_shared_by_weight():
+    order = grant_order(fast_scheduler(a=3, b=1), [("a", 1)] * 8 + [("b", 1)] * 8)
+    assert order[:8] == ["a", "b", "a", "a", "a", "b", "a", "a"]
+
+
+def test_equal_weights_alternate_and_large_requests_cost_more():
+    assert grant_order(fast_scheduler(a=1, b=1), [("a", 1)] * 3 + [("b", 1)] * 3) == ["a", "b"] * 3
+    # b's 3-token request puts its next one three rounds back
+    order = grant_order(fast_scheduler(a=1, b=1), [("a", 1)] * 4 + [("b", 3), ("b", 1)])
+    assert order == ["a", "b", "a", "a", "a", "b"]
+
+
+def test_urgent_flows_go_first_earliest_deadline_first():
+    scheduler = fast_scheduler(a=100, b=1, c=1)
+    scheduler.set_urgent("b", 200.0)
+    scheduler.set_urgent("c", 100.0)
+    order = grant_order(scheduler, [("a", 1)] * 3 + [("b", 1)] * 2 + [("c", 1)] * 2)
+    assert order == ["c", "c", "b", "b", "a", "a", "a"]
+
+
+def test_cleared_urgency_returns_to_fair_order():
+    scheduler = fast_scheduler(a=1, b=1)
+    scheduler.set_urgent("b", 100.0)
+    scheduler.set_urgent("b", None)
+    assert grant_order(scheduler, [("a", 1)] * 2 + [("b", 1)] * 2) == ["a", "b", "a", "b"]
+
+
+def test_idle_flow_does_not_bank_credit():
+    scheduler = fast_scheduler(a=1)
+    for _ in range(10):
+        granted = threading.Event()
+        scheduler.enqueue("a", 1, lambda error, granted=granted: granted.set())
+        assert granted.wait(5)
+    # b joins at the current virtual time: one tag ahead of a, not ten
+    scheduler.register("b", 1)
+    order = grant_order(scheduler, [("a", 1)] * 3 + [("b", 1)] * 3)
+    assert order == ["b", "a"] * 3
+
+
+def test_closed_limiter_fails_waiting_and_later_acquires():
+    # One token a day: the second acquire waits until the limiter is closed
+    scheduler = WeightedFairScheduler(TokenBucket(1 / 86400, capacity=1))
+    limiter = FairShareLimiter(scheduler, "job", quota=None)
+    limiter.acquire()
+
+    async def wait_then_close():
+        waiting = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        limiter.close()
+        with pytest.raises(LimiterClosed):
+            await waiting
+
+    asyncio.run(wait_then_close())
+    with pytest.raises(LimiterClosed):
+        limiter.acquire()
+    scheduler.close()
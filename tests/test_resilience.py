@@ -0,0 +1,191 @@
+import asyncio
+import time
+
+import pytest
+
+import resilience
+from backends import BackendError
+from resilience import (HALF_OPEN_POLL_SECONDS, AIMDController, CircuitBreaker, CircuitOpenError,
+                        ResilientCaller, RetryPolicy)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return clock
+
+
+def open_breaker(clock, threshold=3, reset_timeout=10.0) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=threshold, reset_timeout=reset_timeout)
+    for _ in range(threshold):
+        breaker.before_call()
+        breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # resets the run
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker = open_breaker(clock)
+    assert breaker.state == "open"
+    assert breaker.outage_started == clock.now
+    clock.now += 4
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_after == pytest.approx(6.0)
+    assert breaker.retry_after() == pytest.approx(6.0)
+
+
+def test_half_open_lets_one_probe_through_and_success_closes(clock):
+    breaker = open_breaker(clock)
+    clock.now += 10
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_after == HALF_OPEN_POLL_SECONDS
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.outage_started is None
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_and_keeps_the_outage_start(clock):
+    breaker = open_breaker(clock)
+    started = breaker.outage_started
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.outage_started == started
+    assert breaker.retry_after() == pytest.approx(10.0)
+
+
+def fast_caller(**breaker_options) -> ResilientCaller:
+    policy = RetryPolicy(max_attempts=4, initial_backoff=0.001, max_backoff=0.001, deadline=5.0)
+    return ResilientCaller(policy, CircuitBreaker(**breaker_options))
+
+
+def failing(*errors, result="ok"):
+    """
+    fn for ResilientCaller.call raising `errors` in turn, then returning `result`
+    """
+    errors = list(errors)
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        if errors:
+            raise errors.pop(0)
+        return result
+    fn.calls = calls
+    return fn
+
+
+def test_retries_transient_and_throttled_errors():
+    caller = fast_caller()
+    fn = failing(BackendError("busy", status_code=503), BackendError("quota", status_code=429))
+    assert caller.call(fn) == "ok"
+    assert len(fn.calls) == 3
+    assert caller.breaker.consecutive_failures == 0
+
+
+def test_permanent_errors_and_open_circuits_are_not_retried():
+    caller = fast_caller()
+    fn = failing(BackendError("bad request", status_code=400))
+    with pytest.raises(BackendError):
+        caller.call(fn)
+    assert len(fn.calls) == 1
+
+    caller = fast_caller(failure_threshold=2)
+    fn = failing(*[BackendError("down", status_code=503)] * 4)
+    with pytest.raises(CircuitOpenError):
+        caller.call(fn)
+    assert len(fn.calls) == 2
+    assert caller.breaker.state == "open"
+
+
+def test_throttling_counts_as_the_backend_being_up():
+    caller = fast_caller(failure_threshold=2)
+    fn = failing(*[BackendError("quota", status_code=429)] * 3)
+    assert caller.call(fn) == "ok"
+    assert caller.breaker.state == "closed"
+
+
+def test_listeners_hear_successes_and_throttles():
+    caller = fast_caller()
+    controller = AIMDController(maximum=8, initial=2)
+    caller.listeners.append(controller)
+    caller.call(failing(BackendError("quota", status_code=429)))
+    assert controller.throttles == 1
+    assert controller.limit == 1.0 + 1.0  # halved to 1, then one additive success
+
+
+def test_wait_until_available_gives_up_on_a_long_outage():
+    caller = ResilientCaller(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60.0),
+                             max_outage_wait=0.05)
+    caller.breaker.record_failure()
+    started = time.monotonic()
+    assert asyncio.run(caller.wait_until_available()) is False
+    assert time.monotonic() - started < 1.0
+
+    caller = ResilientCaller(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.05))
+    caller.breaker.record_failure()
+    assert asyncio.run(caller.wait_until_available()) is True
+
+
+def test_aimd_slow_start_then_additive_increase(clock):
+    controller = AIMDController(maximum=16, initial=2, cooldown=1.0)
+    for _ in range(3):
+        controller.on_success()
+    assert controller.limit == 5.0
+    controller.on_throttle()
+    assert controller.limit == 2.5 and not controller.slow_start
+    controller.on_success()
+    assert controller.limit == pytest.approx(2.9)
+    assert controller.concurrency == 2
+
+
+def test_aimd_decreases_once_per_cooldown_and_stays_in_bounds(clock):
+    controller = AIMDController(maximum=4, minimum=2, initial=4, cooldown=1.0)
+    controller.on_throttle()
+    controller.on_throttle()
+    assert controller.limit == 2.0 and controller.throttles == 2
+    clock.now += 1
+    controller.on_throttle()
+    assert controller.limit == 2.0  # never below the minimum
+    for _ in range(100):
+        controller.on_success()
+    assert controller.limit == 4.0
+
+
+def test_aimd_slots_cap_in_flight_calls():
+    controller = AIMDController(maximum=8, initial=2)
+    in_flight, peak = 0, 0
+
+    async def call():
+        nonlocal in_flight, peak
+        async with controller.slot():
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(run())
+    assert peak == 2
@@ -0,0 +1,52 @@
+import itertools
+
+import routing
+from backends import SimulatedBackend
+from routing import ModelRouter, Tier
+
+
+def router(min_samples=3, **tier_options) -> ModelRouter:
+    tiers = [Tier(SimulatedBackend(), max_review_tokens=10, name="lite", **tier_options),
+             Tier(SimulatedBackend(), name="full", **tier_options)]
+    return ModelRouter(tiers, latency_slo=1.0, max_error_rate=0.5, min_samples=min_samples)
+
+
+def test_short_reviews_go_to_the_first_tier_that_fits():
+    tiers = router()
+    assert tiers.choose(["short"]).name == "lite"
+    assert tiers.choose(["short", "x" * 200]).name == "full"
+
+
+def test_degraded_tier_is_skipped_once_trusted():
+    tiers = router()
+    lite = tiers.tiers[0]
+    for _ in range(2):
+        tiers.record(lite, 5.0, failed=False)
+    assert tiers.choose(["short"]).name == "lite"  # too few samples to judge
+    tiers.record(lite, 5.0, failed=False)
+    assert not tiers.healthy(lite)
+    assert tiers.choose(["short"]).name == "full"
+    for _ in range(3):
+        tiers.record(tiers.tiers[1], 0.1, failed=True)
+    # Both degraded: the faster one wins
+    assert tiers.choose(["short"]).name == "full"
+
+
+def test_samples_expiring_between_reads_do_not_break_health(monkeypatch):
+    # Three calls at t=0..2, then the window is read at t=3 and every later
+    # clock read finds it expired
+    clock = itertools.chain([0.0, 1.0, 2.0, 3.0], itertools.repeat(100.0))
+    monkeypatch.setattr(routing.time, "monotonic", lambda: next(clock))
+    tiers = router(max_age=30.0)
+    lite = tiers.tiers[0]
+    for _ in range(3):
+        tiers.record(lite, 5.0, failed=False)
+    assert not tiers.healthy(lite)
+    assert tiers.healthy(lite)
+    assert tiers.summary()[0]["p95_ms"] is None
+
+
+def test_health_with_no_minimum_and_no_samples():
+    tiers = router(min_samples=0)
+    assert tiers.healthy(tiers.tiers[0])
+    assert tiers.choose(["short"]).name == "lite"
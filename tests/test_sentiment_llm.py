@@ -0,0 +1,84 @@
+import pandas as pd
+import pytest
+
+from backends import SimulatedBackend
+from metrics import MetricsRegistry
+from result_cache import ResultCache
+from sentiment_llm import SentimentAnalyzer, is_valid_result, process_csv_file_robust
+
+GOOD = {"label": "Positive", "confidence": 0.9, "explanation": "ok", "evidence_phrases": ["good"]}
+
+
+def answering(**overrides):
+    """
+    A label_fn for SimulatedBackend that gives every review the same answer
+    """
+    return lambda review: dict(GOOD, **overrides)
+
+
+def analyzer_for(label_fn, cache=None) -> SentimentAnalyzer:
+    backend = SimulatedBackend(latency="constant", latency_ms=0, label_fn=label_fn)
+    return SentimentAnalyzer(backend=backend, cache=cache, use_cache=cache is not None, metrics=MetricsRegistry())
+
+
+@pytest.mark.parametrize("overrides", [
+    {"confidence": "high"},
+    {"confidence": 1.5},
+    {"confidence": True},
+    {"explanation": None},
+    {"evidence_phrases": None},
+    {"evidence_phrases": "good"},
+    {"evidence_phrases": ["good", 3]},
+])
+def test_wrongly_typed_fields_are_invalid(overrides):
+    assert is_valid_result(GOOD)
+    assert not is_valid_result(dict(GOOD, **overrides))
+
+
+def test_wrongly_typed_answer_is_a_parse_error_and_not_cached(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    analyzer = analyzer_for(answering(confidence="high"), cache)
+    result = analyzer.analyze_sentiment("a fine film")
+    assert result["fallback_reason"] == "parse_error"
+    assert len(cache) == 0
+
+
+def test_streamed_wrongly_typed_answer_is_a_parse_error():
+    analyzer = analyzer_for(answering(evidence_phrases=None))
+    *_, result = analyzer.analyze_sentiment_stream("a fine film")
+    assert result["fallback_reason"] == "parse_error"
+
+
+def test_invalid_cached_answer_is_treated_as_a_miss(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    analyzer = analyzer_for(answering(), cache)
+    cache.put(analyzer._cache_key("a fine film"), dict(GOOD, confidence="high"))
+    assert analyzer.cached_result("a fine film") is None
+    assert analyzer.analyze_sentiment("a fine film") == GOOD
+    assert analyzer.cached_result("a fine film") == GOOD
+
+
+def test_wrongly_typed_rows_do_not_abort_a_file(tmp_path):
+    def label_fn(review):
+        if "confidence" in review:
+            return dict(GOOD, confidence="high")
+        if "evidence" in review:
+            return dict(GOOD, evidence_phrases=None)
+        return GOOD
+
+    reviews = ["a fine film", "bad confidence", "bad evidence", "another fine film"]
+    pd.DataFrame({"review_text": reviews}).to_csv(tmp_path / "in.csv", index=False)
+    df = process_csv_file_robust(str(tmp_path / "in.csv"), str(tmp_path / "out.csv"),
+                                 analyzer=analyzer_for(label_fn), requests_per_minute=None)
+    assert list(df["fallback_reason"]) == ["", "parse_error", "parse_error", ""]
+    assert list(df["predicted_label"]) == ["Positive", "Neutral", "Neutral", "Positive"]
+
+
+def test_unstorable_local_answer_becomes_an_error_row():
+    analyzer = analyzer_for(answering())
+    analyzer.local_result = lambda review, packed=False: dict(GOOD, confidence="high") if review == "odd" else None
+    seen = {}
+    results = analyzer.batch_analyze(["fine", "odd"], requests_per_minute=None, columnar=True,
+                                     result_callback=seen.__setitem__)
+    assert [result.label.value for result in (results[0], results[1])] == ["Positive", "Error"]
+    assert seen[1]["fallback_reason"] == "exception"
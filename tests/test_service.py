@@ -0,0 +1,151 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from backends import BackendResponse, ModelBackend, SimulatedBackend
+from metrics import MetricsRegistry
+from sentiment_llm import SentimentAnalyzer
+from service import HTTPFrontend, InferenceService, ServiceOverloaded
+
+
+class GatedBackend(ModelBackend):
+    """
+    Answers like SimulatedBackend, but every call waits until `gate` is set.
+    `calls` holds the number of reviews each call covered.
+    """
+    model_id = "gated"
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.calls = []
+        self._answers = SimulatedBackend()
+
+    @property
+    def waiting(self) -> int:
+        return len(self.calls)
+
+    def generate(self, prompt, temperature, max_output_tokens, timeout=None):
+        text = self._answers.answer(prompt)
+        answer = json.loads(text)
+        self.calls.append(len(answer) if isinstance(answer, list) else 1)
+        self.gate.wait(5)
+        return BackendResponse(text, 1, 1)
+
+
+async def until(predicate, timeout: float = 5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "condition not reached"
+        await asyncio.sleep(0.005)
+
+
+def run_service(test, **options):
+    """
+    Run `test(service, backend)` against a started service on a gated backend
+    """
+    backend = GatedBackend()
+    analyzer = SentimentAnalyzer(backend=backend, use_cache=False, metrics=MetricsRegistry())
+    service = InferenceService(analyzer, **options)
+
+    async def main():
+        service.start()
+        try:
+            await test(service, backend)
+        finally:
+            backend.gate.set()
+            await service.stop()
+
+    asyncio.run(main())
+
+
+def test_duplicate_requests_share_one_call():
+    async def test(service, backend):
+        first = asyncio.ensure_future(service.analyze("a great film"))
+        await until(lambda: backend.waiting == 1)
+        second = asyncio.ensure_future(service.analyze("a great film"))
+        await asyncio.sleep(0.05)
+        backend.gate.set()
+        assert await first == await second
+        assert backend.calls == [1]
+        assert service.coalesced.value() == 1
+
+    run_service(test, max_concurrency=2)
+
+
+def test_reviews_are_only_packed_while_every_slot_is_busy():
+    async def test(service, backend):
+        # Idle slots: each review gets its own call
+        idle = [asyncio.ensure_future(service.analyze(f"film number {i} was great")) for i in range(2)]
+        await until(lambda: backend.waiting == 2)
+        assert backend.calls == [1, 1]
+        # Both slots busy: later reviews queue up and share calls once one frees
+        queued = [asyncio.ensure_future(service.analyze(f"film number {i} was awful")) for i in range(2, 7)]
+        await until(lambda: service.queued == 5)
+        backend.gate.set()
+        results = await asyncio.gather(*idle, *queued)
+        assert [result["label"] for result in results] == ["Positive"] * 2 + ["Negative"] * 5
+        assert sum(backend.calls) == 7
+        assert backend.calls[2] >= 3 and len(backend.calls) < 7
+
+    run_service(test, max_concurrency=2, max_batch_size=8)
+
+
+def test_full_queue_refuses_new_reviews():
+    async def test(service, backend):
+        busy = [asyncio.ensure_future(service.analyze(f"busy review {i}")) for i in range(2)]
+        await until(lambda: backend.waiting == 2)
+        waiting = asyncio.ensure_future(service.analyze_many(["queued one", "queued two"]))
+        await until(lambda: service.queued == 2)
+        with pytest.raises(ServiceOverloaded):
+            await service.analyze("one too many")
+        # A review already queued is coalesced rather than refused
+        again = asyncio.ensure_future(service.analyze("queued one"))
+        status, payload, headers = await HTTPFrontend(service).route(
+            "POST", "/v1/analyze", json.dumps({"review_text": "still too many"}).encode())
+        assert status == 429 and headers == {"Retry-After": "1"}
+        backend.gate.set()
+        await asyncio.gather(*busy, waiting, again)
+        assert service.rejected.value() == 2
+
+    run_service(test, max_concurrency=2, max_queue=2)
+
+
+def test_bad_requests_get_client_errors():
+    async def test(service, backend):
+        backend.gate.set()
+        frontend = HTTPFrontend(service)
+        assert (await frontend.route("GET", "/v1/analyze", b""))[0] == 405
+        assert (await frontend.route("POST", "/v1/analyze", b"not json"))[0] == 400
+        assert (await frontend.route("POST", "/v1/analyze/bulk", b'{"reviews": "one"}'))[0] == 400
+        assert (await frontend.route("POST", "/nowhere", b""))[0] == 404
+        status, payload, _ = await frontend.route("POST", "/v1/analyze/bulk",
+                                                  json.dumps({"reviews": ["great", ""]}).encode())
+        assert status == 200 and len(payload["results"]) == 2
+
+    run_service(test)
+
+
+async def exchange(port: int, request: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+@pytest.mark.parametrize("length, status", [("abc", 400), ("-5", 400), (str(11 * 1024 * 1024), 413)])
+def test_bad_content_length_closes_the_connection(length, status):
+    async def test(service, backend):
+        server = await asyncio.start_server(HTTPFrontend(service).handle_connection, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            response = await exchange(port, f"POST /v1/analyze HTTP/1.1\r\nContent-Length: {length}\r\n\r\n"
+                                      .encode())
+        assert response.startswith(f"HTTP/1.1 {status} ".encode())
+        assert b"Connection: close" in response
+
+    run_service(test)